@@ -0,0 +1,143 @@
+# alpha_region.py
+"""
+알파 기반 연산 생략 + 타일 병렬 처리 도우미
+배경 제거된 RGBA 이미지는 대부분 완전히 투명하므로, 브러시 효과는 알파 경계 상자(+ 필터 반경 여백)만 처리하고
+결과를 원래 자리에 붙여 넣습니다. ALPHA_TILE_SKIP=1이면 상자 안에서도 완전히 투명한 타일은 건너뜁니다.
+TILE_WORKERS > 1이면 처리 영역을 여백이 겹치는 타일로 나눠 스레드 풀에서 동시에 처리합니다.
+(OpenCV/NumPy 연산은 GIL을 놓으므로 스레드로 충분하고, 타일 결과를 프로세스 간에 복사할 필요가 없음)
+
+- ALPHA_CROP=0이면 비활성화 (항상 전체 프레임 처리)
+- ALPHA_TILE_SKIP=1이면 타일 단위 생략
+- ALPHA_TILE_SIZE: 타일 크기 (기본 256, 타일 생략/병렬 처리 공용)
+- TILE_WORKERS: 타일 병렬 처리 스레드 수 (기본 1 = 병렬 분할 없음)
+
+노이즈는 절대 좌표 구간 단위로 만들므로(texture_noise.tile_noise) 타일 크기나 워커 수와 관계없이
+같은 seed면 같은 결과가 나옵니다.
+"""
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ALPHA_CROP = os.environ.get("ALPHA_CROP", "1") != "0"
+ALPHA_TILE_SKIP = os.environ.get("ALPHA_TILE_SKIP", "0") == "1"
+ALPHA_TILE_SIZE = int(os.environ.get("ALPHA_TILE_SIZE", "256"))
+TILE_WORKERS = int(os.environ.get("TILE_WORKERS", "1"))
+
+_executors = {}
+
+def _executor(workers):
+    """워커 수별 스레드 풀 (프로세스 내 재사용)"""
+    if workers not in _executors:
+        _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile")
+    return _executors[workers]
+
+def foreground_bbox(alpha):
+    """알파 > 0인 영역의 경계 상자 (y0, y1, x0, x1), 완전히 투명하면 None"""
+    rows = np.flatnonzero(alpha.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(alpha.any(axis=0))
+    return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+
+def _expand(box, margin, shape, align=1):
+    y0, y1, x0, x1 = box
+    h, w = shape[:2]
+    # 창 시작점을 align 배수로 맞춰 축소 처리 시 샘플 격자가 전체 처리와 같도록 함
+    y0 = max(0, y0 - margin) // align * align
+    x0 = max(0, x0 - margin) // align * align
+    return y0, min(h, y1 + margin), x0, min(w, x1 + margin)
+
+def _grid(start, stop, tile):
+    """[start, stop) 구간을 절대 좌표 tile 배수 경계로 분할"""
+    edges = [start] + list(range((start // tile + 1) * tile, stop, tile)) + [stop]
+    return list(zip(edges[:-1], edges[1:]))
+
+def _split(box, tile):
+    y0, y1, x0, x1 = box
+    return [(ty0, ty1, tx0, tx1) for ty0, ty1 in _grid(y0, y1, tile) for tx0, tx1 in _grid(x0, x1, tile)]
+
+def foreground_regions(alpha, skip_tiles=None, tile=None):
+    """처리할 영역 목록 (경계 상자 하나, 또는 상자 안에서 불투명 픽셀이 있는 타일들)"""
+    box = foreground_bbox(alpha)
+    if box is None:
+        return []
+    if not (ALPHA_TILE_SKIP if skip_tiles is None else skip_tiles):
+        return [box]
+    return [region for region in _split(box, tile or ALPHA_TILE_SIZE)
+            if alpha[region[0]:region[1], region[2]:region[3]].any()]
+
+def process_foreground(rgb, alpha, fn, margin, stats=None, skip_tiles=None, align=1, halo=0, workers=None):
+    """
+    rgb의 전경 영역만 fn으로 처리한 배열을 반환합니다.
+
+    fn: fn(window, (y0, x0)) - (H, W, 3) 창과 창의 절대 좌표 원점을 받아 같은 크기의 uint8 결과를 반환
+        (창 밖 픽셀은 참조하지 않는다고 가정, 노이즈는 원점 기준 tile_noise로 만들어야 타일 경계가 이어짐)
+    margin: 필터 반경 합 - 창을 이만큼 넓혀 처리한 뒤 안쪽만 붙여 넣으므로 경계 결과가 전체 처리와 같음
+    halo: 전경 영역 바깥으로 결과를 더 붙여 넣을 폭 (이후 리샘플링이 영역 밖 픽셀을 참조할 때)
+    align: 창 시작 좌표를 맞출 배수 (fn 안에서 축소 처리할 때 축소 배율)
+    workers: 타일 병렬 스레드 수 (기본 TILE_WORKERS, 1이면 영역 단위 순차 처리)
+    stats: dict를 넘기면 processed_ratio(실제 처리한 픽셀 / 전체 픽셀)와 tiles(처리한 창 수)를 기록
+    영역 밖(완전히 투명한 부분)의 RGB는 입력 그대로 둡니다.
+    """
+    h, w = rgb.shape[:2]
+    total = h * w
+    workers = max(1, workers or TILE_WORKERS)
+    if alpha is None or not ALPHA_CROP:
+        if workers == 1:
+            if stats is not None:
+                stats["processed_ratio"] = 1.0
+                stats["tiles"] = 1
+            return fn(rgb, (0, 0))
+        regions = [(0, h, 0, w)]
+    else:
+        regions = [_expand(region, halo, rgb.shape) for region in foreground_regions(alpha, skip_tiles)]
+    if workers > 1:
+        regions = [tile for region in regions for tile in _split(region, ALPHA_TILE_SIZE)]
+
+    out = np.array(rgb, dtype=np.uint8, copy=True)
+
+    def run(region):
+        wy0, wy1, wx0, wx1 = _expand(region, margin, rgb.shape, align)
+        result = fn(rgb[wy0:wy1, wx0:wx1], (wy0, wx0))
+        y0, y1, x0, x1 = region
+        # 붙여 넣는 안쪽 영역은 타일끼리 겹치지 않으므로 각 스레드가 바로 기록
+        out[y0:y1, x0:x1] = result[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+        return (wy1 - wy0) * (wx1 - wx0)
+
+    if workers > 1 and len(regions) > 1:
+        processed = sum(_executor(workers).map(run, regions))
+    else:
+        processed = sum(run(region) for region in regions)
+    if stats is not None:
+        stats["processed_ratio"] = round(processed / total, 4) if total else 0.0
+        stats["tiles"] = len(regions)
+    return out
+
+def benchmark_tile_scaling(effect, workers_list=(1, 2, 4, 8), repeat=3):
+    """
+    effect(workers) -> uint8 배열을 워커 수별로 실행해 최선 시간, 속도 향상, 결과 동일 여부를 반환
+    (같은 seed로 실행하므로 워커 수와 관계없이 결과 해시가 같아야 함)
+    """
+    rows = []
+    baseline = None
+    reference_hash = None
+    for workers in workers_list:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = effect(workers)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        digest = hashlib.sha256(np.ascontiguousarray(out).tobytes()).hexdigest()
+        reference_hash = reference_hash or digest
+        baseline = baseline or best
+        rows.append({
+            "workers": workers,
+            "ms": round(best * 1000, 2),
+            "speedup": round(baseline / best, 2),
+            "identical": digest == reference_hash,
+        })
+    return {"cpu_count": os.cpu_count(), "scaling": rows}
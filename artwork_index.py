@@ -0,0 +1,336 @@
+# artwork_index.py
+"""
+감정 → 명화 추천 색인
+emotion_index.json을 한 번만 읽어 참조 파일을 검증하고, 명화별 다중 해상도 썸네일(WebP/AVIF)과
+대표 색상/평균 밝기 특징을 미리 계산해 둔 뒤, FER+ 전체 확률 분포로 상위 k개 명화를 고릅니다.
+
+- 점수: 명화가 속한 감정의 확률 × emotion_score (FER+의 contempt는 색인에 없으므로 disgust에 합산)
+- 썸네일/특징은 원본 파일 SHA-256 기준 manifest.json에 기록하므로 바뀐 명화만 다시 만듭니다.
+- ARTWORK_THUMB_DIR: 썸네일 저장 위치 (기본 BG_image/thumbs, /BG_image 정적 경로로 제공)
+- ARTWORK_THUMB_SIZES: 긴 변 기준 썸네일 크기 목록 (기본 256,512,1024)
+- ARTWORK_THUMB_FORMATS: 썸네일 형식 선호 순서 (기본 avif,webp - Pillow가 지원하는 형식만 생성)
+
+사용법:
+  python artwork_index.py build                       # 검증 + 썸네일/특징 사전 계산
+  python artwork_index.py validate                    # 누락 파일만 확인
+  python artwork_index.py recommend <image_path|확률 JSON> [k] [size]
+  python artwork_index.py bench [n]                   # 조회 지연/제공 바이트 측정
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import contextlib
+from functools import lru_cache
+
+import numpy as np
+import cv2
+from PIL import Image, features
+
+from emotion_analysis import FERPLUS_EMOTIONS
+
+BG_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BG_image')
+INDEX_PATH = os.path.join(BG_IMAGE_DIR, 'emotion_index.json')
+THUMB_DIR = os.environ.get('ARTWORK_THUMB_DIR', os.path.join(BG_IMAGE_DIR, 'thumbs'))
+THUMB_SIZES = tuple(int(s) for s in os.environ.get('ARTWORK_THUMB_SIZES', '256,512,1024').split(',') if s)
+THUMB_FORMATS = tuple(f for f in os.environ.get('ARTWORK_THUMB_FORMATS', 'avif,webp').lower().split(',')
+                      if f and features.check(f))
+THUMB_QUALITY = {"webp": 80, "avif": 60}
+MANIFEST_VERSION = 1
+DOMINANT_COLORS = 3
+
+# FER+ 라벨 → 색인 감정 키 (색인에 없는 감정은 가장 가까운 감정으로)
+EMOTION_ALIASES = {"contempt": "disgust"}
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def image_features(image):
+    """대표 색상(k-means, 비중 순)과 평균 밝기(Rec.601 luma, 0~255)"""
+    small = np.asarray(image.convert('RGB').resize((64, 64), Image.BILINEAR), dtype=np.float32).reshape(-1, 3)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+    cv2.setRNGSeed(0)
+    _compactness, labels, centers = cv2.kmeans(small, DOMINANT_COLORS, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+    counts = np.bincount(labels.ravel(), minlength=DOMINANT_COLORS)
+    order = np.argsort(-counts)
+    colors = [{
+        "hex": "#{:02x}{:02x}{:02x}".format(*np.clip(np.rint(centers[i]), 0, 255).astype(int)),
+        "share": round(float(counts[i] / counts.sum()), 3),
+    } for i in order]
+    luma = small @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return {"dominant_colors": colors, "mean_luminance": round(float(luma.mean()), 2)}
+
+def _static_url(path):
+    """/BG_image 정적 경로 URL (BG_image 밖에 저장된 썸네일은 파일 경로 그대로)"""
+    rel = os.path.relpath(os.path.abspath(path), BG_IMAGE_DIR)
+    if rel.startswith(os.pardir):
+        return os.path.abspath(path)
+    return "/BG_image/" + rel.replace(os.sep, "/")
+
+def _thumb_name(filename, digest, size, fmt):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return f"{stem}.{digest[:12]}.{size}.{fmt}"
+
+def build_variants(image, filename, digest):
+    """크기×형식별 썸네일 생성 (이미 있으면 건너뜀), {size: {fmt: {file, bytes, width, height}}} 반환"""
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    image = image.convert('RGB')
+    variants = {}
+    for size in THUMB_SIZES:
+        thumb = image.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)  # 원본보다 크게 늘리지 않음
+        for fmt in THUMB_FORMATS:
+            name = _thumb_name(filename, digest, size, fmt)
+            path = os.path.join(THUMB_DIR, name)
+            if not os.path.exists(path):
+                thumb.save(path, fmt.upper(), quality=THUMB_QUALITY.get(fmt, 80))
+            variants.setdefault(str(size), {})[fmt] = {
+                "file": name,
+                "bytes": os.path.getsize(path),
+                "width": thumb.width,
+                "height": thumb.height,
+            }
+    return variants
+
+def _manifest_path():
+    return os.path.join(THUMB_DIR, 'manifest.json')
+
+def load_manifest():
+    try:
+        with open(_manifest_path(), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("artworks", {})
+
+def build_index():
+    """전체 명화 검증 + 썸네일/특징 사전 계산 (원본 해시가 같고 썸네일이 남아 있으면 재사용)"""
+    t0 = time.perf_counter()
+    with open(INDEX_PATH, encoding='utf-8') as f:
+        index = json.load(f)
+    previous = load_manifest()
+    entries = {}
+    missing = []
+    built = 0
+    for emotion in index.get('emotions', {}).values():
+        for artwork in emotion.get('artworks', []):
+            filename = artwork['filename']
+            path = os.path.join(BG_IMAGE_DIR, filename)
+            if not os.path.exists(path):
+                missing.append(filename)
+                continue
+            if filename in entries:
+                continue
+            digest = _sha256(path)
+            cached = previous.get(filename)
+            if (cached and cached.get("sha256") == digest and cached.get("formats") == list(THUMB_FORMATS)
+                    and all(os.path.exists(os.path.join(THUMB_DIR, v["file"]))
+                            for size in cached["variants"].values() for v in size.values())
+                    and sorted(cached["variants"], key=int) == [str(s) for s in sorted(THUMB_SIZES)]):
+                entries[filename] = cached
+                continue
+            with Image.open(path) as image:
+                image.load()
+                entry = {
+                    "sha256": digest,
+                    "bytes": os.path.getsize(path),
+                    "size": list(image.size),
+                    "formats": list(THUMB_FORMATS),
+                    "variants": build_variants(image, filename, digest),
+                }
+                entry.update(image_features(image))
+            entries[filename] = entry
+            built += 1
+            print(f"명화 썸네일 생성: {filename}", file=sys.stderr)
+    with open(_manifest_path(), 'w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION, "artworks": entries}, f, ensure_ascii=False)
+    if missing:
+        print(f"경고: 색인에 있지만 파일이 없는 명화 {len(missing)}개: {', '.join(missing)}", file=sys.stderr)
+    print(f"명화 색인 준비 완료: {len(entries)}개 중 {built}개 새로 생성 ({THUMB_DIR})", file=sys.stderr)
+    return {
+        "artworks": len(entries),
+        "built": built,
+        "missing": missing,
+        "sizes": list(THUMB_SIZES),
+        "formats": list(THUMB_FORMATS),
+        "thumb_dir": THUMB_DIR,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+class ArtworkIndex:
+    """메모리 상주 추천 색인 (명화 × FER+ 감정 점수 행렬)"""
+
+    def __init__(self, index_path=INDEX_PATH):
+        with open(index_path, encoding='utf-8') as f:
+            index = json.load(f)
+        manifest = load_manifest()
+        self.missing = []
+        self.artworks = []
+        rows = []
+        columns = {name: i for i, name in enumerate(FERPLUS_EMOTIONS)}
+        by_file = {}
+        for emotion, group in index.get('emotions', {}).items():
+            if emotion not in columns:
+                print(f"경고: FER+에 없는 감정 분류를 건너뜁니다: {emotion}", file=sys.stderr)
+                continue
+            for artwork in group.get('artworks', []):
+                filename = artwork['filename']
+                if not os.path.exists(os.path.join(BG_IMAGE_DIR, filename)):
+                    self.missing.append(filename)
+                    continue
+                if filename not in by_file:
+                    by_file[filename] = len(self.artworks)
+                    meta = {k: artwork.get(k) for k in ("filename", "title", "artist", "year", "description")}
+                    meta["emotion"] = emotion
+                    meta.update(manifest.get(filename, {}))
+                    self.artworks.append(meta)
+                    rows.append(np.zeros(len(FERPLUS_EMOTIONS), dtype=np.float32))
+                rows[by_file[filename]][columns[emotion]] = float(artwork.get('emotion_score', 0.0))
+        # contempt 열은 alias 대상 감정 점수를 그대로 사용
+        for alias, target in EMOTION_ALIASES.items():
+            for row in rows:
+                row[columns[alias]] = row[columns[target]]
+        self.scores = np.stack(rows) if rows else np.zeros((0, len(FERPLUS_EMOTIONS)), dtype=np.float32)
+        self.has_thumbnails = bool(manifest)
+        if self.missing:
+            print(f"경고: 누락된 명화 {len(self.missing)}개는 추천에서 제외합니다", file=sys.stderr)
+
+    @staticmethod
+    def probability_vector(emotion_result):
+        """analyze_emotion 결과(probabilities 또는 top_emotions) / {감정: 확률} / 길이 8 배열 → FER+ 순서 벡터"""
+        if isinstance(emotion_result, dict):
+            probs = emotion_result.get("probabilities")
+            if probs is None and "top_emotions" in emotion_result:
+                # 이전 형식 결과: 상위 3개만 있음
+                probs = {e["emotion"]: e["probability"] for e in emotion_result["top_emotions"]}
+            if probs is None and "emotion" in emotion_result and "confidence" in emotion_result:
+                probs = {emotion_result["emotion"]: emotion_result["confidence"] or 1.0}
+            if probs is None:
+                probs = emotion_result
+            vector = np.array([float(probs.get(name, 0.0)) for name in FERPLUS_EMOTIONS], dtype=np.float32)
+        else:
+            vector = np.asarray(emotion_result, dtype=np.float32).reshape(-1)
+            if vector.size != len(FERPLUS_EMOTIONS):
+                raise ValueError(f"확률 벡터 길이는 {len(FERPLUS_EMOTIONS)}이어야 합니다: {vector.size}")
+        total = vector.sum()
+        return vector / total if total > 0 else vector
+
+    def _variant(self, artwork, size, accept):
+        """요청 크기 이상인 가장 작은 썸네일 중 accept 순서상 첫 형식 (썸네일이 없으면 원본)"""
+        variants = artwork.get("variants") or {}
+        sizes = sorted(int(s) for s in variants)
+        fitting = [s for s in sizes if s >= size] or sizes[-1:]
+        for s in fitting:
+            for fmt in accept:
+                if fmt in variants[str(s)]:
+                    v = variants[str(s)][fmt]
+                    return {
+                        "url": _static_url(os.path.join(THUMB_DIR, v["file"])), "format": fmt,
+                        "bytes": v["bytes"], "width": v["width"], "height": v["height"],
+                    }
+        path = os.path.join(BG_IMAGE_DIR, artwork["filename"])
+        return {
+            "url": _static_url(path), "format": "original",
+            "bytes": artwork.get("bytes") or os.path.getsize(path),
+        }
+
+    def recommend(self, emotion_result, k=3, size=512, accept=("avif", "webp")):
+        """상위 k개 명화와 조회 지연(lookup_ms), 제공 바이트(bytes_served) 반환"""
+        t0 = time.perf_counter()
+        probs = self.probability_vector(emotion_result)
+        scores = self.scores @ probs
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.array([], dtype=int)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results = []
+        for i in top:
+            artwork = self.artworks[i]
+            item = {key: artwork.get(key) for key in ("filename", "title", "artist", "year", "emotion")}
+            item["score"] = round(float(scores[i]), 4)
+            item["image"] = self._variant(artwork, size, accept)
+            if "mean_luminance" in artwork:
+                item["dominant_colors"] = artwork["dominant_colors"]
+                item["mean_luminance"] = artwork["mean_luminance"]
+            results.append(item)
+        lookup_ms = (time.perf_counter() - t0) * 1000
+        bytes_served = sum(item["image"]["bytes"] for item in results)
+        original_bytes = sum(self.artworks[i].get("bytes") or
+                             os.path.getsize(os.path.join(BG_IMAGE_DIR, self.artworks[i]["filename"])) for i in top)
+        return {
+            "artworks": results,
+            "lookup_ms": round(lookup_ms, 3),
+            "bytes_served": bytes_served,
+            "original_bytes": original_bytes,
+        }
+
+@lru_cache(maxsize=1)
+def get_index():
+    """프로세스당 한 번만 로드되는 추천 색인"""
+    return ArtworkIndex()
+
+def recommend_for_image(image_path, k=3, size=512):
+    """이미지 감정 분석 후 명화 추천"""
+    import emotion_analysis
+    # 감정 분석 진행 로그가 CLI의 JSON 출력과 섞이지 않도록 stderr로
+    with contextlib.redirect_stdout(sys.stderr):
+        emotion = emotion_analysis.analyze_emotion(image_path)
+    result = get_index().recommend(emotion, k, size)
+    result["emotion"] = emotion
+    return result
+
+def benchmark_lookup(n=1000, k=3, size=512):
+    """무작위 FER+ 분포 n개로 조회 지연 분위수와 추천당 평균 제공 바이트 측정"""
+    index = get_index()
+    rng = np.random.default_rng(0)
+    latencies = []
+    served = []
+    original = []
+    for probs in rng.dirichlet(np.ones(len(FERPLUS_EMOTIONS)), size=n):
+        result = index.recommend(probs, k, size)
+        latencies.append(result["lookup_ms"])
+        served.append(result["bytes_served"])
+        original.append(result["original_bytes"])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "lookups": n,
+        "artworks": len(index.artworks),
+        "thumbnails": index.has_thumbnails,
+        "lookup_ms": {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4)},
+        "bytes_served_avg": int(np.mean(served)),
+        "original_bytes_avg": int(np.mean(original)),
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("사용법: python artwork_index.py build|validate|recommend <image_path|확률 JSON> [k] [size]|bench [n]")
+        sys.exit(1)
+    command = sys.argv[1]
+    try:
+        if command == "build":
+            output = build_index()
+        elif command == "validate":
+            index = ArtworkIndex()
+            output = {"artworks": len(index.artworks), "missing": index.missing, "thumbnails": index.has_thumbnails}
+        elif command == "recommend":
+            target = sys.argv[2]
+            k = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+            size = int(sys.argv[4]) if len(sys.argv) > 4 else 512
+            if os.path.exists(target):
+                output = recommend_for_image(target, k, size)
+            else:
+                output = get_index().recommend(json.loads(target), k, size)
+        elif command == "bench":
+            output = benchmark_lookup(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+        else:
+            raise ValueError(f"알 수 없는 명령입니다: {command}")
+        print(json.dumps(output, ensure_ascii=False))
+    except Exception as e:
+        print(f"명화 추천 처리 중 오류: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,289 @@
+# bench_suite.py
+"""
+Python 4단계(배경 제거/감정 분석/브러시/경량 브러시) 재현 가능한 벤치마크
+brush는 운영과 같은 진입점(apply_brush_effect, BRUSH_ENGINE 기본 fused), brush_pil은 기존 PIL 엔진을 따로 측정합니다.
+고정 시드로 만든 테스트 이미지(0.3/2/12MP, 알파 유무)로 단계마다 새 프로세스를 띄워
+콜드(첫 호출, import/모델 로드 포함)와 웜(반복 호출) 시간을 재고 JSON으로 기록합니다.
+단계 함수의 print 출력은 측정 프로세스에서 /dev/null로 버리고, 결과 캐시는 끕니다(RESULT_CACHE=0).
+
+측정 항목 (단계 × 이미지별):
+- cold: 첫 호출 wall_ms / cpu_ms
+- warm: 반복 호출 wall_ms / cpu_ms 중앙값과 최솟값
+- rss_before_mb / peak_rss_mb: 단계 import 전 RSS, 콜드+웜 실행까지의 프로세스 최대 RSS (VmHWM)
+- alloc_peak_mb / alloc_blocks_delta: 추가 1회 호출을 tracemalloc으로 추적한 최대 할당량(NumPy 포함)과
+  호출 전후 살아 있는 Python 메모리 블록 수 변화 (시간 측정과 분리)
+
+모델이 필요한 단계는 가중치가 없으면 건너뜀 (오프라인 실행 가능):
+- remove_bg: rembg 패키지 + MODEL_DIR/u2net.onnx
+- emotion: BENCH_EMOTION_MODEL 또는 emotion_analysis.ONNX_MODEL
+
+환경 변수:
+  BENCH_STAGES (기본 remove_bg,emotion,brush,brush_pil,light), BENCH_SIZES (기본 0.3,2,12 - MP 단위)
+  BENCH_REPEAT (웜 반복 횟수, 기본 3), BENCH_THRESHOLD (회귀 판정 비율, 기본 0.15)
+  BENCH_IMAGE_DIR (테스트 이미지 위치, 기본 /tmp/meart-bench), BENCH_EMOTION_MODEL
+
+사용법:
+  python bench_suite.py [<out.json>] [<baseline.json>]
+  # 결과 JSON 저장, 기준 결과를 주면 웜 중앙값이 BENCH_THRESHOLD 넘게 느려진 항목을 보고하고 종료 코드 1
+"""
+import sys
+import os
+import json
+import time
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import importlib.util
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("remove_bg", "emotion", "brush", "brush_pil", "light")
+SELECTED_STAGES = [s for s in os.environ.get("BENCH_STAGES", ",".join(STAGES)).split(",") if s in STAGES]
+SIZES_MP = [float(s) for s in os.environ.get("BENCH_SIZES", "0.3,2,12").split(",") if s]
+REPEAT = int(os.environ.get("BENCH_REPEAT", "3"))
+THRESHOLD = float(os.environ.get("BENCH_THRESHOLD", "0.15"))
+IMAGE_DIR = os.environ.get("BENCH_IMAGE_DIR", os.path.join("/tmp", "meart-bench"))
+NOISE_FLOOR_MS = 5.0  # 이보다 작은 차이는 회귀로 보지 않음
+IMAGE_SEED = 1234
+
+# ---- 테스트 이미지 ----
+def _dimensions(megapixels):
+    """4:3 비율로 megapixels에 가장 가까운 크기"""
+    height = int(round((megapixels * 1e6 * 3 / 4) ** 0.5))
+    return height * 4 // 3, height
+
+def synthetic_image(megapixels, alpha):
+    """고정 시드 합성 사진 (그라디언트 + 타원 + 약한 노이즈), alpha면 중앙 인물 모양 알파 (나머지 완전 투명)"""
+    width, height = _dimensions(megapixels)
+    rng = np.random.default_rng(IMAGE_SEED)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    rgb = np.empty((height, width, 3), dtype=np.float32)
+    rgb[..., 0] = 255 * xx / width
+    rgb[..., 1] = 255 * yy / height
+    rgb[..., 2] = 128 + 100 * np.sin(xx / width * 12) * np.cos(yy / height * 9)
+    for _ in range(12):
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        rx, ry = rng.uniform(0.05, 0.2) * width, rng.uniform(0.05, 0.2) * height
+        mask = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1
+        rgb[mask] = rng.uniform(0, 255, 3)
+    rgb += rng.normal(0, 6, rgb.shape).astype(np.float32)
+    rgb = np.clip(rgb, 0, 255).astype(np.uint8)
+    if not alpha:
+        return Image.fromarray(rgb, "RGB")
+    inside = ((xx - width / 2) / (width * 0.25)) ** 2 + ((yy - height * 0.55) / (height * 0.4)) ** 2 <= 1
+    a = np.where(inside, 255, 0).astype(np.uint8)
+    return Image.fromarray(np.dstack([rgb, a]), "RGBA")
+
+def test_images():
+    """(이름, 경로) 목록 - 없는 이미지만 생성 (RGB는 JPEG 업로드, RGBA는 배경 제거 결과 PNG 형태)"""
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    images = []
+    for megapixels in SIZES_MP:
+        for alpha in (False, True):
+            name = f"{megapixels:g}mp_{'rgba' if alpha else 'rgb'}"
+            path = os.path.join(IMAGE_DIR, f"{name}.{'png' if alpha else 'jpg'}")
+            if not os.path.exists(path):
+                image = synthetic_image(megapixels, alpha)
+                if alpha:
+                    image.save(path)
+                else:
+                    image.save(path, quality=90)
+            images.append((name, path))
+    return images
+
+# ---- 단계 준비 (측정 프로세스 안에서 실행) ----
+def skip_reason(stage):
+    """오프라인에서 실행할 수 없는 단계면 이유 문자열, 아니면 None"""
+    if stage == "remove_bg":
+        if importlib.util.find_spec("rembg") is None:
+            return "rembg 패키지 없음"
+        model = os.path.join(os.environ.get("MODEL_DIR", "/tmp/u2net"), "u2net.onnx")
+        if not os.path.exists(model):
+            return f"모델 가중치 없음: {model}"
+    elif stage == "emotion":
+        model = os.environ.get("BENCH_EMOTION_MODEL") or os.path.join(BASE_DIR, "models", "emotion-ferplus-8.onnx")
+        if not os.path.exists(model):
+            return f"모델 가중치 없음: {model}"
+    return None
+
+def prepare_stage(stage, image_path, work_dir):
+    """호출할 때마다 단계를 한 번 실행하는 함수 (입력 디코딩 등 준비 비용은 제외)"""
+    if stage == "remove_bg":
+        import u2net_remove_bg
+        session = u2net_remove_bg.get_session()
+        output = os.path.join(work_dir, "remove_bg.png")
+        return lambda: u2net_remove_bg.process_image(image_path, output, session=session)
+    if stage == "emotion":
+        import emotion_analysis
+        if os.environ.get("BENCH_EMOTION_MODEL"):
+            emotion_analysis.ONNX_MODEL = os.environ["BENCH_EMOTION_MODEL"]
+        return lambda: emotion_analysis.analyze_emotion(image_path)
+    if stage in ("brush", "brush_pil"):
+        import brush_effect
+        with Image.open(image_path) as image:
+            image.load()
+        if stage == "brush_pil":
+            return lambda: brush_effect.apply_advanced_brush_effect_pil(image.copy(), seed=0)
+        return lambda: brush_effect.apply_brush_effect(image.copy(), seed=0)
+    if stage == "light":
+        import brush_effect_light
+        output = os.path.join(work_dir, "light.png")
+        return lambda: brush_effect_light.apply_artistic_effect(image_path, output, seed=0)
+    raise ValueError(f"지원하지 않는 단계입니다: {stage}")
+
+def _status_mb(field):
+    """/proc/self/status의 VmRSS/VmHWM (MB), Linux 외에는 None
+    (ru_maxrss는 exec 이전 부모 프로세스의 최대치까지 이어받으므로 VmHWM 사용)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _timed(fn):
+    w0, c0 = time.perf_counter(), time.process_time()
+    fn()
+    return (time.perf_counter() - w0) * 1000, (time.process_time() - c0) * 1000
+
+def measure_stage(stage, image_path, repeat, work_dir):
+    """측정 프로세스 본체: 콜드 1회 + 웜 repeat회 + 할당 추적 1회"""
+    rss_before = _status_mb("VmRSS")
+    w0, c0 = time.perf_counter(), time.process_time()
+    fn = prepare_stage(stage, image_path, work_dir)
+    fn()
+    cold = {"wall_ms": (time.perf_counter() - w0) * 1000, "cpu_ms": (time.process_time() - c0) * 1000}
+    warm = [_timed(fn) for _ in range(repeat)]
+
+    peak_rss = _status_mb("VmHWM")  # tracemalloc 오버헤드 제외
+
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    fn()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks_delta = sys.getallocatedblocks() - blocks_before
+
+    walls = [w for w, _ in warm]
+    cpus = [c for _, c in warm]
+    return {
+        "cold": {k: round(v, 2) for k, v in cold.items()},
+        "warm": {
+            "runs": repeat,
+            "wall_ms": round(statistics.median(walls), 2) if walls else None,
+            "wall_ms_min": round(min(walls), 2) if walls else None,
+            "cpu_ms": round(statistics.median(cpus), 2) if cpus else None,
+        },
+        "rss_before_mb": round(rss_before, 1) if rss_before is not None else None,
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+        "alloc_peak_mb": round(peak / 2**20, 2),
+        "alloc_blocks_delta": blocks_delta,
+    }
+
+def _child_main(stage, image_path, repeat, result_path):
+    # 단계 함수의 진행 로그는 측정 잡음이므로 fd 수준에서 버림
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    work_dir = os.path.dirname(result_path)
+    try:
+        result = measure_stage(stage, image_path, repeat, work_dir)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+# ---- 실행 / 비교 ----
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment_info():
+    import onnxruntime
+    import cv2
+    import PIL
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pillow": PIL.__version__,
+        "onnxruntime": onnxruntime.__version__,
+    }
+
+def run_suite():
+    images = test_images()
+    results = {}
+    env = dict(os.environ, RESULT_CACHE="0", PYTHONPATH=os.pathsep.join(
+        filter(None, [BASE_DIR, os.environ.get("PYTHONPATH")])))
+    for stage in SELECTED_STAGES:
+        reason = skip_reason(stage)
+        for name, path in images:
+            key = f"{stage}/{name}"
+            if reason:
+                results[key] = {"skipped": reason}
+                continue
+            result_path = os.path.join(IMAGE_DIR, "runs", f"{stage}_{name}.json")
+            os.makedirs(os.path.dirname(result_path), exist_ok=True)
+            if os.path.exists(result_path):
+                os.remove(result_path)
+            subprocess.run([sys.executable, os.path.abspath(__file__), "_run", stage, path, str(REPEAT), result_path],
+                           env=env, cwd=BASE_DIR)
+            try:
+                with open(result_path, encoding="utf-8") as f:
+                    results[key] = json.load(f)
+            except (OSError, ValueError):
+                results[key] = {"error": "측정 프로세스가 결과를 남기지 않았습니다"}
+            summary = results[key].get("warm", {}).get("wall_ms", results[key].get("error"))
+            print(f"{key}: {summary}", file=sys.stderr)
+    return {
+        "environment": environment_info(),
+        "config": {"stages": SELECTED_STAGES, "sizes_mp": SIZES_MP, "repeat": REPEAT,
+                   "brush_engine": os.environ.get("BRUSH_ENGINE", "fused").lower()},
+        "results": results,
+    }
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """웜 중앙값 wall_ms가 기준보다 threshold 비율(+ 잡음 하한) 넘게 느려진 항목 목록"""
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline.get("results", {}).get(key, {})
+        now_ms = result.get("warm", {}).get("wall_ms")
+        base_ms = base.get("warm", {}).get("wall_ms")
+        if now_ms is None or base_ms is None:
+            continue
+        if now_ms > base_ms * (1 + threshold) and now_ms - base_ms > NOISE_FLOOR_MS:
+            regressions.append({"key": key, "baseline_ms": base_ms, "current_ms": now_ms,
+                                "ratio": round(now_ms / base_ms, 3)})
+    return regressions
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "_run":
+        _child_main(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5])
+        sys.exit(0)
+    out_path = sys.argv[1] if len(sys.argv) > 1 else None
+    baseline_path = sys.argv[2] if len(sys.argv) > 2 else None
+    report = run_suite()
+    exit_code = 0
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("environment", {}).get("commit")
+        report["threshold"] = THRESHOLD
+        report["regressions"] = compare(report, baseline)
+        exit_code = 1 if report["regressions"] else 0
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False))
+    sys.exit(exit_code)
@@ -3,49 +3,145 @@
 """
 Neural Style Transfer 기반 브러쉬(유화) 효과 적용 스크립트
 참고: https://github.com/tensorflow/docs/blob/master/site/en/tutorials/generative/style_transfer.ipynb
-필요 패키지: tensorflow, tensorflow_hub, numpy, pillow
-설치: pip install tensorflow tensorflow_hub numpy pillow
-사용법: python brush_effect.py <input_path> <output_path> [<style_path>]
+필요 패키지: numpy, pillow, opencv-python (NST 사용 시 tensorflow, tensorflow_hub)
+설치: pip install tensorflow tensorflow_hub numpy pillow opencv-python
+사용법: python brush_effect.py [--progressive] <input_path> <output_path> [<style_path>]
+- --progressive: 저해상도 미리보기(<output>.preview.png)를 먼저 저장한 뒤 최종 결과 저장
 - input_path: 배경 제거된 인물 PNG
 - output_path: 스타일 트랜스퍼 결과 PNG
 - style_path: (선택) 유화 스타일 이미지 경로 (없으면 기본값)
 """
 import sys
 import numpy as np
-from PIL import Image, ImageFilter, ImageEnhance
+from PIL import Image, ImageFilter, ImageEnhance, ImageStat
+import cv2
 import os
 import gc
+import json
+import time
+import hashlib
+import importlib.util
+import shutil
+from functools import lru_cache
 
-# TensorFlow 관련 import 및 초기화 (오류 처리 포함)
-try:
-    import tensorflow as tf
-    import tensorflow_hub as hub
-    
-    # TensorFlow 메모리 최적화 설정 (조건부)
-    gpus = tf.config.list_physical_devices('GPU')
-    if gpus:
-        try:
-            tf.config.experimental.set_memory_growth(gpus[0], True)
-        except RuntimeError:
-            pass
-    
-    TENSORFLOW_AVAILABLE = True
-    print("TensorFlow 및 TensorFlow Hub 로드 완료")
-except ImportError as e:
-    print(f"TensorFlow 로드 실패: {e}")
-    print("PIL 기반 브러시 효과로 대체됩니다.")
-    TENSORFLOW_AVAILABLE = False
+from result_cache import get_cache
+from alpha_region import process_foreground, benchmark_tile_scaling, ALPHA_CROP
+from texture_noise import tile_noise, resolve_seed, requested_seed
+from tracing import span, request
+import image_io
+import image_loader
+
+# PIL 대체 브러시 엔진 선택: fused(단일 버퍼 NumPy/OpenCV, 기본) | pil(기존 구현)
+BRUSH_ENGINE = os.environ.get("BRUSH_ENGINE", "fused").lower()
+# 점진적 미리보기의 긴 변 길이 (px)
+PREVIEW_SIDE = int(os.environ.get("BRUSH_PREVIEW_SIDE", "256"))
+
+# TensorFlow는 NST가 실제로 선택될 때만 import (PIL 경로는 TensorFlow 로드 비용 없이 시작)
+TENSORFLOW_AVAILABLE = (importlib.util.find_spec('tensorflow') is not None
+                        and importlib.util.find_spec('tensorflow_hub') is not None)
+tf = None
+hub = None
+
+def load_tensorflow():
+    """TensorFlow/TensorFlow Hub를 최초 사용 시 한 번만 import"""
+    global tf, hub
+    if tf is None:
+        import tensorflow as _tf
+        import tensorflow_hub as _hub
+
+        # TensorFlow 메모리 최적화 설정 (조건부)
+        gpus = _tf.config.list_physical_devices('GPU')
+        if gpus:
+            try:
+                _tf.config.experimental.set_memory_growth(gpus[0], True)
+            except RuntimeError:
+                pass
+        tf, hub = _tf, _hub
+        print("TensorFlow 및 TensorFlow Hub 로드 완료")
+    return tf
+
+# ---- 로컬 모델 저장소 ----
+# STYLE_MODEL_DIR에 SavedModel(+ 분리형 TFLite)과 MANIFEST.sha256(sha256sum 형식)을 두면
+# 네트워크 없이 로컬에서 로드합니다. STYLE_MODEL_OFFLINE=1이면 원격 다운로드를 시도하지 않습니다.
+STYLE_MODEL_URL = 'https://tfhub.dev/google/magenta/arbitrary-image-stylization-v1-256/2'
+STYLE_MODEL_DIR = os.environ.get(
+    'STYLE_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'magenta-arbitrary-image-stylization-v1-256')
+)
+STYLE_MODEL_OFFLINE = os.environ.get('STYLE_MODEL_OFFLINE', '0') == '1'
+MODEL_MANIFEST = 'MANIFEST.sha256'
+
+_verified_model_dirs = set()
+
+def write_model_manifest(model_dir):
+    """모델 디렉터리의 모든 파일에 대한 SHA-256 목록 작성"""
+    entries = []
+    for root, _dirs, files in os.walk(model_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, model_dir).replace(os.sep, '/')
+            if rel != MODEL_MANIFEST:
+                entries.append((rel, file_sha256(path)))
+    with open(os.path.join(model_dir, MODEL_MANIFEST), 'w', encoding='utf-8') as f:
+        for rel, digest in sorted(entries):
+            f.write(f'{digest}  {rel}\n')
+    return len(entries)
+
+def verify_model_dir(model_dir):
+    """MANIFEST.sha256 기준으로 로컬 모델 파일 무결성 검증 (프로세스당 한 번)"""
+    if model_dir in _verified_model_dirs:
+        return True
+    manifest_path = os.path.join(model_dir, MODEL_MANIFEST)
+    if not os.path.exists(manifest_path):
+        print(f"모델 체크섬 파일이 없습니다: {manifest_path}")
+        return False
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            expected, rel = line.rstrip('\n').split('  ', 1)
+            path = os.path.join(model_dir, rel)
+            if not os.path.exists(path) or file_sha256(path) != expected:
+                print(f"모델 파일 체크섬 불일치: {rel}")
+                return False
+    _verified_model_dirs.add(model_dir)
+    return True
+
+def local_style_model_available():
+    return os.path.exists(os.path.join(STYLE_MODEL_DIR, 'saved_model.pb'))
+
+def vendor_style_model(dest_dir=None):
+    """원격 모델을 한 번 받아 로컬 저장소에 복사하고 체크섬 목록을 작성"""
+    dest_dir = dest_dir or STYLE_MODEL_DIR
+    load_tensorflow()
+    os.makedirs(dest_dir, exist_ok=True)
+    shutil.copytree(hub.resolve(STYLE_MODEL_URL), dest_dir, dirs_exist_ok=True)
+    for kind, url in STYLE_MODEL_URLS.items():
+        shutil.copyfile(tf.keras.utils.get_file(f'{STYLE_MODEL_VERSION}-{kind}.tflite', url),
+                        os.path.join(dest_dir, f'{kind}.tflite'))
+    count = write_model_manifest(dest_dir)
+    print(f"스타일 모델 로컬 저장 완료: {dest_dir} ({count}개 파일)")
+    return {"model_dir": dest_dir, "files": count}
 
 # 전역 변수로 모델 캐시
 _hub_model = None
 
 def get_hub_model():
-    """모델을 한 번만 로드하고 캐시 (네트워크 오류 처리 포함)"""
+    """모델을 한 번만 로드하고 캐시 (로컬 저장소 우선, 네트워크 오류 처리 포함)"""
     global _hub_model
     if _hub_model is None:
+        load_tensorflow()
+        if local_style_model_available():
+            if not verify_model_dir(STYLE_MODEL_DIR):
+                raise RuntimeError(f"로컬 스타일 모델 검증 실패: {STYLE_MODEL_DIR}")
+            _hub_model = hub.load(STYLE_MODEL_DIR)
+            print(f"로컬 스타일 모델 로드 완료: {STYLE_MODEL_DIR}")
+            return _hub_model
+        if STYLE_MODEL_OFFLINE:
+            raise RuntimeError(f"오프라인 모드인데 로컬 스타일 모델이 없습니다: {STYLE_MODEL_DIR}")
         try:
             print("TensorFlow Hub 모델 다운로드 중... (최초 실행 시 시간이 걸릴 수 있습니다)")
-            _hub_model = hub.load('https://tfhub.dev/google/magenta/arbitrary-image-stylization-v1-256/2')
+            _hub_model = hub.load(STYLE_MODEL_URL)
             print("TensorFlow Hub 모델 로드 완료")
         except Exception as e:
             print(f"TensorFlow Hub 모델 로드 실패: {e}")
@@ -53,8 +149,13 @@ def get_hub_model():
             raise e
     return _hub_model
 
+def open_rgb(source):
+    """파일 경로 또는 메모리상의 PIL 이미지를 RGB 이미지로 반환"""
+    img = source if isinstance(source, Image.Image) else Image.open(source)
+    return img.convert('RGB')
+
 def load_img(path, max_dim=512):  # 최대 크기를 512로 증가하여 해상도 향상
-    img = Image.open(path).convert('RGB')
+    img = open_rgb(path)
     img = np.array(img)
     h, w = img.shape[:2]
     scale = max_dim / max(h, w)
@@ -71,8 +172,144 @@ def tensor_to_image(tensor):
         tensor = tensor[0]
     return Image.fromarray(tensor)
 
-def apply_advanced_brush_effect_pil(image):
-    """고품질 PIL 기반 브러시 효과 (TensorFlow 대체용) - 알파 채널 보존"""
+# ---- 스타일 bottleneck 캐시 ----
+# Magenta arbitrary-stylization은 스타일 예측망(스타일 이미지 → 100차원 bottleneck)과
+# 변환망(콘텐츠 + bottleneck → 결과)으로 나뉩니다. 스타일은 BG_image의 고정된 명화이므로
+# 예측망 결과를 파일 해시 기준으로 디스크에 저장해 두고 요청마다 변환망만 실행합니다.
+# (hub.load 모델은 두 부분이 하나의 시그니처로 묶여 있어 분리 공개된 TFLite 모델을 사용)
+BG_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BG_image')
+STYLE_CACHE_DIR = os.environ.get('STYLE_CACHE_DIR', os.path.join(BG_IMAGE_DIR, 'style_cache'))
+STYLE_MODEL_VERSION = 'magenta-v1-256-fp16-1'
+STYLE_MODEL_URLS = {
+    'prediction': 'https://tfhub.dev/google/lite-model/magenta/arbitrary-image-stylization-v1-256/fp16/prediction/1?lite-format=tflite',
+    'transfer': 'https://tfhub.dev/google/lite-model/magenta/arbitrary-image-stylization-v1-256/fp16/transfer/1?lite-format=tflite',
+}
+STYLE_IMAGE_SIZE = 256
+CONTENT_IMAGE_SIZE = 384
+# cached(기본): bottleneck 캐시 + 변환망만 실행 / hub: 기존 전체 모델 실행
+STYLE_TRANSFER_MODE = os.environ.get('STYLE_TRANSFER_MODE', 'cached').lower()
+
+_style_interpreters = {}
+
+def get_style_interpreter(kind):
+    """스타일 예측망/변환망 TFLite 인터프리터를 한 번만 로드하고 캐시"""
+    if kind not in _style_interpreters:
+        load_tensorflow()
+        model_file = os.path.join(STYLE_MODEL_DIR, f'{kind}.tflite')
+        if os.path.exists(model_file):
+            if not verify_model_dir(STYLE_MODEL_DIR):
+                raise RuntimeError(f"로컬 스타일 모델 검증 실패: {STYLE_MODEL_DIR}")
+        elif STYLE_MODEL_OFFLINE:
+            raise RuntimeError(f"오프라인 모드인데 로컬 스타일 모델이 없습니다: {model_file}")
+        else:
+            model_file = tf.keras.utils.get_file(f'{STYLE_MODEL_VERSION}-{kind}.tflite', STYLE_MODEL_URLS[kind])
+        interpreter = tf.lite.Interpreter(model_path=model_file)
+        interpreter.allocate_tensors()
+        _style_interpreters[kind] = interpreter
+    return _style_interpreters[kind]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def style_cache_path(style_path):
+    return os.path.join(STYLE_CACHE_DIR, f'{file_sha256(style_path)}-{STYLE_MODEL_VERSION}.npy')
+
+def load_square_img(path, size, crop=True):
+    """정사각형 모델 입력으로 변환 (crop=True면 짧은 변 기준 중앙 crop, 아니면 전체를 늘려서 맞춤)"""
+    img = open_rgb(path)
+    if crop:
+        w, h = img.size
+        side = min(w, h)
+        left, top = (w - side) // 2, (h - side) // 2
+        img = img.crop((left, top, left + side, top + side))
+    img = img.resize((size, size), Image.LANCZOS)
+    return np.expand_dims(np.asarray(img, dtype=np.float32) / 255.0, axis=0)
+
+def predict_style_bottleneck(style_path):
+    interpreter = get_style_interpreter('prediction')
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], load_square_img(style_path, STYLE_IMAGE_SIZE))
+    interpreter.invoke()
+    return interpreter.get_tensor(interpreter.get_output_details()[0]['index']).copy()
+
+def get_style_bottleneck(style_path):
+    """캐시된 스타일 bottleneck 반환 (없으면 예측망을 한 번 실행해 저장)"""
+    cache_path = style_cache_path(style_path)
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+    print(f"스타일 bottleneck 계산 중: {os.path.basename(style_path)}")
+    bottleneck = predict_style_bottleneck(style_path)
+    os.makedirs(STYLE_CACHE_DIR, exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, bottleneck)
+    os.replace(tmp_path, cache_path)
+    return bottleneck
+
+def stylize_with_bottleneck(content_path, bottleneck, max_dim=512):
+    """변환망만 실행해 스타일을 입힌 이미지를 반환 (출력은 load_img와 같은 비율/크기)"""
+    interpreter = get_style_interpreter('transfer')
+    content = load_square_img(content_path, CONTENT_IMAGE_SIZE, crop=False)
+    for detail in interpreter.get_input_details():
+        # 입력: 콘텐츠 (1,384,384,3) / 스타일 bottleneck (1,1,1,100)
+        interpreter.set_tensor(detail['index'], content if detail['shape'][-1] == 3 else bottleneck)
+    interpreter.invoke()
+    out_img = tensor_to_image(interpreter.get_tensor(interpreter.get_output_details()[0]['index']))
+    # 정사각형으로 늘렸던 콘텐츠 비율 복원
+    if isinstance(content_path, Image.Image):
+        w, h = content_path.size
+    else:
+        with Image.open(content_path) as im:
+            w, h = im.size
+    scale = max_dim / max(w, h)
+    return out_img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+
+def run_style_transfer(input_path, style_path):
+    """Neural Style Transfer 실행 (캐시 bottleneck 경로 우선, 실패 시 전체 hub 모델)
+
+    input_path는 파일 경로 또는 PIL 이미지
+    """
+    if STYLE_TRANSFER_MODE == 'cached':
+        try:
+            return stylize_with_bottleneck(input_path, get_style_bottleneck(style_path))
+        except Exception as e:
+            print(f"캐시 스타일 경로 실패: {e}")
+            print("전체 TensorFlow Hub 모델로 재시도합니다...")
+    content_image = load_img(input_path)
+    style_image = load_img(style_path)
+    # 캐시된 모델 사용
+    hub_model = get_hub_model()
+    stylized_image = hub_model(tf.constant(content_image), tf.constant(style_image))[0]
+    return tensor_to_image(stylized_image)
+
+def indexed_style_paths():
+    """emotion_index.json에 등록된 모든 명화 경로 (중복 제거, 실제 존재하는 파일만)"""
+    with open(os.path.join(BG_IMAGE_DIR, 'emotion_index.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    paths = []
+    for emotion in index.get('emotions', {}).values():
+        for artwork in emotion.get('artworks', []):
+            path = os.path.join(BG_IMAGE_DIR, artwork['filename'])
+            if path not in paths and os.path.exists(path):
+                paths.append(path)
+    return paths
+
+def precompute_style_bottlenecks(style_paths=None):
+    """스타일 bottleneck 일괄 사전 계산 (이미 캐시된 파일은 건너뜀)"""
+    style_paths = style_paths or indexed_style_paths()
+    computed = 0
+    for path in style_paths:
+        if not os.path.exists(style_cache_path(path)):
+            get_style_bottleneck(path)
+            computed += 1
+    print(f"스타일 bottleneck 준비 완료: {len(style_paths)}개 중 {computed}개 새로 계산 ({STYLE_CACHE_DIR})")
+    return {"styles": len(style_paths), "computed": computed, "cache_dir": STYLE_CACHE_DIR}
+
+def apply_advanced_brush_effect_pil(image, seed=None):
+    """고품질 PIL 기반 브러시 효과 (TensorFlow 대체용) - 알파 채널 보존 (seed: 노이즈 시드)"""
     print("고급 PIL 브러시 효과 적용 중...")
     
     # 0. 알파 채널 보존을 위해 RGBA로 변환
@@ -100,77 +337,87 @@ def apply_advanced_brush_effect_pil(image):
     if max_dimension > target_size:
         scale_factor = target_size / max_dimension
         new_size = (int(original_size[0] * scale_factor), int(original_size[1] * scale_factor))
-        image = image.resize(new_size, Image.LANCZOS)
-        if has_alpha:
-            alpha_channel = alpha_channel.resize(new_size, Image.LANCZOS)
+        with span("resize"):
+            image = image.resize(new_size, Image.LANCZOS)
+            if has_alpha:
+                alpha_channel = alpha_channel.resize(new_size, Image.LANCZOS)
         print(f"모바일 최적화 크기 조정: {original_size} → {new_size} (target: {target_size}px)")
     
     # 2. 부드러운 블러 효과 (더 자연스러운 유화 느낌)
-    image = image.filter(ImageFilter.GaussianBlur(radius=1.5))  # 1.0 → 1.5로 증가
+    with span("filter.blur"):
+        image = image.filter(ImageFilter.GaussianBlur(radius=1.5))  # 1.0 → 1.5로 증가
     
-    # 2-1. 미세한 추가 블러 레이어 (부드러운 유화 효과)
-    soft_blur = image.filter(ImageFilter.GaussianBlur(radius=2.5))  # 2.0 → 2.5로 증가
-    image = Image.blend(image, soft_blur, 0.45)  # 35% → 45% 블렌딩으로 증가
+        # 2-1. 미세한 추가 블러 레이어 (부드러운 유화 효과)
+        soft_blur = image.filter(ImageFilter.GaussianBlur(radius=2.5))  # 2.0 → 2.5로 증가
+        image = Image.blend(image, soft_blur, 0.45)  # 35% → 45% 블렌딩으로 증가
     
-    # 2-2. 추가 스무딩 레이어 (얼룩덜룩함 방지)
-    smooth_layer = image.filter(ImageFilter.GaussianBlur(radius=1.8))  # 1.2 → 1.8로 증가
-    image = Image.blend(image, smooth_layer, 0.25)  # 15% → 25% 추가 블렌딩
+        # 2-2. 추가 스무딩 레이어 (얼룩덜룩함 방지)
+        smooth_layer = image.filter(ImageFilter.GaussianBlur(radius=1.8))  # 1.2 → 1.8로 증가
+        image = Image.blend(image, smooth_layer, 0.25)  # 15% → 25% 추가 블렌딩
     
     # 3. 색상 강화 및 조정 (극도로 부드럽게)
-    enhancer = ImageEnhance.Color(image)
-    image = enhancer.enhance(1.05)  # 색상 강화 (1.08 → 1.05로 더 감소)
+    with span("filter.enhance"):
+        enhancer = ImageEnhance.Color(image)
+        image = enhancer.enhance(1.05)  # 색상 강화 (1.08 → 1.05로 더 감소)
     
-    # 4. 대비 강화 (극도로 부드럽게)
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(1.05)  # 대비 강화 (1.1 → 1.05로 더 감소)
+        # 4. 대비 강화 (극도로 부드럽게)
+        enhancer = ImageEnhance.Contrast(image)
+        image = enhancer.enhance(1.05)  # 대비 강화 (1.1 → 1.05로 더 감소)
     
-    # 5. 밝기 미세 조정 (자연스럽게)
-    enhancer = ImageEnhance.Brightness(image)
-    image = enhancer.enhance(1.01)  # 밝기 증가 (1.03 → 1.01로 더 감소)
+        # 5. 밝기 미세 조정 (자연스럽게)
+        enhancer = ImageEnhance.Brightness(image)
+        image = enhancer.enhance(1.01)  # 밝기 증가 (1.03 → 1.01로 더 감소)
     
-    # 6. 선명도 조정 (극도로 부드럽게)
-    enhancer = ImageEnhance.Sharpness(image)
-    image = enhancer.enhance(0.6)  # 극도로 부드럽게 (0.7 → 0.6으로 더 감소)
+        # 6. 선명도 조정 (극도로 부드럽게)
+        enhancer = ImageEnhance.Sharpness(image)
+        image = enhancer.enhance(0.6)  # 극도로 부드럽게 (0.7 → 0.6으로 더 감소)
     
     # 7. 고급 노이즈 효과 (유화 브러시 터치 느낌)
-    img_array = np.array(image)
+    with span("filter.noise"):
+        img_array = np.array(image)
     
-    # 노이즈 패턴 생성 (극도로 미세한 유화 느낌, 얼룩덜룩함 최소화)
-    noise_pattern = np.random.normal(0, 0.4, img_array.shape[:2])  # 0.8 → 0.4로 대폭 감소
-    noise_pattern = np.clip(noise_pattern, -1, 1)  # -2,2 → -1,1로 대폭 감소
+        # 노이즈 패턴 생성 (극도로 미세한 유화 느낌, 얼룩덜룩함 최소화)
+        noise_pattern = tile_noise(resolve_seed(seed), 0, img_array.shape[0], 0, img_array.shape[1], scale=0.4)  # 0.8 → 0.4로 대폭 감소
+        np.clip(noise_pattern, -1, 1, out=noise_pattern)  # -2,2 → -1,1로 대폭 감소
     
-    # RGB 채널별로 노이즈 적용
-    for i in range(3):
-        img_array[:, :, i] = np.clip(img_array[:, :, i] + noise_pattern, 0, 255)
+        # RGB 채널 공통으로 노이즈 적용 (uint8로 되돌릴 때 절사)
+        noisy = img_array.astype(np.float32)
+        noisy += noise_pattern[:, :, np.newaxis]
+        np.clip(noisy, 0, 255, out=noisy)
+        img_array = noisy.astype(np.uint8)
+        del noisy, noise_pattern
     
     # 8. 피부톤 강화 색상 조정 (자연스러운 피부톤)
-    img_array = img_array.astype(np.float32)
+    with span("filter.tone"):
+        img_array = img_array.astype(np.float32)
     
-    # 피부톤을 위한 따뜻한 색감 강화
-    img_array[:, :, 0] = np.clip(img_array[:, :, 0] * 1.05, 0, 255)  # 빨강 증가 (피부톤)
-    img_array[:, :, 1] = np.clip(img_array[:, :, 1] * 1.02, 0, 255)  # 녹색 미세 증가 (자연스러운 피부톤)
-    img_array[:, :, 2] = np.clip(img_array[:, :, 2] * 0.95, 0, 255)  # 파랑 감소 (따뜻한 톤)
-    img_array = img_array.astype(np.uint8)
+        # 피부톤을 위한 따뜻한 색감 강화
+        img_array[:, :, 0] = np.clip(img_array[:, :, 0] * 1.05, 0, 255)  # 빨강 증가 (피부톤)
+        img_array[:, :, 1] = np.clip(img_array[:, :, 1] * 1.02, 0, 255)  # 녹색 미세 증가 (자연스러운 피부톤)
+        img_array[:, :, 2] = np.clip(img_array[:, :, 2] * 0.95, 0, 255)  # 파랑 감소 (따뜻한 톤)
+        img_array = img_array.astype(np.uint8)
     
-    image = Image.fromarray(img_array)
+        image = Image.fromarray(img_array)
     
     # 9. 최종 미세 조정 (매우 자연스럽게)
-    enhancer = ImageEnhance.Color(image)
-    image = enhancer.enhance(1.02)  # 최종 색상 조정 (1.05 → 1.02로 더 감소)
+    with span("filter.smooth"):
+        enhancer = ImageEnhance.Color(image)
+        image = enhancer.enhance(1.02)  # 최종 색상 조정 (1.05 → 1.02로 더 감소)
     
-    # 9-1. 최종 부드러움 처리 (얼룩덜룩함 완전 제거)
-    final_smooth = image.filter(ImageFilter.GaussianBlur(radius=1.2))  # 0.8 → 1.2로 증가
-    image = Image.blend(image, final_smooth, 0.35)  # 20% → 35% 최종 스무딩으로 증가
+        # 9-1. 최종 부드러움 처리 (얼룩덜룩함 완전 제거)
+        final_smooth = image.filter(ImageFilter.GaussianBlur(radius=1.2))  # 0.8 → 1.2로 증가
+        image = Image.blend(image, final_smooth, 0.35)  # 20% → 35% 최종 스무딩으로 증가
     
-    # 9-2. 추가 부드러움 레이어 (완벽한 유화 질감)
-    ultra_smooth = image.filter(ImageFilter.GaussianBlur(radius=2.0))
-    image = Image.blend(image, ultra_smooth, 0.15)  # 추가 15% 초부드러움
+        # 9-2. 추가 부드러움 레이어 (완벽한 유화 질감)
+        ultra_smooth = image.filter(ImageFilter.GaussianBlur(radius=2.0))
+        image = Image.blend(image, ultra_smooth, 0.15)  # 추가 15% 초부드러움
     
     # 10. 원본 크기로 복원
     if image.size != original_size:
-        image = image.resize(original_size, Image.LANCZOS)
-        if has_alpha:
-            alpha_channel = alpha_channel.resize(original_size, Image.LANCZOS)
+        with span("resize"):
+            image = image.resize(original_size, Image.LANCZOS)
+            if has_alpha:
+                alpha_channel = alpha_channel.resize(original_size, Image.LANCZOS)
         print(f"원본 크기로 복원: {image.size}")
     
     # 11. 알파 채널 복원
@@ -181,9 +428,407 @@ def apply_advanced_brush_effect_pil(image):
     print("고급 PIL 브러시 효과 완료!")
     return image
 
+# ---- 단일 버퍼 NumPy/OpenCV 브러시 엔진 ----
+# apply_advanced_brush_effect_pil과 같은 효과를 float32 버퍼 하나에서 처리합니다.
+# - 연쇄 GaussianBlur + blend(2~4단계, 선명도 0.6)는 가우시안 합성 커널 1개로,
+#   후반 스무딩(9-1, 9-2)은 커널 1개로 접어서 필터 2회만 실행 (각 커널은 분리형 2항으로 근사)
+# - 색상/대비/밝기는 노이즈 전 아핀 변환 1회, 채널 게인/최종 색상은 노이즈 후 1회로 합성
+#   (PIL처럼 중간에 0~255 클리핑이 있어야 밝은 이미지에서 결과가 어긋나지 않음)
+# - PIL은 blend/enhance마다 uint8로 절사(평균 -0.5)하므로 그 누적 편향을 바이어스 항에 반영
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float64)
+
+def _gaussian_kernel_1d(sigma, radius):
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    k = np.exp(-0.5 * (x / sigma) ** 2)
+    return k / k.sum()
+
+def _blend_kernel(terms, radius):
+    """sum(weight * G(sigma)) 형태의 2D 커널 (sigma=0은 항등 커널)"""
+    size = 2 * radius + 1
+    kernel = np.zeros((size, size), dtype=np.float64)
+    for weight, sigma in terms:
+        if sigma == 0:
+            kernel[radius, radius] += weight
+        else:
+            g = _gaussian_kernel_1d(sigma, radius)
+            kernel += weight * np.outer(g, g)
+    return kernel
+
+def _compose(*blend_stages):
+    """(1-a)·I + a·G(s) 단계들의 합성 -> 가우시안 혼합 항 목록 (분산이 더해지는 성질 이용)"""
+    terms = [(1.0, 0.0)]
+    for stage in blend_stages:
+        terms = [(w1 * w2, np.sqrt(s1 ** 2 + s2 ** 2)) for w1, s1 in terms for w2, s2 in stage]
+    return terms
+
+@lru_cache(maxsize=1)
+def _fused_brush_kernels():
+    # 2: blur 1.5 / 2-1: 45% blur 2.5 / 2-2: 25% blur 1.8
+    early = _compose([(1.0, 1.5)], [(0.55, 0), (0.45, 2.5)], [(0.75, 0), (0.25, 1.8)])
+    early_radius = int(np.ceil(3 * max(s for _, s in early)))
+    k1 = _blend_kernel(early, early_radius)
+    # 6: Sharpness 0.6 = 0.4·SMOOTH + 0.6·I (정규화 커널이므로 아핀 색 변환과 순서 교환 가능)
+    smooth = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float64) / 13
+    sharpen = np.zeros_like(smooth)
+    sharpen[1, 1] = 0.6
+    sharpen += 0.4 * smooth
+    k1 = cv2.filter2D(np.pad(k1, 1), -1, sharpen, borderType=cv2.BORDER_CONSTANT)
+    # 9-1: 35% blur 1.2 / 9-2: 15% blur 2.0
+    late = _compose([(0.65, 0), (0.35, 1.2)], [(0.85, 0), (0.15, 2.0)])
+    late_radius = int(np.ceil(3 * max(s for _, s in late)))
+    k2 = _blend_kernel(late, late_radius)
+    return _separable_terms(k1), _separable_terms(k2)
+
+def _separable_terms(kernel, tol=1e-2):
+    """SVD로 2D 커널을 분리형 (kx, ky) 항 몇 개로 분해 (가우시안 혼합은 2항이면 오차 < 0.1 레벨)"""
+    u, s, vt = np.linalg.svd(kernel)
+    keep = [i for i in range(len(s)) if s[i] >= tol * s[0]]
+    # 버린 항만큼 커널 합(밝기)이 줄지 않도록 합을 원래 커널에 맞춤
+    gain = kernel.sum() / sum(s[i] * u[:, i].sum() * vt[i].sum() for i in keep)
+    return [
+        ((vt[i] * np.sqrt(s[i])).astype(np.float32), (u[:, i] * np.sqrt(s[i]) * gain).astype(np.float32))
+        for i in keep
+    ]
+
+def _filter_inplace(buf, terms, tmp):
+    """분리형 항들의 합으로 buf를 in-place 필터링 (tmp는 재사용 버퍼)"""
+    (kx, ky), rest = terms[0], terms[1:]
+    for extra_kx, extra_ky in rest[:1]:
+        cv2.sepFilter2D(buf, -1, extra_kx, extra_ky, dst=tmp, borderType=cv2.BORDER_REPLICATE)
+    for extra_kx, extra_ky in rest[1:]:
+        tmp += cv2.sepFilter2D(buf, -1, extra_kx, extra_ky, borderType=cv2.BORDER_REPLICATE)
+    cv2.sepFilter2D(buf, -1, kx, ky, dst=buf, borderType=cv2.BORDER_REPLICATE)
+    if rest:
+        buf += tmp
+
+def _color_matrix(factor):
+    """ImageEnhance.Color: gray + f·(x - gray)"""
+    return factor * np.eye(3) + (1 - factor) * np.outer(np.ones(3), LUMA)
+
+TRUNCATION_BIAS = 0.5
+
+def _fused_affine(mean_rgb):
+    """노이즈 전(3: 색상 1.05 → 4: 대비 1.05 → 5: 밝기 1.01)과 노이즈 후(8: 채널 게인 → 9: 색상 1.02) 아핀 행렬 (3x4)"""
+    # 대비 기준값은 PIL과 같이 색상 조정 후 휘도 평균(정수 반올림); 색상 조정은 휘도 평균을 바꾸지 않음
+    mean_l = int(LUMA @ mean_rgb + 0.5)
+    a = 1.01 * 1.05 * _color_matrix(1.05)
+    c = 1.01 * (1 - 1.05) * mean_l * np.ones(3)
+    # 절사 횟수: blend 2회 + 선명도/색상/대비/밝기 4회
+    c -= 6 * TRUNCATION_BIAS
+    post = _color_matrix(1.02) @ np.diag([1.05, 1.02, 0.95])
+    # 절사 횟수: 노이즈 + 채널 게인 + 색상 1.02 + 후반 blend 2회
+    post_bias = -5 * TRUNCATION_BIAS * np.ones(3)
+    return np.hstack([a, c[:, None]]), np.hstack([post, post_bias[:, None]])
+
+def _fused_brush_core(rgb, origin, pre, post, seed):
+    """브러시 필터/색 변환/노이즈 체인 (uint8 RGB 창 -> uint8 RGB, origin은 창의 절대 좌표)"""
+    # 이후 모든 단계는 float32 버퍼 하나에서 in-place로 처리
+    buf = rgb.astype(np.float32)
+    k1, k2 = _fused_brush_kernels()
+    tmp = np.empty_like(buf)
+    _filter_inplace(buf, k1, tmp)
+
+    cv2.transform(buf, pre, dst=buf)
+    np.clip(buf, 0, 255, out=buf)
+
+    # 7. 노이즈 (채널 공통 패턴, ±1 클리핑)
+    y0, x0 = origin
+    noise = tile_noise(seed, y0, y0 + buf.shape[0], x0, x0 + buf.shape[1], scale=0.4)
+    np.clip(noise, -1, 1, out=noise)
+    buf += noise[:, :, np.newaxis]
+    del noise
+
+    cv2.transform(buf, post, dst=buf)
+    np.clip(buf, 0, 255, out=buf)
+    _filter_inplace(buf, k2, tmp)
+    del tmp
+    np.clip(buf, 0, 255, out=buf)
+    np.rint(buf, out=buf)
+    return buf.astype(np.uint8)
+
+def _fused_brush_margin():
+    """두 커널 반경 합 (전경 창 여백)"""
+    k1, k2 = _fused_brush_kernels()
+    return len(k1[0][0]) // 2 + len(k2[0][0]) // 2
+
+def apply_advanced_brush_effect_fused(image, seed=None, stats=None, workers=None):
+    """apply_advanced_brush_effect_pil의 단일 버퍼 구현 (결과는 허용 오차 내 동일) - 알파 채널 보존
+
+    투명 영역은 건너뛰고 알파 경계 상자(+ 커널 반경)만 처리합니다 (alpha_region 참고).
+    seed: 노이즈 시드 (같은 seed면 타일 수/워커 수와 관계없이 같은 결과, 없으면 매번 새 시드)
+    workers: 타일 병렬 스레드 수 (기본 TILE_WORKERS)
+    stats: dict를 넘기면 processed_ratio/tiles를 기록
+    """
+    print("고급 브러시 효과 적용 중 (fused 엔진)...")
+    has_alpha = image.mode == 'RGBA'
+    rgba = np.asarray(image.convert('RGBA') if has_alpha else image.convert('RGB'))
+    original_h, original_w = rgba.shape[:2]
+    max_dimension = max(original_w, original_h)
+
+    # 1. 크기 조정 (apply_advanced_brush_effect_pil과 동일한 목표 크기)
+    if max_dimension > 2048:
+        target_size = 1024
+    elif max_dimension > 1024:
+        target_size = 800
+    else:
+        target_size = max_dimension
+    if max_dimension > target_size:
+        scale_factor = target_size / max_dimension
+        new_size = (int(original_w * scale_factor), int(original_h * scale_factor))
+        with span("resize"):
+            work = cv2.resize(rgba, new_size, interpolation=cv2.INTER_AREA)
+    else:
+        work = rgba
+    alpha_channel = work[:, :, 3] if has_alpha else None
+
+    # 대비 기준 평균은 잘라낸 창이 아닌 전체 프레임 기준 (블러는 평균을 바꾸지 않음)
+    pre, post = _fused_affine(np.array(cv2.mean(work[:, :, :3])[:3], dtype=np.float64))
+    pre, post = pre.astype(np.float32), post.astype(np.float32)
+    seed = resolve_seed(seed)
+    with span("filter.fused"):
+        out = process_foreground(
+            work[:, :, :3], alpha_channel, lambda window, origin: _fused_brush_core(window, origin, pre, post, seed),
+            _fused_brush_margin(), stats, halo=4, workers=workers  # halo: 원본 크기 복원(Lanczos) 반경
+        )
+
+    # 10. 원본 크기로 복원
+    if out.shape[:2] != (original_h, original_w):
+        with span("resize"):
+            out = cv2.resize(out, (original_w, original_h), interpolation=cv2.INTER_LANCZOS4)
+            if has_alpha:
+                alpha_channel = cv2.resize(alpha_channel, (original_w, original_h), interpolation=cv2.INTER_LANCZOS4)
+        print(f"원본 크기로 복원: {(original_w, original_h)}")
+
+    # 11. 알파 채널 복원
+    if has_alpha:
+        result = Image.fromarray(np.dstack([out, alpha_channel]), 'RGBA')
+    else:
+        result = Image.fromarray(out, 'RGB')
+    print("고급 브러시 효과 완료 (fused 엔진)!")
+    return result
+
+def apply_brush_effect(image, stats=None, seed=None):
+    """BRUSH_ENGINE 설정에 따라 fused(기본) 또는 기존 PIL 구현으로 브러시 효과 적용"""
+    if BRUSH_ENGINE == 'pil':
+        return apply_advanced_brush_effect_pil(image, seed)
+    return apply_advanced_brush_effect_fused(image, seed, stats)
+
+def compare_brush_engines(input_path, repeat=3):
+    """PIL 구현과 fused 엔진의 속도 및 결과 차이(PSNR, 최대 오차) 비교 (두 엔진 모두 seed 0)"""
+    image = Image.open(input_path).convert('RGBA')
+    timings = {}
+    outputs = {}
+    for name, fn in (('pil', apply_advanced_brush_effect_pil), ('fused', apply_advanced_brush_effect_fused)):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            outputs[name] = fn(image, 0)  # 같은 노이즈 시드
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    a = np.asarray(outputs['pil'].convert('RGB'), dtype=np.float64)
+    b = np.asarray(outputs['fused'].convert('RGB'), dtype=np.float64)
+    mse = float(np.mean((a - b) ** 2))
+    return {
+        "image": os.path.basename(input_path),
+        "size": list(image.size),
+        "pil_ms": round(timings['pil'] * 1000, 2),
+        "fused_ms": round(timings['fused'] * 1000, 2),
+        "speedup": round(timings['pil'] / timings['fused'], 2),
+        "psnr_db": round(10 * np.log10(255 ** 2 / mse), 2) if mse else None,
+        "mean_abs_diff": round(float(np.mean(np.abs(a - b))), 3),
+        "max_abs_diff": int(np.max(np.abs(a - b))),
+    }
+
+def brush_tile_scaling(input_path, workers_list=(1, 2, 4, 8)):
+    """fused 엔진 타일 병렬 처리의 워커 수별 속도와 결과 동일 여부 (seed 고정)"""
+    image = Image.open(input_path).convert('RGBA')
+    report = benchmark_tile_scaling(
+        lambda workers: np.asarray(apply_advanced_brush_effect_fused(image, seed=0, workers=workers)), workers_list
+    )
+    return {"image": os.path.basename(input_path), "size": list(image.size), **report}
+
+def default_style_path():
+    """기본 스타일 이미지 (BG_image 폴더 내 임의의 유화 이미지, 없으면 None)"""
+    style_path = os.path.join(os.path.dirname(__file__), 'BG_image', 'the_bathers_1951.5.1.jpg')
+    if not os.path.exists(style_path):
+        print('기본 스타일 이미지가 없습니다. PIL 기반 효과로 대체됩니다.')
+        return None
+    return style_path
+
+def brush_image(orig_img, style_path=None, timings=None, seed=None):
+    """메모리상의 RGBA 이미지에 브러시 효과를 적용해 RGBA 이미지를 반환 (style_path가 있으면 NST 시도, seed: 노이즈 시드)"""
+    if timings is None:
+        timings = {}
+    t0 = time.perf_counter()
+    # TensorFlow Neural Style Transfer 시도
+    if TENSORFLOW_AVAILABLE and style_path and os.path.exists(style_path):
+        try:
+            print("Neural Style Transfer 시도 중...")
+            with span("filter.nst", mode=STYLE_TRANSFER_MODE):
+                out_img = run_style_transfer(orig_img, style_path)
+            timings["engine"] = "nst"
+            print("Neural Style Transfer 완료!")
+
+        except Exception as e:
+            print(f"Neural Style Transfer 실패: {e}")
+            print("PIL 기반 브러시 효과로 대체됩니다...")
+            out_img = apply_brush_effect(orig_img, timings, seed)
+            timings["engine"] = BRUSH_ENGINE
+    else:
+        # PIL 기반 브러시 효과 사용
+        print("PIL 기반 브러시 효과 사용...")
+        out_img = apply_brush_effect(orig_img, timings, seed)
+        timings["engine"] = BRUSH_ENGINE
+    timings["effect_ms"] = (time.perf_counter() - t0) * 1000
+
+    with span("filter.finish"):
+        # 알파 채널(투명도) 보존 및 투명 영역 보호
+        orig = orig_img.convert('RGBA')
+
+        # 원본 크기로 리사이즈 (해상도 보존)
+        if out_img.size != orig.size:
+            out_img = out_img.resize(orig.size, Image.LANCZOS)
+            print(f"이미지 크기 조정: {out_img.size} → {orig.size}")
+
+        # 브러시 효과 이미지를 RGBA로 변환
+        out_img = out_img.convert('RGBA')
+
+        # 알파 마스크를 사용하여 투명한 부분은 완전히 투명하게, 불투명한 부분만 브러시 효과 적용
+        alpha_mask = orig.split()[-1]  # 원본 알파 채널 추출
+        box = alpha_mask.getbbox() if ALPHA_CROP else None
+
+        # 명도, 채도, 대비 조정 (인물 부분에만 적용)
+        if box is not None and box != (0, 0) + out_img.size:
+            # 대비 기준값은 밝기/채도 적용 후 전체 프레임의 휘도 평균 (밝은 픽셀이 잘리므로 적용 전 값으로 추정 불가)
+            # → 밝기/채도는 전체에 적용하고, 대비 혼합만 전경 상자에서 직접 계산 (ImageEnhance.Contrast와 같은 식)
+            enhanced_img = ImageEnhance.Brightness(out_img).enhance(1.08)
+            enhanced_img = ImageEnhance.Color(enhanced_img).enhance(1.10)
+            pivot = int(ImageStat.Stat(enhanced_img.convert('L')).mean[0] + 0.5)
+            region = enhanced_img.crop(box)
+            degenerate = Image.new(region.mode, region.size, (pivot, pivot, pivot, 255))
+            enhanced_img.paste(Image.blend(degenerate, region, 1.40), box)
+        else:
+            enhanced_img = ImageEnhance.Brightness(out_img).enhance(1.08)  # 밝기 8% 증가
+            enhanced_img = ImageEnhance.Color(enhanced_img).enhance(1.10)   # 채도 10% 증가
+            enhanced_img = ImageEnhance.Contrast(enhanced_img).enhance(1.40) # 대비 40% 증가
+
+        # 브러시 효과가 적용된 이미지에 원본 알파 채널 적용
+        enhanced_img.putalpha(alpha_mask)
+    return enhanced_img
+
+def preview_path_for(output_path):
+    """out.png → out.preview.png"""
+    base, _ext = os.path.splitext(output_path)
+    return f"{base}.preview.png"
+
+def render_preview(orig_img, preview_path, style_path=None, preview_side=PREVIEW_SIDE, seed=None):
+    """축소본에 같은 브러시 파이프라인을 적용해 미리보기 PNG를 저장하고 크기를 반환"""
+    small = orig_img.copy()
+    small.thumbnail((preview_side, preview_side), Image.BILINEAR)
+    preview = brush_image(small, style_path, {}, seed)
+    # 미리보기는 속도 우선 (정책과 관계없이 fast)
+    image_io.write_image(preview, preview_path, policy="fast")
+    return preview.size
+
+def render_brush_effect(input_path, output_path, style_path=None, timings=None, preview_path=None, on_frame=None,
+                        seed=None):
+    """브러시 효과를 적용해 저장합니다. style_path가 있고 TensorFlow가 설치돼 있으면 NST, 아니면 PIL 계열 효과
+
+    preview_path: 지정하면 최종 렌더 전에 PREVIEW_SIDE 크기의 미리보기를 먼저 저장
+    on_frame: 미리보기/최종 결과가 저장될 때마다 {"type": "preview"|"final", ...} dict로 호출
+    timings에는 first_preview_ms(미리보기까지)와 final_ms(최종까지)가 따로 기록됩니다.
+    seed: 노이즈 시드 (지정하거나 NOISE_SEED가 있으면 같은 입력에 항상 같은 결과 - 캐시 키에 포함)
+    """
+    if timings is None:
+        timings = {}
+    t_start = time.perf_counter()
+
+    def emit_final():
+        timings["final_ms"] = (time.perf_counter() - t_start) * 1000
+        if on_frame is not None:
+            on_frame({"type": "final", "path": output_path, "elapsed_ms": round(timings["final_ms"], 2)})
+    use_nst = bool(TENSORFLOW_AVAILABLE and style_path and os.path.exists(style_path))
+    seed = requested_seed(seed)  # 잘못된 seed는 처리 전에 거절
+
+    # 결과 캐시 조회 (입력 바이트 + 스타일 파일 해시 + 효과 종류/모델 버전 + 출력 형식)
+    cache = get_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key("brush", input_path, {
+            "style": file_sha256(style_path) if use_nst else None,
+            "engine": f"nst-{STYLE_TRANSFER_MODE}-{STYLE_MODEL_VERSION}" if use_nst else BRUSH_ENGINE,
+            "format": os.path.splitext(output_path)[1].lower(),
+            "seed": requested_seed(seed),
+            "decode": image_loader.cache_tag("brush"),
+        })
+        if cache.get_file("brush", cache_key, output_path):
+            timings["cache"] = "hit"
+            print('결과 캐시 적중:', output_path)
+            # 최종 결과가 바로 나오므로 미리보기는 생략
+            emit_final()
+            return True
+        timings["cache"] = "miss"
+
+    # 이미지 로드 (알파 채널 보존, EXIF 방향 적용, 긴 변 DECODE_MAX_SIDE의 brush 설정 이하로 축소 디코딩)
+    with span("decode"):
+        orig_img = image_loader.load_for_stage("brush", input_path, 'RGBA')
+    if preview_path:
+        with span("preview"):
+            size = render_preview(orig_img, preview_path, style_path if use_nst else None, seed=seed)
+        timings["first_preview_ms"] = (time.perf_counter() - t_start) * 1000
+        print(f'미리보기 저장: {preview_path} ({timings["first_preview_ms"]:.0f}ms)')
+        if on_frame is not None:
+            on_frame({"type": "preview", "path": preview_path, "size": list(size),
+                      "elapsed_ms": round(timings["first_preview_ms"], 2)})
+    out_img = brush_image(orig_img, style_path if use_nst else None, timings, seed)
+    with span("encode", timings, key="save_ms", output=output_path):
+        timings["output_bytes"] = image_io.write_image(out_img, output_path)["bytes"]
+    # NST가 실패해 PIL 계열로 대체된 결과는 NST 키로 저장하지 않음
+    if cache_key is not None and (timings["engine"] == "nst") == use_nst:
+        cache.put_file("brush", cache_key, output_path)
+    print('브러시 효과 완료:', output_path)
+    emit_final()
+
+    # 메모리 정리
+    del orig_img, out_img
+    gc.collect()
+    return True
+
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == '--vendor-model':
+        if not TENSORFLOW_AVAILABLE:
+            print('TensorFlow가 없어 스타일 모델을 받을 수 없습니다.')
+            sys.exit(1)
+        print(json.dumps(vendor_style_model(sys.argv[2] if len(sys.argv) > 2 else None), ensure_ascii=False))
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] == '--precompute-styles':
+        if not TENSORFLOW_AVAILABLE:
+            print('TensorFlow가 없어 스타일 bottleneck을 계산할 수 없습니다.')
+            sys.exit(1)
+        print(json.dumps(precompute_style_bottlenecks(sys.argv[2:] or None), ensure_ascii=False))
+        return
+    if len(sys.argv) >= 3 and sys.argv[1] == '--scaling':
+        for path in sys.argv[2:]:
+            print(json.dumps(brush_tile_scaling(path), ensure_ascii=False))
+        return
+    if len(sys.argv) >= 3 and sys.argv[1] == '--compare':
+        for path in sys.argv[2:]:
+            print(json.dumps(compare_brush_engines(path), ensure_ascii=False))
+        return
+    # --progressive: 미리보기 → 최종 결과 순서로 프레임마다 JSON 한 줄씩 stdout에 출력
+    progressive = '--progressive' in sys.argv
+    if progressive:
+        sys.argv.remove('--progressive')
+        # 프레임 JSON만 stdout에 남기고 진행 로그는 stderr로 돌림
+        frame_out = sys.stdout
+        sys.stdout = sys.stderr
     if len(sys.argv) < 3:
-        print('사용법: python brush_effect.py <input_path> <output_path> [<style_path>]')
+        print('사용법: python brush_effect.py [--progressive] <input_path> <output_path> [<style_path>]')
+        print('       python brush_effect.py --compare <input_path>...')
+        print('       python brush_effect.py --scaling <input_path>...')
+        print('       python brush_effect.py --precompute-styles [<style_path>...]')
+        print('       python brush_effect.py --vendor-model [<model_dir>]')
         sys.exit(1)
     
     input_path = sys.argv[1]
@@ -195,78 +840,23 @@ def main():
         if len(sys.argv) >= 4:
             style_path = sys.argv[3]
         else:
-            # 기본 스타일 이미지 (BG_image 폴더 내 임의의 유화 이미지)
-            style_path = os.path.join(os.path.dirname(__file__), 'BG_image', 'the_bathers_1951.5.1.jpg')
-            if not os.path.exists(style_path):
-                print('기본 스타일 이미지가 없습니다. PIL 기반 효과로 대체됩니다.')
-                style_path = None
+            style_path = default_style_path()
+    else:
+        print("TensorFlow가 설치되어 있지 않습니다. PIL 기반 브러시 효과로 대체됩니다.")
     
     try:
-        # 이미지 로드 (알파 채널 보존)
-        orig_img = Image.open(input_path).convert('RGBA')
-        
-        # TensorFlow Neural Style Transfer 시도
-        if TENSORFLOW_AVAILABLE and style_path and os.path.exists(style_path):
-            try:
-                print("Neural Style Transfer 시도 중...")
-                content_image = load_img(input_path)
-                style_image = load_img(style_path)
-                
-                # 캐시된 모델 사용
-                hub_model = get_hub_model()
-                
-                # 스타일 트랜스퍼 실행
-                stylized_image = hub_model(tf.constant(content_image), tf.constant(style_image))[0]
-                
-                # 결과 저장
-                out_img = tensor_to_image(stylized_image)
-                print("Neural Style Transfer 완료!")
-                
-            except Exception as e:
-                print(f"Neural Style Transfer 실패: {e}")
-                print("PIL 기반 브러시 효과로 대체됩니다...")
-                out_img = apply_advanced_brush_effect_pil(orig_img)
-        else:
-            # PIL 기반 브러시 효과 사용
-            print("PIL 기반 브러시 효과 사용...")
-            out_img = apply_advanced_brush_effect_pil(orig_img)
-        
-        # 알파 채널(투명도) 보존 및 투명 영역 보호
-        orig = Image.open(input_path).convert('RGBA')
-        
-        # 원본 크기로 리사이즈 (해상도 보존)
-        if out_img.size != orig.size:
-            out_img = out_img.resize(orig.size, Image.LANCZOS)
-            print(f"이미지 크기 조정: {out_img.size} → {orig.size}")
-        
-        # 브러시 효과 이미지를 RGBA로 변환
-        out_img = out_img.convert('RGBA')
-        
-        # 명도, 채도, 대비 조정 (인물 부분에만 적용)
-        enhanced_img = ImageEnhance.Brightness(out_img).enhance(1.08)  # 밝기 8% 증가
-        enhanced_img = ImageEnhance.Color(enhanced_img).enhance(1.10)   # 채도 10% 증가
-        enhanced_img = ImageEnhance.Contrast(enhanced_img).enhance(1.40) # 대비 40% 증가
-        
-        # 알파 마스크를 사용하여 투명한 부분은 완전히 투명하게, 불투명한 부분만 브러시 효과 적용
-        alpha_mask = orig.split()[-1]  # 원본 알파 채널 추출
-        
-        # 브러시 효과가 적용된 이미지에 원본 알파 채널 적용
-        enhanced_img.putalpha(alpha_mask)
-        
-        out_img = enhanced_img
-        
-        out_img.save(output_path)
-        print('브러시 효과 완료:', output_path)
-        
-        # 메모리 정리
-        del orig_img, out_img, orig
-        if 'content_image' in locals():
-            del content_image, style_image, stylized_image
-        gc.collect()
-        
+        with request("brush", input=input_path, progressive=progressive):
+            if progressive:
+                def print_frame(frame):
+                    frame_out.write(json.dumps(frame, ensure_ascii=False) + "\n")
+                    frame_out.flush()
+                render_brush_effect(input_path, output_path, style_path,
+                                    preview_path=preview_path_for(output_path), on_frame=print_frame)
+            else:
+                render_brush_effect(input_path, output_path, style_path)
     except Exception as e:
         print(f'오류 발생: {e}')
         sys.exit(1)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
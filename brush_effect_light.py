@@ -6,82 +6,315 @@ import cv2
 import numpy as np
 from PIL import Image, ImageFilter, ImageEnhance
 import json
+import os
+import time
 
-def apply_artistic_effect(input_path, output_path):
+from result_cache import get_cache
+from alpha_region import process_foreground, benchmark_tile_scaling
+from texture_noise import tile_noise, resolve_seed, requested_seed
+from tracing import span, request
+import image_io
+import image_loader
+
+# 효과 로직이 바뀌면 올려서 이전 캐시 결과를 무효화
+EFFECT_VERSION = "light-v3"
+
+# 경량 효과 엔진: fused(단일 버퍼 OpenCV/NumPy, 기본) | pil(기존 구현)
+LIGHT_ENGINE = os.environ.get("LIGHT_ENGINE", "fused").lower()
+# fused 엔진의 bilateral 품질: high(원본 해상도, 기본) | medium(1/2 축소 후 가이드 업샘플) | low(1/4)
+# medium/low는 근사라 결과가 달라지므로(기존 대비 PSNR 약 41dB) 속도가 더 중요할 때만 명시적으로 선택
+LIGHT_QUALITY = os.environ.get("LIGHT_QUALITY", "high").lower()
+BILATERAL_SCALES = {"high": 1, "medium": 2, "low": 4}
+
+def canvas_noise(seed, y0, y1, x0, x1):
+    """캔버스 텍스처용 가우시안 노이즈 (절대 좌표 구간, RGB 순서, 표준편차 3, 0 방향 절사한 int16)"""
+    return tile_noise(seed, y0, y1, x0, x1, channels=3, scale=3, dtype=np.int16)
+
+def artistic_effect_array(img, seed=None, engine=None, quality=None, stats=None, workers=None):
     """
-    TensorFlow 없이 OpenCV와 PIL을 사용한 경량 브러시 효과
+    OpenCV 배열(BGR/BGRA)에 경량 브러시 효과를 적용해 같은 채널 구성의 배열을 반환 (LIGHT_ENGINE 설정에 따름)
+    seed: 노이즈 시드 (없으면 매번 새 시드)
     """
-    try:
-        print("경량 브러시 효과 시작...")
-        
-        # 이미지 로드
-        img = cv2.imread(input_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            raise ValueError(f"이미지를 로드할 수 없습니다: {input_path}")
-        
-        print(f"이미지 크기: {img.shape}")
-        
-        # BGR을 RGB로 변환
-        if len(img.shape) == 4:  # RGBA
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
-            alpha = img[:, :, 3]
-        else:  # RGB
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            alpha = None
-        
-        # PIL 이미지로 변환
-        pil_img = Image.fromarray(img_rgb)
-        
-        # 1. 유화 효과 (Oil Painting Effect)
-        # 색상 팔레트 감소
+    if (engine or LIGHT_ENGINE) == "pil":
+        return artistic_effect_array_pil(img, seed)
+    return artistic_effect_array_fused(img, seed, quality, stats, workers)
+
+def artistic_effect_array_pil(img, seed=None):
+    """
+    기존 PIL 구현 (OpenCV ↔ PIL 변환을 거치며 단계별로 처리)
+    """
+    # BGR을 RGB로 변환
+    if img.ndim == 2:  # 흑백
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+        alpha = None
+    elif img.shape[2] == 4:  # RGBA
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
+        alpha = img[:, :, 3]
+    else:  # RGB
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        alpha = None
+    
+    # PIL 이미지로 변환
+    pil_img = Image.fromarray(img_rgb)
+    
+    # 1. 유화 효과 (Oil Painting Effect)
+    # 색상 팔레트 감소
+    with span("filter.quantize"):
         img_array = np.array(pil_img)
         img_array = img_array // 16 * 16  # 색상 양자화
-        
-        # 2. 블러 효과로 브러시 스트로크 시뮬레이션
+    
+    # 2. 블러 효과로 브러시 스트로크 시뮬레이션
+    with span("filter.blur"):
         pil_img = Image.fromarray(img_array)
         pil_img = pil_img.filter(ImageFilter.GaussianBlur(radius=1.5))
-        
-        # 3. 에지 강화 (붓질 경계 강조)
+    
+    # 3. 에지 강화 (붓질 경계 강조)
+    with span("filter.enhance"):
         enhancer = ImageEnhance.Sharpness(pil_img)
         pil_img = enhancer.enhance(1.5)
-        
+    
         # 4. 색상 대비 향상
         enhancer = ImageEnhance.Contrast(pil_img)
         pil_img = enhancer.enhance(1.2)
-        
+    
         # 5. 채도 약간 증가
         enhancer = ImageEnhance.Color(pil_img)
         pil_img = enhancer.enhance(1.1)
-        
-        # OpenCV로 다시 변환하여 추가 효과
-        result_array = np.array(pil_img)
-        
-        # 6. 브러시 텍스처 효과 (bilateral filter)
+    
+    # OpenCV로 다시 변환하여 추가 효과
+    result_array = np.array(pil_img)
+    
+    # 6. 브러시 텍스처 효과 (bilateral filter)
+    with span("filter.bilateral"):
         result_array = cv2.bilateralFilter(result_array, 15, 80, 80)
-        
-        # 7. 약간의 노이즈 추가 (캔버스 텍스처)
-        noise = np.random.normal(0, 3, result_array.shape).astype(np.int16)
+    
+    # 7. 약간의 노이즈 추가 (캔버스 텍스처)
+    seed = resolve_seed(seed)
+    with span("filter.noise"):
+        noise = canvas_noise(seed, 0, result_array.shape[0], 0, result_array.shape[1])
         result_array = np.clip(result_array.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    
+    # 알파 채널 복원
+    if alpha is not None:
+        result_bgra = cv2.cvtColor(result_array, cv2.COLOR_RGB2BGRA)
+        result_bgra[:, :, 3] = alpha
+        result_array = result_bgra
+    else:
+        result_array = cv2.cvtColor(result_array, cv2.COLOR_RGB2BGR)
+    
+    return result_array
+
+# ---- fused 엔진 ----
+# 양자화 → 블러 → 선명도 → 대비 → 채도 → bilateral → 노이즈를 BGR 버퍼 하나에서 처리합니다.
+# 선명도/대비/채도는 모두 선형이라 블러 뒤에 3x3 커널 한 번 + 3x4 색 변환 한 번으로 합칩니다.
+LUMA_BGR = np.array([0.114, 0.587, 0.299], dtype=np.float64)
+# ImageEnhance.Sharpness 1.5 = 1.5·I - 0.5·SMOOTH
+SHARPEN_KERNEL = (1.5 * np.pad([[1.0]], 1) - 0.5 * np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float64) / 13).astype(np.float32)
+TRUNCATION_BIAS = 0.5
+# 전경 창 여백: 블러 6 + 선명도 1 + bilateral 7 + 가이드 업샘플(박스 2회 × 축소 배율 4) + 리샘플 여유
+LIGHT_MARGIN = 24
+
+def _light_affine(mean_bgr):
+    """대비 1.2 → 채도 1.1 아핀 행렬 (3x4, BGR 순서)"""
+    # PIL 대비 기준값은 휘도 평균(정수 반올림), 채도 행렬은 행 합이 1이라 상수항이 그대로 유지됨
+    mean_l = int(LUMA_BGR @ mean_bgr + 0.5)
+    color = 1.1 * np.eye(3) + (1 - 1.1) * np.outer(np.ones(3), LUMA_BGR)
+    a = 1.2 * color
+    # 절사 횟수: 선명도/대비/채도 3회
+    c = (1 - 1.2) * mean_l * np.ones(3) - 3 * TRUNCATION_BIAS
+    return np.hstack([a, c[:, None]]).astype(np.float32)
+
+def _guided_upsample(low_src, low_filtered, full_src, radius=1, eps=64.0):
+    """저해상도 필터 결과를 원본을 가이드로 업샘플 (채널별 fast guided filter 계수 q = a·I + b)"""
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean_i = cv2.boxFilter(low_src, -1, ksize)
+    mean_p = cv2.boxFilter(low_filtered, -1, ksize)
+    cov_ip = cv2.boxFilter(low_src * low_filtered, -1, ksize) - mean_i * mean_p
+    var_i = cv2.boxFilter(low_src * low_src, -1, ksize) - mean_i * mean_i
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    a = cv2.boxFilter(a, -1, ksize)
+    b = cv2.boxFilter(b, -1, ksize)
+    size = (full_src.shape[1], full_src.shape[0])
+    a = cv2.resize(a, size, interpolation=cv2.INTER_LINEAR)
+    b = cv2.resize(b, size, interpolation=cv2.INTER_LINEAR)
+    a *= full_src
+    a += b
+    return a
+
+def fast_bilateral(buf, quality=None):
+    """cv2.bilateralFilter(15, 80, 80) 근사: 축소 → bilateral → 가이드 업샘플 (high는 원본 해상도 그대로)"""
+    scale = BILATERAL_SCALES.get(quality or LIGHT_QUALITY, 1)
+    if scale == 1:
+        return cv2.bilateralFilter(buf, 15, 80, 80)
+    h, w = buf.shape[:2]
+    # 축소 배율의 배수로 맞춰 정수 배율 격자 유지 (부분 창을 처리해도 전체 처리와 같은 격자)
+    pad_y, pad_x = -h % scale, -w % scale
+    if pad_y or pad_x:
+        buf = cv2.copyMakeBorder(buf, 0, pad_y, 0, pad_x, cv2.BORDER_REPLICATE)
+    low_size = (buf.shape[1] // scale, buf.shape[0] // scale)
+    low = cv2.resize(buf, low_size, interpolation=cv2.INTER_AREA)
+    low_filtered = cv2.bilateralFilter(low, max(3, 15 // scale | 1), 80, 80 / scale)
+    full = buf.astype(np.float32)
+    out = _guided_upsample(low.astype(np.float32), low_filtered.astype(np.float32), full)
+    np.clip(out, 0, 255, out=out)
+    return out[:h, :w].astype(np.uint8)
+
+def _fused_light_core(bgr, origin, affine, seed, quality=None):
+    """양자화 → 블러 → 선명도 → 대비/채도 → bilateral → 노이즈 (uint8 BGR 창 -> uint8 BGR, origin은 창의 절대 좌표)"""
+    # 1. 색상 양자화 (16단계)
+    buf = (bgr & 0xF0).astype(np.float32)
+    # 2~5. 블러 → 선명도 → 대비/채도 (float32 버퍼 in-place)
+    cv2.GaussianBlur(buf, (0, 0), 1.5, dst=buf, borderType=cv2.BORDER_REPLICATE)
+    cv2.filter2D(buf, -1, SHARPEN_KERNEL, dst=buf, borderType=cv2.BORDER_REPLICATE)
+    cv2.transform(buf, affine, dst=buf)
+    np.clip(buf, 0, 255, out=buf)
+    result = buf.astype(np.uint8)
+    del buf
+
+    # 6. 브러시 텍스처 (bilateral 근사)
+    result = fast_bilateral(result, quality)
+
+    # 7. 노이즈 (캔버스 텍스처, 시드가 같으면 PIL 구현과 같은 패턴이 되도록 RGB 순서로 생성)
+    y0, x0 = origin
+    noise = canvas_noise(seed, y0, y0 + result.shape[0], x0, x0 + result.shape[1])[:, :, ::-1] + result
+    np.clip(noise, 0, 255, out=noise)
+    return noise.astype(np.uint8)
+
+def artistic_effect_array_fused(img, seed=None, quality=None, stats=None, workers=None):
+    """artistic_effect_array_pil의 단일 버퍼 구현 - 알파 채널 보존
+
+    투명 영역은 건너뛰고 알파 경계 상자(+ 필터 반경)만 처리합니다 (alpha_region 참고).
+    seed: 노이즈 시드 (같은 seed면 타일 수/워커 수와 관계없이 같은 결과)
+    workers: 타일 병렬 스레드 수 (기본 TILE_WORKERS)
+    stats: dict를 넘기면 processed_ratio/tiles를 기록
+    """
+    if img.ndim == 2:
+        bgr = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        alpha = None
+    elif img.shape[2] == 4:
+        bgr = img[:, :, :3]
+        alpha = img[:, :, 3]
+    else:
+        bgr = img
+        alpha = None
+
+    # 대비 기준 평균은 전체 프레임 기준 (블러/선명도는 평균을 바꾸지 않음)
+    affine = _light_affine(np.array(cv2.mean(bgr & 0xF0)[:3], dtype=np.float64))
+    seed = resolve_seed(seed)
+    with span("filter.fused", quality=quality or LIGHT_QUALITY):
+        result = process_foreground(
+            bgr, alpha, lambda window, origin: _fused_light_core(window, origin, affine, seed, quality), LIGHT_MARGIN,
+            stats, align=BILATERAL_SCALES.get(quality or LIGHT_QUALITY, 1), workers=workers
+        )
+
+    if alpha is not None:
+        result = np.dstack([result, alpha])
+    return result
+
+def compare_light_engines(input_path, repeat=3):
+    """기존 PIL 구현 대비 fused 엔진 품질 단계별 속도와 PSNR 비교 (같은 노이즈 시드 사용)"""
+    img = cv2.imread(input_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"이미지를 로드할 수 없습니다: {input_path}")
+
+    def best_of(fn):
+        best, out = None, None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return best, out
+
+    pil_s, reference = best_of(lambda: artistic_effect_array_pil(img, 0))
+    reference = reference.astype(np.float64)
+    report = {"image": os.path.basename(input_path), "size": [img.shape[1], img.shape[0]],
+              "pil_ms": round(pil_s * 1000, 2), "fused": {}}
+    for quality in BILATERAL_SCALES:
+        fused_s, out = best_of(lambda: artistic_effect_array_fused(img, 0, quality))
+        diff = out.astype(np.float64) - reference
+        mse = float(np.mean(diff ** 2))
+        report["fused"][quality] = {
+            "ms": round(fused_s * 1000, 2),
+            "speedup": round(pil_s / fused_s, 2),
+            "psnr_db": round(10 * np.log10(255 ** 2 / mse), 2) if mse else None,
+            "mean_abs_diff": round(float(np.mean(np.abs(diff))), 3),
+        }
+    return report
+
+def light_tile_scaling(input_path, workers_list=(1, 2, 4, 8), quality=None):
+    """fused 엔진 타일 병렬 처리의 워커 수별 속도와 결과 동일 여부 (seed 고정)"""
+    img = cv2.imread(input_path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError(f"이미지를 로드할 수 없습니다: {input_path}")
+    report = benchmark_tile_scaling(
+        lambda workers: artistic_effect_array_fused(img, 0, quality, workers=workers), workers_list
+    )
+    return {"image": os.path.basename(input_path), "size": [img.shape[1], img.shape[0]],
+            "quality": quality or LIGHT_QUALITY, **report}
+
+def apply_artistic_effect(input_path, output_path, seed=None):
+    """
+    TensorFlow 없이 OpenCV와 PIL을 사용한 경량 브러시 효과
+    seed: 노이즈 시드 (지정하거나 NOISE_SEED가 있으면 같은 입력에 항상 같은 결과 - 캐시 키에 포함)
+    """
+    try:
+        print("경량 브러시 효과 시작...")
+        seed = requested_seed(seed)  # 잘못된 seed는 처리 전에 거절
+
+        # 결과 캐시 조회 (입력 바이트 + 효과 버전 + 출력 형식)
+        cache = get_cache()
+        cache_key = None
+        if cache is not None and os.path.exists(input_path):
+            cache_key = cache.make_key("brush_light", input_path, {
+                "effect": EFFECT_VERSION,
+                "engine": LIGHT_ENGINE if LIGHT_ENGINE == "pil" else f"fused-{LIGHT_QUALITY}",
+                "format": os.path.splitext(output_path)[1].lower(),
+                "seed": requested_seed(seed),
+                "decode": image_loader.cache_tag("light"),
+            })
+            if cache.get_file("brush_light", cache_key, output_path):
+                print(f"결과 캐시 적중: {output_path}")
+                return {
+                    "success": True,
+                    "message": "경량 브러시 효과 적용 완료 (캐시)",
+                    "output_path": output_path,
+                    "cached": True
+                }
+        
+        # 이미지 로드 (알파가 있으면 BGRA, EXIF 방향 적용, 긴 변 DECODE_MAX_SIDE의 light 설정 이하로 축소 디코딩)
+        with span("decode"):
+            try:
+                img = image_loader.load_array(input_path, image_loader.stage_max_side("light"), "bgr",
+                                              keep_alpha=True)
+            except OSError as e:
+                raise ValueError(f"이미지를 로드할 수 없습니다: {input_path}") from e
         
-        # 알파 채널 복원
-        if alpha is not None:
-            result_bgra = cv2.cvtColor(result_array, cv2.COLOR_RGB2BGRA)
-            result_bgra[:, :, 3] = alpha
-            result_array = result_bgra
-        else:
-            result_array = cv2.cvtColor(result_array, cv2.COLOR_RGB2BGR)
+        print(f"이미지 크기: {img.shape}")
+        stats = {}
+        result_array = artistic_effect_array(img, seed, stats=stats)
         
         # 결과 저장
-        success = cv2.imwrite(output_path, result_array)
-        if not success:
-            raise ValueError(f"이미지 저장 실패: {output_path}")
+        with span("encode", output=output_path):
+            if result_array.ndim == 3 and result_array.shape[2] == 4:
+                result_image = Image.fromarray(cv2.cvtColor(result_array, cv2.COLOR_BGRA2RGBA), "RGBA")
+            elif result_array.ndim == 3:
+                result_image = Image.fromarray(cv2.cvtColor(result_array, cv2.COLOR_BGR2RGB), "RGB")
+            else:
+                result_image = Image.fromarray(result_array)
+            output_bytes = image_io.write_image(result_image, output_path)["bytes"]
+        if cache_key is not None:
+            cache.put_file("brush_light", cache_key, output_path)
         
         print(f"경량 브러시 효과 완료: {output_path}")
         
         return {
             "success": True,
             "message": "경량 브러시 효과 적용 완료",
-            "output_path": output_path
+            "output_path": output_path,
+            "output_bytes": output_bytes,
+            "processed_ratio": stats.get("processed_ratio", 1.0)
         }
         
     except Exception as e:
@@ -93,12 +326,24 @@ def apply_artistic_effect(input_path, output_path):
         }
 
 if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--compare":
+        for path in sys.argv[2:]:
+            print(json.dumps(compare_light_engines(path), ensure_ascii=False))
+        sys.exit(0)
+    if len(sys.argv) >= 3 and sys.argv[1] == "--scaling":
+        for path in sys.argv[2:]:
+            for quality in BILATERAL_SCALES:
+                print(json.dumps(light_tile_scaling(path, quality=quality), ensure_ascii=False))
+        sys.exit(0)
     if len(sys.argv) != 3:
         print("사용법: python brush_effect_light.py <입력_이미지> <출력_이미지>")
+        print("       python brush_effect_light.py --compare <입력_이미지>...")
+        print("       python brush_effect_light.py --scaling <입력_이미지>...")
         sys.exit(1)
     
     input_path = sys.argv[1]
     output_path = sys.argv[2]
     
-    result = apply_artistic_effect(input_path, output_path)
+    with request("light", input=input_path):
+        result = apply_artistic_effect(input_path, output_path)
     print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,91 @@
+# brush_worker.py
+"""
+상주형 브러시 효과 워커 (JSON Lines 프로토콜)
+스타일 모델을 한 번만 로드해 두고 여러 브러시 효과 요청을 처리합니다.
+
+사용법: python brush_worker.py
+- stdin 한 줄당 하나의 JSON 요청:
+  {"id": 1, "input": "cutout.png", "output": "brush.png", "style": "BG_image/xxx.jpg", "nst": true}
+  (style 생략 시 기본 스타일, "nst": false면 PIL 계열 효과만 사용)
+  "seed": 정수를 주면 같은 입력에 항상 같은 노이즈/결과 (결과 캐시 키에 포함)
+  "progressive": true면 최종 응답 전에 {"id": 1, "type": "preview", "path": ...} 응답을 먼저 보냄
+  "profile": true (또는 "cprofile"/"tracemalloc")면 이 요청만 프로파일링 (tracing.py 참고)
+  {"cmd": "ping"} / {"cmd": "shutdown"}
+- stdout 한 줄당 하나의 JSON 응답 (시작 시 {"type": "ready", ...} 한 번 출력)
+- BRUSH_WORKER_PRELOAD=1이면 시작 시 스타일 모델까지 미리 로드 (첫 NST 요청 지연 제거)
+"""
+import os
+import time
+
+from tracing import request
+from worker_protocol import claim_stdout, send, serve
+
+claim_stdout()
+
+_t_start = time.perf_counter()
+import brush_effect  # noqa: E402
+
+PRELOAD = os.environ.get("BRUSH_WORKER_PRELOAD", "0") == "1"
+
+def preload_models():
+    """NST 모델을 미리 로드 (캐시 bottleneck 경로면 변환망, 아니면 전체 hub 모델)"""
+    if brush_effect.STYLE_TRANSFER_MODE == 'cached':
+        brush_effect.get_style_interpreter('transfer')
+    else:
+        brush_effect.get_hub_model()
+
+def handle_job(job):
+    """단일 브러시 효과 요청을 처리하고 응답 dict를 반환합니다."""
+    job_id = job.get("id")
+    input_path = job.get("input")
+    output_path = job.get("output")
+    if not input_path or not output_path:
+        return {"id": job_id, "success": False, "error": "input/output 경로가 필요합니다."}
+
+    style_path = None
+    if job.get("nst", True) and brush_effect.TENSORFLOW_AVAILABLE:
+        style_path = job.get("style") or brush_effect.default_style_path()
+
+    preview_path = None
+    on_frame = None
+    if job.get("progressive"):
+        preview_path = job.get("preview") or brush_effect.preview_path_for(output_path)
+
+        def on_frame(frame):
+            if frame["type"] == "preview":
+                send({"id": job_id, **frame})
+
+    timings = {}
+    t0 = time.perf_counter()
+    with request("brush", profile=job.get("profile"), job=job_id, nst=style_path is not None):
+        brush_effect.render_brush_effect(input_path, output_path, style_path, timings, preview_path, on_frame,
+                                         seed=job.get("seed"))
+    timings["total_ms"] = (time.perf_counter() - t0) * 1000
+    return {
+        "id": job_id,
+        "success": True,
+        "output": output_path,
+        "timings": {k: round(v, 2) if isinstance(v, float) else v for k, v in timings.items()},
+    }
+
+def main():
+    if PRELOAD and brush_effect.TENSORFLOW_AVAILABLE:
+        try:
+            preload_models()
+        except Exception as e:
+            # 미리 로드 실패는 치명적이지 않음 (요청 시 PIL 효과로 대체)
+            print(f"스타일 모델 미리 로드 실패: {e}")
+    init_ms = (time.perf_counter() - _t_start) * 1000
+    print(f"🎨 브러시 워커 준비 완료 ({init_ms:.0f}ms)")
+    send({
+        "type": "ready",
+        "init_ms": round(init_ms, 2),
+        "tensorflow_available": brush_effect.TENSORFLOW_AVAILABLE,
+        "tensorflow_loaded": brush_effect.tf is not None,
+        "pid": os.getpid(),
+    })
+
+    serve(handle_job, "브러시")
+
+if __name__ == "__main__":
+    main()
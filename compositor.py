@@ -0,0 +1,220 @@
+# compositor.py
+"""
+서버 측 전경/배경 합성 엔진
+rembg RGBA 전경과 BG_image 명화 키를 받아 서버에서 한 장으로 합성해 인코딩합니다.
+(/api/composite가 base64 전경과 배경 URL을 그대로 돌려줘 휴대폰이 큰 이미지 두 장을 디코딩/합성하던 부분 대체)
+
+- 캔버스: width×height (기본 1024×1024), 배경은 캔버스를 채우도록(cover) 리샘플해 중앙 자름
+- mode: 전경 배치 방식 - contain(캔버스 안에 전부 보이게) | cover(캔버스를 채우고 넘치는 부분 자름)
+- opacity: 전경 투명도 (0~1), out: png | jpeg
+- 리샘플한 배경은 (배경 파일, 수정 시각, 캔버스 크기)별 LRU 캐시에 보관 (COMPOSITE_BG_CACHE, 기본 16개)
+- 합성은 알파 경계 상자 안만 정수 premultiplied-alpha 연산으로 처리 (out = fg·a + bg·(255 - a))
+
+사용법:
+  python compositor.py <fg_path> <bg_key> <output_path> [contain|cover] [width] [height] [opacity]
+  python compositor.py bench <fg_path> <bg_key> [repeat]   # 기존 응답 크기 대비 출력 바이트/서버 시간
+"""
+import sys
+import os
+import io
+import json
+import time
+import base64
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from alpha_region import foreground_bbox
+from tracing import span, request
+import image_io
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# /api/composite가 찾는 public/BG_image를 먼저, 그다음 명화 색인의 BG_image
+BG_DIRS = (os.path.join(BASE_DIR, 'public', 'BG_image'), os.path.join(BASE_DIR, 'BG_image'))
+DEFAULT_SIZE = 1024
+DEFAULT_BG_COLOR = (0xf0, 0xf0, 0xf0)
+MODES = ("contain", "cover")
+OUTPUTS = ("png", "jpeg")
+JPEG_QUALITY = int(os.environ.get("COMPOSITE_JPEG_QUALITY", "90"))
+BG_CACHE_SIZE = int(os.environ.get("COMPOSITE_BG_CACHE", "16"))
+
+_bg_cache = OrderedDict()
+
+def sanitize_key(key):
+    """경로 탈출 방지: 파일명만 허용 (server.js의 sanitizeFileName과 동일하게 처리하되 공백/비ASCII 명화 이름 허용)"""
+    name = os.path.basename(str(key).replace('\\', '/'))
+    if name in ('', '.', '..'):
+        raise ValueError(f"잘못된 배경 키입니다: {key}")
+    return name
+
+def resolve_background(key):
+    name = sanitize_key(key)
+    for directory in BG_DIRS:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"배경 이미지를 찾을 수 없습니다: /BG_image/{name}")
+
+def _fit(src_size, dst_size, mode):
+    """src를 dst에 contain/cover로 맞춘 크기"""
+    sw, sh = src_size
+    dw, dh = dst_size
+    scale = (min if mode == "contain" else max)(dw / sw, dh / sh)
+    return max(1, round(sw * scale)), max(1, round(sh * scale))
+
+def background_array(key, size):
+    """캔버스 크기로 cover 리샘플 + 중앙 자른 배경 RGB 배열 (읽기 전용, 캐시됨)"""
+    if not key:
+        canvas = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        canvas[:] = DEFAULT_BG_COLOR
+        return canvas, False
+    path = resolve_background(key)
+    cache_key = (path, os.path.getmtime(path), size)
+    cached = _bg_cache.get(cache_key)
+    if cached is not None:
+        _bg_cache.move_to_end(cache_key)
+        return cached, True
+    with Image.open(path) as image:
+        image.draft('RGB', _fit(image.size, size, "cover"))  # JPEG은 축소 디코딩
+        image = image.convert('RGB')
+        fw, fh = _fit(image.size, size, "cover")
+        image = image.resize((fw, fh), Image.LANCZOS)
+    left, top = (fw - size[0]) // 2, (fh - size[1]) // 2
+    canvas = np.array(image.crop((left, top, left + size[0], top + size[1])), dtype=np.uint8)
+    canvas.flags.writeable = False
+    _bg_cache[cache_key] = canvas
+    while len(_bg_cache) > BG_CACHE_SIZE:
+        _bg_cache.popitem(last=False)
+    return canvas, False
+
+def place_foreground(fg, size, mode):
+    """전경을 mode로 캔버스에 맞춰 리샘플하고 (RGBA 배열, 캔버스 위 좌상단 좌표) 반환 (캔버스 밖은 잘라냄)"""
+    fw, fh = _fit(fg.size, size, mode)
+    if (fw, fh) != fg.size:
+        fg = fg.resize((fw, fh), Image.LANCZOS)
+    left, top = (size[0] - fw) // 2, (size[1] - fh) // 2
+    # cover일 때 음수 좌표 = 넘치는 부분 자르기
+    crop_x, crop_y = max(0, -left), max(0, -top)
+    arr = np.asarray(fg)[crop_y:crop_y + size[1], crop_x:crop_x + size[0]]
+    return arr, (max(0, top), max(0, left))
+
+def blend(background, fg_rgba, origin, opacity=1.0):
+    """premultiplied-alpha 정수 합성: 알파가 있는 경계 상자 안만 out = (fg·a + bg·(255 - a) + 127) // 255"""
+    out = np.array(background, dtype=np.uint8, copy=True)
+    alpha = fg_rgba[:, :, 3]
+    if opacity < 1.0:
+        alpha = (alpha.astype(np.uint16) * int(round(opacity * 255)) + 127) // 255
+    box = foreground_bbox(alpha)
+    if box is None:
+        return out
+    y0, y1, x0, x1 = box
+    oy, ox = origin
+    a = alpha[y0:y1, x0:x1, None].astype(np.uint16)
+    premultiplied = fg_rgba[y0:y1, x0:x1, :3].astype(np.uint16) * a
+    region = out[oy + y0:oy + y1, ox + x0:ox + x1]
+    blended = premultiplied + region.astype(np.uint16) * (255 - a) + 127
+    region[:] = blended // 255
+    return out
+
+def encode(array, out):
+    image = Image.fromarray(array, 'RGB')
+    if out == "jpeg":
+        return image_io.encode_image(image, "jpeg", quality=JPEG_QUALITY)
+    return image_io.encode_image(image, "png")
+
+def composite(fg, bg_key=None, mode="contain", width=None, height=None, opacity=1.0, out="png", timings=None):
+    """
+    전경(RGBA PIL 이미지/경로/바이트)과 배경 키를 합성해 인코딩된 바이트를 반환
+    timings: dict를 넘기면 단계별 시간(ms)과 배경 캐시 적중 여부를 기록
+    """
+    if mode not in MODES:
+        raise ValueError(f"지원하지 않는 mode입니다: {mode} (가능: {', '.join(MODES)})")
+    if out not in OUTPUTS:
+        raise ValueError(f"지원하지 않는 출력 형식입니다: {out} (가능: {', '.join(OUTPUTS)})")
+    opacity = min(1.0, max(0.0, float(opacity)))
+    size = (int(width or DEFAULT_SIZE), int(height or DEFAULT_SIZE))
+    if size[0] <= 0 or size[1] <= 0:
+        raise ValueError(f"잘못된 출력 크기입니다: {size}")
+    timings = {} if timings is None else timings
+
+    with span("decode", timings):
+        if isinstance(fg, (bytes, bytearray)):
+            fg = Image.open(io.BytesIO(fg))
+        elif not isinstance(fg, Image.Image):
+            fg = Image.open(fg)
+        fg = fg.convert('RGBA')
+
+    with span("background", timings, bg=bg_key) as background_span:
+        background, hit = background_array(bg_key, size)
+        background_span.set(cached=hit)
+    timings["background_cached"] = hit
+
+    with span("blend", timings, mode=mode):
+        fg_rgba, origin = place_foreground(fg, size, mode)
+        result = blend(background, fg_rgba, origin, opacity)
+
+    with span("encode", timings, out=out) as encode_span:
+        data = encode(result, out)
+        encode_span.set(bytes=len(data))
+    return data
+
+def legacy_payload_bytes(fg_bytes, bg_key=None):
+    """기존 /api/composite 방식에서 클라이언트가 받는 바이트 (base64 전경 에코 + 원본 배경 다운로드)"""
+    fg_b64 = len(base64.b64encode(fg_bytes)) + len("data:image/png;base64,")
+    bg = os.path.getsize(resolve_background(bg_key)) if bg_key else 0
+    return fg_b64 + bg
+
+def benchmark_composite(fg_path, bg_key, repeat=5, width=DEFAULT_SIZE, height=DEFAULT_SIZE):
+    """출력 형식별 합성 결과 크기/서버 시간(배경 캐시 미적중 1회 + 적중 최선)과 기존 응답 크기 비교"""
+    with open(fg_path, 'rb') as f:
+        fg_bytes = f.read()
+    legacy = legacy_payload_bytes(fg_bytes, bg_key)
+    rows = {}
+    for out in OUTPUTS:
+        _bg_cache.clear()
+        cold = {}
+        t0 = time.perf_counter()
+        data = composite(fg_bytes, bg_key, width=width, height=height, out=out, timings=cold)
+        cold_ms = (time.perf_counter() - t0) * 1000
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            composite(fg_bytes, bg_key, width=width, height=height, out=out)
+            elapsed = (time.perf_counter() - t0) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        rows[out] = {
+            "bytes": len(data),
+            "vs_legacy": round(len(data) / legacy, 3),
+            "cold_ms": round(cold_ms, 2),
+            "warm_ms": round(best, 2),
+        }
+    return {"size": [width, height], "legacy_payload_bytes": legacy, "outputs": rows}
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "bench":
+        repeat = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+        print(json.dumps(benchmark_composite(sys.argv[2], sys.argv[3], repeat), ensure_ascii=False))
+        sys.exit(0)
+    if len(sys.argv) < 4:
+        print("사용법: python compositor.py <fg_path> <bg_key> <output_path> [contain|cover] [width] [height] [opacity]")
+        sys.exit(1)
+    fg_path, bg_key, output_path = sys.argv[1:4]
+    mode = sys.argv[4] if len(sys.argv) > 4 else "contain"
+    width = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    height = int(sys.argv[6]) if len(sys.argv) > 6 else None
+    opacity = float(sys.argv[7]) if len(sys.argv) > 7 else 1.0
+    out = "jpeg" if output_path.lower().endswith((".jpg", ".jpeg")) else "png"
+    try:
+        timings = {}
+        with request("composite", input=fg_path, bg=bg_key):
+            data = composite(fg_path, bg_key, mode, width, height, opacity, out, timings)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        print(json.dumps({
+            "success": True, "output": output_path, "bytes": len(data),
+            "timings": {k: round(v, 2) if isinstance(v, float) else v for k, v in timings.items()},
+        }, ensure_ascii=False))
+    except Exception as e:
+        print(f"합성 중 오류: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -3,11 +3,17 @@ sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 import os
 import json
+import time
 import numpy as np
 import cv2
-import onnxruntime as ort
 import gc  # 메모리 관리용
 
+from result_cache import get_cache
+import onnx_sessions
+import image_loader
+import model_precision
+from tracing import span, request
+
 FERPLUS_EMOTIONS = [
     "neutral", "happiness", "surprise", "sadness",
     "anger", "disgust", "fear", "contempt"
@@ -15,25 +21,100 @@ FERPLUS_EMOTIONS = [
 
 ONNX_MODEL = os.path.join("models", "emotion-ferplus-8.onnx")
 
+# 다중 얼굴 모드 기본값 (단체 사진의 비용 상한)
+MAX_FACES = int(os.environ.get("EMOTION_MAX_FACES", "8"))
+MIN_FACE_SIZE = int(os.environ.get("EMOTION_MIN_FACE_SIZE", "48"))
+# 얼굴 검출용 축소 이미지의 최대 변 길이 (0이면 원본 해상도에서 검출)
+DETECT_MAX_SIDE = int(os.environ.get("EMOTION_DETECT_MAX_SIDE", "800"))
+# 결과 형식 버전 (필드가 바뀌면 올려서 이전 캐시 결과를 무효화)
+RESULT_SCHEMA = 2
+
 def softmax(x):
     e_x = np.exp(x - np.max(x))
     return e_x / e_x.sum()
 
-def preprocess_face(image_path):
-    img = cv2.imread(image_path)
+def decode_gray(source, max_side=None):
+    """
+    이미지 경로/버퍼를 흑백 배열로 디코딩하고 (배열, 원본 대비 배율) 반환
+    JPEG은 긴 변 max_side(기본 DECODE_MAX_SIDE의 emotion 설정) 근처로 축소 디코딩하고 EXIF 방향을 적용합니다.
+    ndarray는 그대로 흑백 변환만 합니다 (배율 1).
+    """
+    if isinstance(source, np.ndarray):
+        return to_gray(source), 1.0
+    max_side = image_loader.stage_max_side("emotion") if max_side is None else max_side
+    info = {}
+    with span("decode"):
+        try:
+            gray = image_loader.load_array(source, max_side, "gray", info)
+        except OSError as e:
+            raise ValueError("이미지 파일을 열 수 없습니다.") from e
+    return gray, max(info["decoded_size"]) / max(info["original_size"])
+
+def decode_image(source):
+    """이미지 경로 또는 메모리 버퍼(bytes/ndarray)를 BGR 배열로 디코딩"""
+    if isinstance(source, np.ndarray):
+        img = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        with span("decode"):
+            img = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        with span("decode"):
+            img = cv2.imread(os.fspath(source))
     if img is None:
         raise ValueError("이미지 파일을 열 수 없습니다.")
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    if len(faces) == 0:
+    return img
+
+def load_face_cascade():
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+def to_gray(img):
+    if img.ndim == 2:
+        return img
+    if img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def detect_faces(gray, face_cascade, min_face_size=0, max_faces=None, max_side=None):
+    """Haar cascade 1회 실행 후 면적이 큰 순서로 얼굴 박스 (x, y, w, h) 목록 반환
+
+    max_side보다 큰 이미지는 축소본에서 검출하고 박스를 원본 좌표로 되돌립니다.
+    """
+    max_side = DETECT_MAX_SIDE if max_side is None else max_side
+    h, w = gray.shape
+    scale = 1.0
+    small = gray
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+        small = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    min_size = max(1, round(min_face_size * scale)) if min_face_size else 0
+    with span("detect", scale=round(scale, 3)):
+        if min_size:
+            faces = face_cascade.detectMultiScale(small, 1.1, 4, minSize=(min_size, min_size))
+        else:
+            faces = face_cascade.detectMultiScale(small, 1.1, 4)
+    faces = [tuple(int(v) for v in rect) for rect in faces]
+    if scale != 1.0:
+        # 축소본 좌표 → 원본 좌표 (이미지 경계 안으로 제한)
+        remapped = []
+        for x, y, fw, fh in faces:
+            x1, y1 = min(w - 1, round(x / scale)), min(h - 1, round(y / scale))
+            remapped.append((x1, y1, min(w - x1, round(fw / scale)), min(h - y1, round(fh / scale))))
+        faces = remapped
+    faces = sorted(faces, key=lambda rect: rect[2]*rect[3], reverse=True)
+    if max_faces is not None:
+        faces = faces[:max_faces]
+    return faces
+
+def crop_face(gray, face=None):
+    """얼굴 박스(없으면 중앙)를 정사각형으로 잘라 (1,1,64,64) float32 텐서로 변환"""
+    if face is None:
         h, w = gray.shape
         ch, cw = 64, 64
         y1 = max(0, (h - ch) // 2)
         x1 = max(0, (w - cw) // 2)
         crop = gray[y1:y1+ch, x1:x1+cw]
     else:
-        (x, y, w, h) = max(faces, key=lambda rect: rect[2]*rect[3])
+        (x, y, w, h) = face
         size = max(w, h)
         cx, cy = x + w // 2, y + h // 2
         x1 = max(0, cx - size // 2)
@@ -47,59 +128,260 @@ def preprocess_face(image_path):
     arr = arr[np.newaxis, np.newaxis, :, :]
     return arr
 
+def preprocess_face(image_path, face_cascade=None, max_side=None):
+    gray, _scale = decode_gray(image_path)
+    if face_cascade is None:
+        face_cascade = load_face_cascade()
+    faces = detect_faces(gray, face_cascade, max_faces=1, max_side=max_side)
+    return crop_face(gray, faces[0] if faces else None)
+
+def scores_to_result(scores):
+    """FER+ 로짓 한 줄을 top_emotions/emotion/confidence 결과로 변환"""
+    probs = softmax(scores)
+    top_idx = probs.argsort()[-3:][::-1]
+    top_emotions = [
+        {
+            "emotion": FERPLUS_EMOTIONS[i],
+            "probability": float(probs[i]),
+            "percentage": float(probs[i] * 100)
+        }
+        for i in top_idx
+    ]
+    # angry/neutral 확률이 비슷하면 angry로 보정
+    main_idx = int(np.argmax(probs))
+    angry_idx = 4
+    neutral_idx = 0
+    if main_idx == neutral_idx and angry_idx in top_idx:
+        if abs(probs[neutral_idx] - probs[angry_idx]) < 0.18 and probs[angry_idx] > 0.35:
+            main_idx = angry_idx
+    return {
+        "top_emotions": top_emotions,
+        "emotion": FERPLUS_EMOTIONS[main_idx],
+        "confidence": float(probs[main_idx]),
+        # 전체 FER+ 분포 (명화 추천 점수 계산용)
+        "probabilities": {name: float(p) for name, p in zip(FERPLUS_EMOTIONS, probs)}
+    }
+
+class EmotionEngine:
+    """FER+ 세션과 Haar cascade를 한 번만 로드해 재사용하는 배치 추론 엔진"""
+
+    def __init__(self, model_path=None, providers=None, detect_max_side=None):
+        self.model_path = model_path or ONNX_MODEL
+        self.detect_max_side = detect_max_side
+        self.precision = model_precision.stage_precision("emotion")
+        with span("model_load", model="ferplus", precision=self.precision):
+            self.session = onnx_sessions.create_session(
+                model_precision.resolve_model(self.model_path, "emotion", self.precision), providers)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # 배치 차원이 고정된 모델(FER+ 원본은 1)은 세션만 재사용하고 한 장씩 실행
+        batch_dim = model_input.shape[0] if model_input.shape else None
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) else None
+        self.face_cascade = load_face_cascade()
+
+    def run(self, batch):
+        """(N,1,64,64) 텐서를 추론해 (N,8) 로짓을 반환"""
+        with span("infer", batch=len(batch)):
+            if self.fixed_batch is None or self.fixed_batch == len(batch):
+                return self.session.run(None, {self.input_name: batch})[0]
+            step = self.fixed_batch
+            return np.concatenate([
+                self.session.run(None, {self.input_name: batch[i:i + step]})[0]
+                for i in range(0, len(batch), step)
+            ])
+
+    def analyze_batch(self, images):
+        """이미지 경로/버퍼 목록을 한 번의 추론으로 분석해 이미지별 결과 목록을 반환"""
+        results = [None] * len(images)
+        crops, owners = [], []
+        for i, image in enumerate(images):
+            try:
+                crops.append(preprocess_face(image, self.face_cascade, self.detect_max_side))
+                owners.append(i)
+            except Exception as e:
+                results[i] = {"emotion": "neutral", "confidence": 0.0, "error": str(e)}
+        if crops:
+            logits = self.run(np.concatenate(crops, axis=0))
+            for i, scores in zip(owners, logits):
+                results[i] = scores_to_result(scores)
+        return results
+
+    def analyze(self, image):
+        return self.analyze_batch([image])[0]
+
+    def analyze_faces(self, image, max_faces=None, min_face_size=None):
+        """단체 사진용: 얼굴 검출 1회 + 모든 얼굴 crop에 대한 배치 추론 1회로 얼굴별 결과 반환"""
+        max_faces = MAX_FACES if max_faces is None else max_faces
+        min_face_size = MIN_FACE_SIZE if min_face_size is None else min_face_size
+        gray, scale = decode_gray(image)
+        # 최소 얼굴 크기와 결과 박스는 원본(EXIF 방향 적용) 좌표 기준
+        faces = detect_faces(gray, self.face_cascade, round(min_face_size * scale), max_faces, self.detect_max_side)
+        results = []
+        if faces:
+            logits = self.run(np.concatenate([crop_face(gray, face) for face in faces], axis=0))
+            for (x, y, w, h), scores in zip(faces, logits):
+                result = scores_to_result(scores)
+                x, y, w, h = (round(v / scale) for v in (x, y, w, h))
+                result["box"] = {"x": x, "y": y, "width": w, "height": h}
+                results.append(result)
+        return {"faces": results, "face_count": len(results)}
+
+_engine = None
+
+def get_engine():
+    """모듈 전역 엔진 (최초 호출 시 한 번만 로드)"""
+    global _engine
+    if _engine is None:
+        _engine = EmotionEngine()
+    return _engine
+
+def model_version():
+    """결과 캐시 키용 모델 식별자 (파일명 + 크기 + 정밀도)"""
+    size = os.path.getsize(ONNX_MODEL) if os.path.exists(ONNX_MODEL) else 0
+    return f"{os.path.basename(ONNX_MODEL)}-{size}-{model_precision.stage_precision('emotion')}"
+
+def cached_analysis(stage, image_path, params, compute):
+    """입력 파일 해시 + 매개변수 기준으로 분석 결과 캐시 (오류 결과는 저장하지 않음)"""
+    cache = get_cache()
+    if cache is None or not isinstance(image_path, (str, os.PathLike)) or not os.path.exists(image_path):
+        return compute()
+    key = cache.make_key(stage, image_path, dict(params, model=model_version(), schema=RESULT_SCHEMA,
+                                                 decode=image_loader.cache_tag("emotion")))
+    result = cache.get_json(stage, key)
+    if result is not None:
+        print(f"결과 캐시 적중: {image_path}")
+        return result
+    result = compute()
+    if "error" not in result:
+        cache.put_json(stage, key, result)
+    return result
+
 def analyze_emotion(image_path):
+    return cached_analysis("emotion", image_path, {"detect_max_side": DETECT_MAX_SIDE},
+                           lambda: _analyze_emotion(image_path))
+
+def _analyze_emotion(image_path):
     try:
         print(f"감정 분석 시작: {image_path}")
         print(f"모델 경로: {ONNX_MODEL}")
         print(f"모델 파일 존재: {os.path.exists(ONNX_MODEL)}")
-        
-        arr = preprocess_face(image_path)
+
+        engine = get_engine()
+        arr = preprocess_face(image_path, engine.face_cascade, engine.detect_max_side)
         print(f"전처리 완료, 배열 형태: {arr.shape}")
-        
-        session = ort.InferenceSession(ONNX_MODEL, providers=["CPUExecutionProvider"])
-        input_name = session.get_inputs()[0].name
-        print(f"모델 로드 완료, 입력 이름: {input_name}")
-        
-        outputs = session.run(None, {input_name: arr})
-        scores = outputs[0][0]
-        probs = softmax(scores)
-        top_idx = probs.argsort()[-3:][::-1]
-        top_emotions = [
-            {
-                "emotion": FERPLUS_EMOTIONS[i],
-                "probability": float(probs[i]),
-                "percentage": float(probs[i] * 100)
-            }
-            for i in top_idx
-        ]
-        # angry/neutral 확률이 비슷하면 angry로 보정
-        main_idx = int(np.argmax(probs))
-        angry_idx = 4
-        neutral_idx = 0
-        if main_idx == neutral_idx and angry_idx in top_idx:
-            if abs(probs[neutral_idx] - probs[angry_idx]) < 0.18 and probs[angry_idx] > 0.35:
-                main_idx = angry_idx
-        result = {
-            "top_emotions": top_emotions,
-            "emotion": FERPLUS_EMOTIONS[main_idx],
-            "confidence": float(probs[main_idx])
-        }
+
+        result = scores_to_result(engine.run(arr)[0])
         print(f"감정 분석 완료: {result['emotion']}")
-        
-        # 메모리 정리 (Render 환경 최적화)
-        del img_array, probs, session
-        gc.collect()
-        
         return result
     except Exception as e:
         print(f"감정 분석 중 오류 발생: {e}", file=sys.stderr)
         gc.collect()  # 오류 시에도 메모리 정리
         return {"emotion": "neutral", "confidence": 0.0, "error": str(e)}
 
+def analyze_emotions_multi(image_path, max_faces=None, min_face_size=None):
+    """얼굴별 감정 분석 (얼굴이 없으면 빈 목록)"""
+    params = {
+        "max_faces": MAX_FACES if max_faces is None else max_faces,
+        "min_face_size": MIN_FACE_SIZE if min_face_size is None else min_face_size,
+        "detect_max_side": DETECT_MAX_SIDE,
+    }
+    return cached_analysis("emotion_faces", image_path, params,
+                           lambda: _analyze_emotions_multi(image_path, max_faces, min_face_size))
+
+def _analyze_emotions_multi(image_path, max_faces=None, min_face_size=None):
+    try:
+        print(f"다중 얼굴 감정 분석 시작: {image_path}")
+        result = get_engine().analyze_faces(image_path, max_faces, min_face_size)
+        print(f"다중 얼굴 감정 분석 완료: {result['face_count']}명")
+        return result
+    except Exception as e:
+        print(f"감정 분석 중 오류 발생: {e}", file=sys.stderr)
+        return {"faces": [], "face_count": 0, "error": str(e)}
+
+def benchmark_burst(image_paths, burst=32):
+    """이미지별 세션 생성 방식과 공유 엔진 배치 방식의 처리량 비교"""
+    paths = [image_paths[i % len(image_paths)] for i in range(burst)]
+
+    t0 = time.perf_counter()
+    for path in paths:
+        # 기존 경로: 이미지마다 세션/캐스케이드를 새로 생성하고 배치 크기 1로 실행
+        EmotionEngine().analyze(path)
+    per_image_s = time.perf_counter() - t0
+
+    engine = get_engine()
+    t0 = time.perf_counter()
+    engine.analyze_batch(paths)
+    batched_s = time.perf_counter() - t0
+
+    return {
+        "burst": burst,
+        "per_image_s": round(per_image_s, 4),
+        "per_image_ips": round(burst / per_image_s, 2),
+        "batched_s": round(batched_s, 4),
+        "batched_ips": round(burst / batched_s, 2),
+        "speedup": round(per_image_s / batched_s, 2),
+    }
+
+def box_iou(a, b):
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union else 0.0
+
+def benchmark_detection(image_paths, max_side=None):
+    """원본 해상도 검출과 축소 검출의 지연 시간 및 선택 얼굴/감정 일치 여부 비교"""
+    max_side = DETECT_MAX_SIDE if max_side is None else max_side
+    engine = get_engine()
+    rows = []
+    for path in image_paths:
+        gray = to_gray(decode_image(path))
+        row = {"image": os.path.basename(path), "size": [gray.shape[1], gray.shape[0]]}
+        chosen = {}
+        for label, side in (("full", 0), ("scaled", max_side)):
+            t0 = time.perf_counter()
+            faces = detect_faces(gray, engine.face_cascade, max_faces=1, max_side=side)
+            row[f"{label}_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            face = faces[0] if faces else None
+            chosen[label] = (face, scores_to_result(engine.run(crop_face(gray, face))[0])["emotion"])
+        (full_face, full_emotion), (scaled_face, scaled_emotion) = chosen["full"], chosen["scaled"]
+        if full_face is None or scaled_face is None:
+            row["face_iou"] = 1.0 if full_face == scaled_face else 0.0
+        else:
+            row["face_iou"] = round(box_iou(full_face, scaled_face), 3)
+        row["same_face"] = row["face_iou"] >= 0.5
+        row["same_emotion"] = full_emotion == scaled_emotion
+        row["speedup"] = round(row["full_ms"] / row["scaled_ms"], 2) if row["scaled_ms"] else None
+        rows.append(row)
+    return {
+        "max_side": max_side,
+        "images": rows,
+        "full_ms_total": round(sum(r["full_ms"] for r in rows), 2),
+        "scaled_ms_total": round(sum(r["scaled_ms"] for r in rows), 2),
+        "same_face_ratio": round(sum(r["same_face"] for r in rows) / len(rows), 3) if rows else None,
+        "same_emotion_ratio": round(sum(r["same_emotion"] for r in rows) / len(rows), 3) if rows else None,
+    }
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2 and sys.argv[1] == "--bench":
+        print(json.dumps(benchmark_burst(sys.argv[2:]), ensure_ascii=False))
+    elif len(sys.argv) > 2 and sys.argv[1] == "--bench-detect":
+        print(json.dumps(benchmark_detection(sys.argv[2:]), ensure_ascii=False))
+    elif len(sys.argv) > 2 and sys.argv[1] == "--faces":
+        max_faces = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        min_face_size = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        with request("emotion_faces", input=sys.argv[2]):
+            result = analyze_emotions_multi(sys.argv[2], max_faces, min_face_size)
+        print(json.dumps(result, ensure_ascii=False))
+    elif len(sys.argv) > 1:
         image_path = sys.argv[1]
-        analysis_result = analyze_emotion(image_path)
+        with request("emotion", input=image_path):
+            analysis_result = analyze_emotion(image_path)
         print(json.dumps(analysis_result, ensure_ascii=False))
     else:
-        print("사용법: python emotion_analysis.py <이미지_경로>")
\ No newline at end of file
+        print("사용법: python emotion_analysis.py <이미지_경로>")
+        print("       python emotion_analysis.py --faces <이미지_경로> [최대_얼굴_수] [최소_얼굴_크기]")
+        print("       python emotion_analysis.py --bench <이미지_경로>...")
+        print("       python emotion_analysis.py --bench-detect <이미지_경로>...")
\ No newline at end of file
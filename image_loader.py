@@ -0,0 +1,204 @@
+# image_loader.py
+"""
+단계별 작업 해상도로 바로 디코딩하는 공용 이미지 로더 (EXIF 회전 1회 적용)
+휴대폰 업로드(4000×3000 JPEG)를 전부 디코딩한 뒤 줄이던 부분을 대체합니다.
+JPEG은 draft 모드(DCT 1/2, 1/4, 1/8 축소 디코딩)로 작업 크기에 가장 가까운 배율로 디코딩하고,
+남은 차이만 리샘플합니다. 작업 크기보다 최대 10%(DRAFT_TOLERANCE) 작아지는 배율도 허용해
+리샘플을 건너뜁니다 (4000px → 최대 2048이면 1/2 배율 2000px 그대로). 다른 형식은 전체 디코딩 후 축소합니다.
+회전은 축소한 뒤에 적용합니다.
+
+- EXIF Orientation은 여기서 한 번만 적용합니다 (cv2.imread IMREAD_COLOR만 적용하고 PIL/IMREAD_UNCHANGED는
+  적용하지 않아 단계마다 방향이 달랐음)
+- DECODE_MAX_SIDE: 단계별 작업 최대 변 (기본 "emotion=1024,brush=2048,light=2048,remove_bg=0,composite=0")
+    0이면 원본 해상도. emotion은 검출(EMOTION_DETECT_MAX_SIDE 800)과 64×64 얼굴 crop에 충분한 크기,
+    brush/light는 효과가 1024px 이하에서 계산되므로 출력도 긴 변 2048px로 제한합니다.
+    remove_bg는 원본 해상도 알파를 만들어 다음 단계로 넘기므로 기본값이 0입니다.
+
+사용법: python image_loader.py <image_path>...   # 단계별 기존 전체 디코딩 vs 축소 디코딩 시간/최대 메모리 JSON 출력
+"""
+import sys
+import os
+import io
+import json
+import time
+import multiprocessing
+
+import numpy as np
+import cv2
+from PIL import Image
+
+DEFAULT_MAX_SIDES = "emotion=1024,brush=2048,light=2048,remove_bg=0,composite=0"
+LOADER_VERSION = 1  # 디코딩 결과(방향/축소 방식)가 바뀌면 올려서 단계별 결과 캐시 무효화
+DRAFT_TOLERANCE = 0.1
+LAYOUTS = ("rgb", "rgba", "bgr", "bgra", "gray")
+EXIF_ORIENTATION = 0x0112
+# EXIF Orientation → 바로 세우는 변환 (ImageOps.exif_transpose와 같은 표)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def parse_max_sides(spec):
+    """"emotion=1600,brush=2048" → {"emotion": 1600, "brush": 2048}"""
+    sides = {}
+    for part in spec.split(","):
+        if "=" in part:
+            stage, value = part.split("=", 1)
+            sides[stage.strip()] = int(value)
+    return sides
+
+STAGE_MAX_SIDES = dict(parse_max_sides(DEFAULT_MAX_SIDES),
+                       **parse_max_sides(os.environ.get("DECODE_MAX_SIDE", "")))
+
+def stage_max_side(stage):
+    """단계의 작업 최대 변 (설정이 없으면 0 = 원본 해상도)"""
+    return STAGE_MAX_SIDES.get(stage, 0)
+
+def cache_tag(stage):
+    """결과 캐시 키용 디코딩 설정 식별자"""
+    return f"v{LOADER_VERSION}-{stage_max_side(stage)}"
+
+def _fit_side(size, max_side):
+    w, h = size
+    scale = max_side / max(w, h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def open_image(source, max_side=0, mode=None, timings=None):
+    """
+    경로/바이트/PIL 이미지를 EXIF 방향을 적용해 긴 변 max_side 이하로 디코딩한 PIL 이미지 반환
+    mode: "RGB"/"RGBA"/"L" 등 (None이면 원본 모드 유지, JPEG draft는 RGB/L일 때만 색 변환까지 생략)
+    timings: dict를 넘기면 decode_ms, original_size(방향 적용 후), decoded_size, draft_scale 기록
+    """
+    t0 = time.perf_counter()
+    if isinstance(source, Image.Image):
+        image = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(source))
+    else:
+        image = Image.open(os.fspath(source))
+    stored_size = image.size
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+
+    draft_scale = 1
+    if max_side and max(stored_size) > max_side and image.format == "JPEG":
+        draft_mode = mode if mode in ("RGB", "L") else image.mode
+        # draft는 요청 크기 이상인 가장 작은 배율을 고름 - 허용 오차만큼 작게 요청
+        # (저장된 방향 기준 크기지만 긴 변 기준이라 90도 회전과 무관)
+        request = _fit_side(stored_size, max_side * (1 - DRAFT_TOLERANCE))
+        if image.draft(draft_mode, request) is not None:
+            draft_scale = round(stored_size[0] / image.size[0])
+    image.load()
+    if mode and image.mode != mode and Image.getmodebands(mode) < len(image.getbands()):
+        # 채널이 줄어드는 변환(RGBA → L 등)은 리샘플 전에
+        image = image.convert(mode)
+    if max_side and max(image.size) > max_side:
+        image = image.resize(_fit_side(image.size, max_side), Image.LANCZOS, reducing_gap=2.0)
+    if orientation in ORIENTATION_TRANSPOSE:
+        image = image.transpose(ORIENTATION_TRANSPOSE[orientation])
+    if mode and image.mode != mode:
+        image = image.convert(mode)
+
+    if timings is not None:
+        w, h = stored_size
+        timings["decode_ms"] = (time.perf_counter() - t0) * 1000
+        timings["original_size"] = [h, w] if orientation in (5, 6, 7, 8) else [w, h]
+        timings["decoded_size"] = list(image.size)
+        timings["draft_scale"] = draft_scale
+    return image
+
+def has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+def load_array(source, max_side=0, layout="rgb", timings=None, keep_alpha=False):
+    """
+    open_image 결과를 layout(rgb/rgba/bgr/bgra/gray) 순서의 uint8 배열로 반환 (OpenCV 단계용)
+    keep_alpha: rgb/bgr이어도 원본에 알파가 있으면 rgba/bgra로 (cv2.IMREAD_UNCHANGED처럼)
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"지원하지 않는 배열 형식입니다: {layout} (가능: {', '.join(LAYOUTS)})")
+    # gray/rgb는 JPEG draft 단계에서 바로 그 모드로 디코딩 (알파 유지 여부는 열어 봐야 알 수 있음)
+    hint = None if keep_alpha or layout in ("rgba", "bgra") else ("L" if layout == "gray" else "RGB")
+    image = open_image(source, max_side, hint, timings)
+    if keep_alpha and layout in ("rgb", "bgr") and has_alpha(image):
+        layout += "a"
+    mode = {"rgb": "RGB", "bgr": "RGB", "rgba": "RGBA", "bgra": "RGBA", "gray": "L"}[layout]
+    array = np.asarray(image if image.mode == mode else image.convert(mode))
+    if layout == "bgr":
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+    elif layout == "bgra":
+        array = cv2.cvtColor(array, cv2.COLOR_RGBA2BGRA)
+    return array
+
+def load_for_stage(stage, source, mode=None, timings=None):
+    """단계 설정(DECODE_MAX_SIDE)의 작업 해상도로 open_image"""
+    return open_image(source, stage_max_side(stage), mode, timings)
+
+# ---- 측정 (단계마다 새 프로세스에서 1회 디코딩 → VmHWM 증가분) ----
+def _legacy_decode(stage, path):
+    """기존 단계별 디코딩 방식"""
+    if stage == "emotion":
+        return cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+    if stage == "light":
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    return np.asarray(Image.open(path).convert("RGBA"))
+
+def _loader_decode(stage, path):
+    if stage == "emotion":
+        return load_array(path, stage_max_side(stage), "gray")
+    if stage == "light":
+        return load_array(path, stage_max_side(stage), "bgr", keep_alpha=True)
+    return np.asarray(load_for_stage(stage, path, "RGBA"))
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+def _measure(stage, path, method, out):
+    Image.init()  # 플러그인 등록 비용은 측정에서 제외
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # VmHWM을 현재 RSS로 초기화
+    except OSError:
+        pass
+    base = _status_kb("VmRSS:")
+    t0 = time.perf_counter()
+    try:
+        array = (_legacy_decode if method == "full" else _loader_decode)(stage, path)
+    except Exception as e:
+        out.put({"error": str(e)})
+        return
+    elapsed = (time.perf_counter() - t0) * 1000
+    out.put({"ms": round(elapsed, 2), "peak_mb": round((_status_kb("VmHWM:") - base) / 1024, 1),
+             "shape": list(array.shape)})
+
+def benchmark_decode(image_paths, stages=("emotion", "remove_bg", "brush", "light")):
+    """단계별 기존 전체 디코딩과 로더(draft + EXIF + 작업 해상도)의 디코딩 시간/최대 메모리 비교 (Linux)"""
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for path in image_paths:
+        for stage in stages:
+            row = {"image": os.path.basename(path), "stage": stage, "max_side": stage_max_side(stage)}
+            for method in ("full", "loader"):
+                queue = context.Queue()
+                proc = context.Process(target=_measure, args=(stage, path, method, queue))
+                proc.start()
+                row[method] = queue.get()
+                proc.join()
+            if "ms" in row["full"] and row["loader"].get("ms"):
+                row["speedup"] = round(row["full"]["ms"] / row["loader"]["ms"], 2)
+            rows.append(row)
+    return {"rows": rows}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("사용법: python image_loader.py <image_path>...")
+        sys.exit(1)
+    print(json.dumps(benchmark_decode(sys.argv[1:]), ensure_ascii=False))
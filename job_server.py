@@ -0,0 +1,458 @@
+# job_server.py
+"""
+로컬 비동기 작업 서버 (asyncio + 프로세스 풀)
+배경 제거/감정 분석/브러시 효과를 한 호스트에서 동시에 처리합니다.
+워커 프로세스마다 모델을 한 번만 로드해 두고, 단계별 동시 실행 수와 대기열 길이를 제한합니다.
+
+사용법:
+  python job_server.py                      # 서버 실행 (JOB_SERVER_HOST:JOB_SERVER_PORT)
+  python job_server.py loadtest <stage> <input> [requests=50] [concurrency=8]
+                                            # 대역 클라이언트로 부하 테스트 후 요약 JSON 출력
+
+프로토콜 (TCP, JSON Lines — 한 연결에서 여러 요청을 보낼 수 있고 응답은 완료 순서대로 id와 함께 반환):
+  {"id": 1, "stage": "remove_bg", "input": "in.jpg", "output": "out.png", "max_side": 1024}
+  {"id": 2, "stage": "emotion", "input": "in.jpg"}
+  {"id": 3, "stage": "brush", "input": "cutout.png", "output": "brush.png", "style": "...", "nst": true}
+  {"id": 4, "stage": "light", "input": "cutout.png", "output": "light.png", "seed": 7}
+  (brush/light의 "seed"는 선택 - 지정하면 같은 입력에 같은 결과)
+  {"id": 5, "stage": "composite", "input": "cutout.png", "output": "out.jpg", "bg": "<BG_image 파일명>",
+   "mode": "contain", "width": 1024, "height": 1024, "opacity": 1.0, "out": "jpeg"}
+  {"id": 6, "stage": "sleep", "ms": 200}    # 모델 없이 부하 테스트용 (CPU를 ms만큼 점유)
+  (모든 단계에 "profile": true 또는 "cprofile"/"tracemalloc"을 넣으면 그 요청만 프로파일링, tracing.py 참고)
+  {"cmd": "stats"} / {"cmd": "ping"}
+대기열이 가득 차면 즉시 {"success": false, "error": "busy", "retry_after_ms": ...}로 거절합니다.
+
+환경 변수:
+  JOB_SERVER_HOST (기본 127.0.0.1), JOB_SERVER_PORT (기본 8765)
+  JOB_SERVER_WORKERS: 프로세스 풀 크기 (기본 min(CPU 수, 4))
+  JOB_SERVER_MAX_QUEUE: 실행 중 + 대기 중 작업 상한 (기본 32)
+  JOB_SERVER_LIMITS: 단계별 동시 실행 수 (기본 "remove_bg=2,emotion=4,brush=2,light=4,composite=4,sleep=4",
+                     풀 크기보다 크면 풀 크기로 제한 - 넘치는 작업은 어차피 풀 내부 대기열에서 기다림)
+  JOB_SERVER_PRELOAD: 워커 시작 시 미리 로드할 단계 (기본 "remove_bg,emotion", 빈 값이면 요청 시 로드)
+  ORT_INTRA_OP_THREADS / ORT_INTER_OP_THREADS: 워커별 ONNX Runtime 스레드 수 (기본 CPU 수 / 워커 수, 1)
+  ORT_SHARED_WEIGHTS: 모델 가중치 메모리 매핑 공유 (기본 mmap, onnx_sessions.py 참고)
+  MODEL_PRECISION: 단계별 모델 정밀도 fp32/opt/int8 (기본 fp32, model_precision.py 참고)
+  TRACE_SPANS / TRACE_PROFILE: 단계별 span 기록 / 요청별 프로파일링 (tracing.py 참고)
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import traceback
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from tracing import request
+
+HOST = os.environ.get("JOB_SERVER_HOST", "127.0.0.1")
+PORT = int(os.environ.get("JOB_SERVER_PORT", "8765"))
+WORKERS = int(os.environ.get("JOB_SERVER_WORKERS", str(min(os.cpu_count() or 1, 4))))
+MAX_QUEUE = int(os.environ.get("JOB_SERVER_MAX_QUEUE", "32"))
+DEFAULT_LIMITS = "remove_bg=2,emotion=4,brush=2,light=4,composite=4,sleep=4"
+PRELOAD = os.environ.get("JOB_SERVER_PRELOAD", "remove_bg,emotion")
+LATENCY_WINDOW = 1000  # 단계별로 최근 N건의 지연 시간만 유지
+
+STAGES = ("remove_bg", "emotion", "brush", "light", "composite", "sleep")
+
+def parse_limits(spec):
+    limits = {stage: max(1, WORKERS) for stage in STAGES}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        stage, _, value = item.partition("=")
+        if stage in limits and value:
+            limits[stage] = max(1, int(value))
+    return limits
+
+def percentiles(values):
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 95, 99])
+    return {"count": len(values), "p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2)}
+
+# ---- 워커 프로세스 쪽 ----
+# 모델은 워커마다 한 번만 로드되고 이후 요청에서 재사용됩니다.
+def _init_worker(preload, workers=1):
+    # 단계 함수들의 진행 로그가 서버 출력과 섞이지 않도록 stderr로 돌림
+    sys.stdout = sys.stderr
+    # 워커마다 ONNX Runtime이 모든 코어를 쓰면 과다 구독되므로 코어를 워커 수로 나눔 (환경 변수가 있으면 그대로)
+    os.environ.setdefault("ORT_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+    os.environ.setdefault("ORT_INTER_OP_THREADS", "1")
+    for stage in preload:
+        try:
+            _preload_stage(stage)
+        except Exception as e:
+            # 미리 로드 실패는 치명적이지 않음 (요청 시 다시 시도)
+            print(f"[worker {os.getpid()}] {stage} 미리 로드 실패: {e}")
+
+def _preload_stage(stage):
+    if stage == "remove_bg":
+        import u2net_remove_bg
+        u2net_remove_bg.get_session()
+    elif stage == "emotion":
+        import emotion_analysis
+        emotion_analysis.get_engine()
+    elif stage == "brush":
+        import brush_effect
+        if brush_effect.TENSORFLOW_AVAILABLE and brush_effect.STYLE_TRANSFER_MODE == 'cached':
+            brush_effect.get_style_interpreter('transfer')
+    elif stage == "light":
+        import brush_effect_light  # noqa: F401
+
+CACHE_COUNTERS = ("hits", "misses", "evictions")
+
+def _cache_counters():
+    from result_cache import get_cache
+    cache = get_cache()
+    return {name: getattr(cache, name) for name in CACHE_COUNTERS} if cache is not None else None
+
+def run_stage(stage, job):
+    """
+    워커 프로세스에서 단일 작업을 실행하고 (결과 dict, 실행 시간 ms, pid, 시작 시각, 결과 캐시 횟수 증가분)을 반환
+    (캐시 적중/누락 횟수는 워커 프로세스별이므로 작업마다 증가분을 돌려 서버에서 합산)
+    """
+    started_at = time.time()  # 풀 내부 대기열까지 포함한 대기 시간 계산용 (프로세스 간 비교라 벽시계)
+    t0 = time.perf_counter()
+    timings = {}
+    before = _cache_counters()
+    with request(stage, profile=job.get("profile"), job=job.get("id")):
+        result = _execute_stage(stage, job, timings)
+    after = _cache_counters()
+    cache_delta = {name: after[name] - before[name] for name in CACHE_COUNTERS} if after and before else None
+    if timings:
+        result["stage_timings"] = {k: round(v, 2) if isinstance(v, float) else v for k, v in timings.items()}
+    return result, (time.perf_counter() - t0) * 1000, os.getpid(), started_at, cache_delta
+
+def _execute_stage(stage, job, timings):
+    if stage == "remove_bg":
+        import u2net_remove_bg
+        alpha_matting, fg_threshold, bg_threshold, erode_size = u2net_remove_bg.normalize_params(
+            job.get("alpha_matting", False), job.get("fg_threshold", 120),
+            job.get("bg_threshold", 60), job.get("erode_size", 1),
+        )
+        max_side = int(job.get("max_side", u2net_remove_bg.DEFAULT_MAX_SIDE))
+        session = u2net_remove_bg.get_session()
+        try:
+            if max_side > 0:
+                success = u2net_remove_bg.process_image_bounded(
+                    job["input"], job["output"], alpha_matting, fg_threshold, bg_threshold, erode_size, max_side,
+                    session=session, timings=timings
+                )
+            else:
+                success = u2net_remove_bg.process_image(
+                    job["input"], job["output"], alpha_matting, fg_threshold, bg_threshold, erode_size,
+                    session=session, timings=timings
+                )
+        except SystemExit:
+            success = False
+        result = {"success": bool(success), "output": job["output"]}
+        if not success:
+            result["error"] = "배경 제거 실패"
+    elif stage == "emotion":
+        import emotion_analysis
+        analysis = emotion_analysis.analyze_emotion(job["input"])
+        # analyze_emotion은 실패해도 예외 대신 "error" 키가 있는 기본 결과를 반환
+        result = {"success": "error" not in analysis, "result": analysis}
+        if "error" in analysis:
+            result["error"] = analysis["error"]
+    elif stage == "brush":
+        import brush_effect
+        style_path = None
+        if job.get("nst", True) and brush_effect.TENSORFLOW_AVAILABLE:
+            style_path = job.get("style") or brush_effect.default_style_path()
+        brush_effect.render_brush_effect(job["input"], job["output"], style_path, timings, seed=job.get("seed"))
+        result = {"success": True, "output": job["output"]}
+    elif stage == "light":
+        import brush_effect_light
+        result = brush_effect_light.apply_artistic_effect(job["input"], job["output"], job.get("seed"))
+    elif stage == "composite":
+        import compositor
+        data = compositor.composite(
+            job["input"], job.get("bg"), job.get("mode", "contain"), job.get("width"), job.get("height"),
+            job.get("opacity", 1.0), job.get("out", "png"), timings
+        )
+        with open(job["output"], "wb") as f:
+            f.write(data)
+        result = {"success": True, "output": job["output"], "bytes": len(data)}
+    elif stage == "sleep":
+        deadline = time.perf_counter() + float(job.get("ms", 100)) / 1000
+        while time.perf_counter() < deadline:
+            pass
+        result = {"success": True}
+    else:
+        raise ValueError(f"지원하지 않는 단계입니다: {stage}")
+    return result
+
+# ---- 서버 쪽 ----
+class JobServer:
+    """단계별 세마포어 + 전체 대기열 상한으로 프로세스 풀에 작업을 배분하는 asyncio 서버"""
+
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE, limits=None, preload=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        limits = limits or parse_limits(os.environ.get("JOB_SERVER_LIMITS", DEFAULT_LIMITS))
+        # 세마포어를 통과한 작업이 풀 안에서 보이지 않게 기다리지 않도록 풀 크기를 넘지 않게 함
+        self.limits = {stage: max(1, min(limit, workers)) for stage, limit in limits.items()}
+        self.preload = [s for s in (preload if preload is not None else PRELOAD.split(",")) if s in STAGES]
+        self.executor = None
+        self.semaphores = {}
+        self.in_flight = 0
+        self.waiting = {stage: 0 for stage in STAGES}
+        self.running = {stage: 0 for stage in STAGES}
+        self.completed = {stage: 0 for stage in STAGES}
+        self.failed = {stage: 0 for stage in STAGES}
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.cache = {stage: dict.fromkeys(CACHE_COUNTERS, 0) for stage in STAGES}
+        self.latency = {stage: deque(maxlen=LATENCY_WINDOW) for stage in STAGES}
+        self.queue_wait = {stage: deque(maxlen=LATENCY_WINDOW) for stage in STAGES}
+        self.started_at = time.time()
+
+    def _new_executor(self):
+        # fork로 띄워 서버가 이미 import한 모듈 페이지를 워커가 공유하도록 함 (모델 세션은 워커별 initializer에서 생성)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context,
+            initializer=_init_worker, initargs=(self.preload, self.workers),
+        )
+
+    def start_pool(self):
+        self.executor = self._new_executor()
+        self.semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()}
+
+    def restart_pool(self, broken):
+        """워커가 죽어(OOM 등) 깨진 풀을 새로 만듦 - 같은 풀에서 실패한 작업이 여럿이어도 한 번만"""
+        if self.executor is not broken:
+            return
+        print(f"⚠️ 워커 프로세스가 비정상 종료되어 프로세스 풀을 다시 만듭니다 (누적 {self.pool_restarts + 1}회)")
+        self.pool_restarts += 1
+        self.executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def retry_after_ms(self, stage):
+        """대기열이 빌 때까지 걸릴 시간 추정 (최근 p50 × 초과 작업 수 / 동시 실행 수)"""
+        recent = self.latency[stage]
+        p50 = float(np.median(recent)) if recent else 500.0
+        backlog = self.in_flight - self.max_queue + 1
+        return int(max(100.0, p50 * max(1, backlog) / max(1, self.limits[stage])))
+
+    async def submit(self, job):
+        job_id = job.get("id")
+        stage = job.get("stage")
+        if stage not in STAGES:
+            return {"id": job_id, "success": False, "error": f"지원하지 않는 단계입니다: {stage}"}
+        if stage != "sleep" and not job.get("input"):
+            return {"id": job_id, "success": False, "error": "input 경로가 필요합니다."}
+        if stage in ("remove_bg", "brush", "light", "composite") and not job.get("output"):
+            return {"id": job_id, "success": False, "error": "output 경로가 필요합니다."}
+
+        # 백프레셔: 가득 차면 기다리게 하지 않고 즉시 거절
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            return {"id": job_id, "success": False, "error": "busy",
+                    "retry_after_ms": self.retry_after_ms(stage), "queue_depth": self.in_flight}
+
+        self.in_flight += 1
+        enqueued_at = time.time()
+        t_enqueue = time.perf_counter()
+        self.waiting[stage] += 1
+        try:
+            async with self.semaphores[stage]:
+                self.waiting[stage] -= 1
+                self.running[stage] += 1
+                started_at = cache_delta = None
+                executor = self.executor
+                try:
+                    loop = asyncio.get_running_loop()
+                    result, run_ms, pid, started_at, cache_delta = await loop.run_in_executor(
+                        executor, run_stage, stage, job)
+                except BrokenProcessPool as e:
+                    # 이 풀에서 실행 중이던 작업만 실패 처리하고 이후 작업은 새 풀에서
+                    self.restart_pool(executor)
+                    result, run_ms, pid = {"success": False, "error": f"워커 프로세스 비정상 종료: {e}"}, None, None
+                except Exception as e:
+                    traceback.print_exc()
+                    result, run_ms, pid = {"success": False, "error": str(e)}, None, None
+                finally:
+                    self.running[stage] -= 1
+        finally:
+            self.in_flight -= 1
+
+        total_ms = (time.perf_counter() - t_enqueue) * 1000
+        if cache_delta:
+            for name, value in cache_delta.items():
+                self.cache[stage][name] += value
+        # 대기 시간 = 접수부터 워커가 실제로 작업을 시작할 때까지 (세마포어 + 풀 내부 대기열)
+        queue_ms = max(0.0, (started_at - enqueued_at) * 1000) if started_at is not None else None
+        if queue_ms is not None:
+            self.queue_wait[stage].append(queue_ms)
+        if result.get("success"):
+            self.completed[stage] += 1
+            self.latency[stage].append(total_ms)
+        else:
+            self.failed[stage] += 1
+        response = {"id": job_id, "stage": stage, **result}
+        response["timings"] = {
+            "queue_ms": round(queue_ms, 2) if queue_ms is not None else None,
+            "run_ms": round(run_ms, 2) if run_ms is not None else None,
+            "total_ms": round(total_ms, 2),
+        }
+        response["worker_pid"] = pid
+        return response
+
+    def cache_stats(self):
+        """워커 프로세스들의 결과 캐시 적중/누락/삭제 합계 (단계별, 조회가 있었던 단계만)"""
+        report = {}
+        for stage, counts in self.cache.items():
+            lookups = counts["hits"] + counts["misses"]
+            if lookups or counts["evictions"]:
+                report[stage] = dict(counts, hit_rate=round(counts["hits"] / lookups, 4) if lookups else None)
+        return report
+
+    def stats(self):
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "limits": self.limits,
+            "queue_depth": self.in_flight,
+            "waiting": dict(self.waiting),
+            "running": dict(self.running),
+            "completed": dict(self.completed),
+            "failed": dict(self.failed),
+            "rejected": self.rejected,
+            "pool_restarts": self.pool_restarts,
+            "result_cache": self.cache_stats(),
+            "latency_ms": {stage: percentiles(self.latency[stage]) for stage in STAGES if self.latency[stage]},
+            "queue_wait_ms": {stage: percentiles(self.queue_wait[stage]) for stage in STAGES if self.queue_wait[stage]},
+        }
+
+    async def handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(message):
+            async with write_lock:
+                writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def process(job):
+            try:
+                response = await self.submit(job)
+            except Exception as e:
+                traceback.print_exc()
+                response = {"id": job.get("id"), "success": False, "error": str(e)}
+            await send(response)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    job = json.loads(line)
+                    if not isinstance(job, dict):
+                        raise ValueError("요청은 JSON 객체여야 합니다")
+                except ValueError as e:  # json.JSONDecodeError 포함
+                    await send({"success": False, "error": f"잘못된 JSON 요청: {e}"})
+                    continue
+                cmd = job.get("cmd")
+                if cmd == "ping":
+                    await send({"id": job.get("id"), "type": "pong", "queue_depth": self.in_flight})
+                    continue
+                if cmd == "stats":
+                    await send({"id": job.get("id"), "type": "stats", **self.stats()})
+                    continue
+                task = asyncio.create_task(process(job))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        self.start_pool()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=1 << 20)
+        print(f"🚦 작업 서버 시작: {host}:{port} (workers={self.workers}, max_queue={self.max_queue}, limits={self.limits})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+# ---- 대역 클라이언트 (부하 테스트) ----
+async def load_test(stage, input_path, requests=50, concurrency=8, host=HOST, port=PORT, output_dir="/tmp/job-server-loadtest"):
+    """동시 연결 concurrency개로 requests건을 보내고, busy 응답은 retry_after_ms만큼 기다린 뒤 재시도"""
+    os.makedirs(output_dir, exist_ok=True)
+    latencies, rejections, failures = [], 0, 0
+    counter = iter(range(requests))
+
+    async def client(worker_id):
+        nonlocal rejections, failures
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        try:
+            for i in counter:
+                job = {"id": i, "stage": stage, "input": input_path,
+                       "output": os.path.join(output_dir, f"{stage}_{i}.png"), "ms": 200}
+                t0 = time.perf_counter()
+                while True:
+                    writer.write((json.dumps(job) + "\n").encode("utf-8"))
+                    await writer.drain()
+                    response = json.loads(await reader.readline())
+                    if response.get("error") == "busy":
+                        rejections += 1
+                        await asyncio.sleep(response["retry_after_ms"] / 1000)
+                        continue
+                    break
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if not response.get("success"):
+                    failures += 1
+        finally:
+            writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    wall_s = time.perf_counter() - t0
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"cmd": "stats"}\n')
+    await writer.drain()
+    server_stats = json.loads(await reader.readline())
+    writer.close()
+    return {
+        "stage": stage,
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(requests / wall_s, 2) if wall_s > 0 else None,
+        "client_latency_ms": percentiles(latencies),
+        "rejections": rejections,
+        "failures": failures,
+        "server": server_stats,
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "loadtest":
+        if len(sys.argv) < 4:
+            print("사용법: python job_server.py loadtest <stage> <input> [requests] [concurrency]")
+            sys.exit(1)
+        stage, input_path = sys.argv[2], sys.argv[3]
+        requests = int(sys.argv[4]) if len(sys.argv) > 4 else 50
+        concurrency = int(sys.argv[5]) if len(sys.argv) > 5 else 8
+        summary = asyncio.run(load_test(stage, input_path, requests, concurrency))
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        try:
+            asyncio.run(JobServer().serve())
+        except KeyboardInterrupt:
+            print("작업 서버 종료")
@@ -0,0 +1,237 @@
+# model_precision.py
+"""
+ONNX 모델 정밀도 변형(오프라인 그래프 최적화 / 동적 int8 양자화) 생성과 단계별 정밀도 선택
+u2net.onnx(약 176MB)와 감정 모델을 CPU 전용 호스트에서 fp32 그대로 실행하던 부분에 선택지를 추가합니다.
+
+- fp32: 원본 모델 그대로 (기본)
+- opt:  ONNX Runtime 확장 수준 그래프 최적화를 미리 적용해 저장한 모델 (세션 생성 시 최적화 시간 절약, 결과는 fp32와 동일 수준)
+- int8: 전처리(shape 추론 + 기본 최적화) 후 가중치 동적 int8(uint8) 양자화 - 파일/메모리 약 1/4, 콜드 스타트 단축
+        정확도는 모델마다 다르므로 eval로 fp32 대비 일치도를 확인한 뒤 켜세요.
+
+- MODEL_PRECISION: 단계별 정밀도 (기본 "remove_bg=fp32,emotion=fp32", 예: "remove_bg=int8,emotion=opt")
+- MODEL_VARIANT_DIR: 변형 모델 저장 위치 (기본 <임시 디렉터리>/model_variants)
+  변형은 처음 필요할 때 한 번만 만들고(프로세스 간 잠금) 원본 크기/수정 시각이 바뀌면 새로 만듭니다.
+  만들 수 없으면(onnx 패키지 없음 등) fp32 원본으로 실행합니다.
+
+사용법:
+  python model_precision.py build <model_path> [opt,int8]           # 변형 생성, 파일 크기/생성 시간 JSON
+  python model_precision.py eval <remove_bg|emotion> <model_path> <이미지 또는 디렉터리>...
+      # 정밀도별 콜드 로드 ms, 로드 후 RSS 증가분, 이미지당 추론 ms, fp32 대비 정확도
+      # (remove_bg: 마스크 IoU, emotion: top-1 일치율) JSON
+"""
+import sys
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+
+import numpy as np
+import onnxruntime as ort
+
+PRECISIONS = ("fp32", "opt", "int8")
+DEFAULT_PRECISION = "remove_bg=fp32,emotion=fp32"
+VARIANT_DIR = os.environ.get("MODEL_VARIANT_DIR", os.path.join(tempfile.gettempdir(), "model_variants"))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def parse_precisions(spec):
+    """"remove_bg=int8,emotion=opt" → {"remove_bg": "int8", "emotion": "opt"}"""
+    precisions = {}
+    for part in spec.split(","):
+        if "=" in part:
+            stage, value = part.split("=", 1)
+            value = value.strip().lower()
+            if value not in PRECISIONS:
+                raise ValueError(f"지원하지 않는 정밀도입니다: {value} (가능: {', '.join(PRECISIONS)})")
+            precisions[stage.strip()] = value
+    return precisions
+
+STAGE_PRECISIONS = dict(parse_precisions(DEFAULT_PRECISION),
+                        **parse_precisions(os.environ.get("MODEL_PRECISION", "")))
+
+def stage_precision(stage):
+    return STAGE_PRECISIONS.get(stage, "fp32")
+
+def variant_path(model_path, precision):
+    stat = os.stat(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(VARIANT_DIR, f"{stem}-{stat.st_size}-{int(stat.st_mtime)}.{precision}.onnx")
+
+def _optimize(src, dst):
+    """확장 수준 그래프 최적화 결과를 저장 (하드웨어별 레이아웃 변환이 들어가는 ALL 수준은 제외)"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = dst
+    ort.InferenceSession(src, options, providers=["CPUExecutionProvider"])
+
+def _quantize(src, dst, work_dir):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    prepared = os.path.join(work_dir, "prepared.onnx")
+    try:
+        import sympy  # noqa: F401 - 심볼릭 shape 추론용 (선택)
+        skip_symbolic = False
+    except ImportError:
+        skip_symbolic = True
+    quant_pre_process(src, prepared, skip_symbolic_shape=skip_symbolic)
+    # ConvInteger CPU 커널이 uint8 가중치를 요구하므로 U8 사용
+    quantize_dynamic(prepared, dst, weight_type=QuantType.QUInt8)
+
+def build_variant(model_path, precision):
+    """정밀도 변형 모델 경로 (없으면 만들어서 반환, fp32면 원본 경로)"""
+    if precision == "fp32":
+        return model_path
+    if precision not in PRECISIONS:
+        raise ValueError(f"지원하지 않는 정밀도입니다: {precision} (가능: {', '.join(PRECISIONS)})")
+    path = variant_path(model_path, precision)
+    if os.path.exists(path):
+        return path
+
+    from model_store import file_lock
+    os.makedirs(VARIANT_DIR, exist_ok=True)
+    with file_lock(path + ".lock"):
+        if os.path.exists(path):
+            return path
+        t0 = time.perf_counter()
+        work_dir = tempfile.mkdtemp(prefix=".build-", dir=VARIANT_DIR)
+        try:
+            output = os.path.join(work_dir, "model.onnx")
+            if precision == "opt":
+                _optimize(model_path, output)
+            else:
+                _quantize(model_path, output, work_dir)
+            os.replace(output, path)
+        finally:
+            for leftover in os.listdir(work_dir):
+                os.remove(os.path.join(work_dir, leftover))
+            os.rmdir(work_dir)
+        print(f"{precision} 모델 생성 완료: {path} ({(time.perf_counter() - t0) * 1000:.0f}ms, "
+              f"{os.path.getsize(path) / 2**20:.1f}MB)", file=sys.stderr)
+    return path
+
+def resolve_model(model_path, stage, precision=None):
+    """단계 설정(MODEL_PRECISION)에 맞는 모델 경로 (변형을 만들 수 없으면 원본)"""
+    precision = precision or stage_precision(stage)
+    if precision == "fp32" or not os.path.exists(model_path):
+        return model_path
+    try:
+        return build_variant(model_path, precision)
+    except Exception as e:
+        print(f"{precision} 모델 생성 실패, fp32 원본 사용: {e}", file=sys.stderr)
+        return model_path
+
+# ---- 정확도/지연 시간/메모리 비교 ----
+def u2net_input(image, size=(320, 320)):
+    """rembg U2netSession과 같은 전처리 (LANCZOS 320×320, 최대값 정규화 후 ImageNet 평균/표준편차)"""
+    from PIL import Image
+    arr = np.array(image.convert("RGB").resize(size, Image.LANCZOS), dtype=np.float64)
+    arr = arr / max(np.max(arr), 1e-6)
+    arr = (arr - (0.485, 0.456, 0.406)) / (0.229, 0.224, 0.225)
+    return arr.transpose(2, 0, 1)[np.newaxis].astype(np.float32)
+
+def u2net_mask(output):
+    """첫 출력 d0를 rembg처럼 최소-최대 정규화한 (H, W) 마스크"""
+    pred = output[:, 0, :, :]
+    mi, ma = np.min(pred), np.max(pred)
+    return np.squeeze((pred - mi) / max(ma - mi, 1e-6))
+
+def mask_iou(a, b, threshold=0.5):
+    a, b = a >= threshold, b >= threshold
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+def prepare_inputs(stage, image_paths):
+    """단계별 모델 입력 텐서 목록 (전처리는 한 번만 해서 모든 정밀도에 같은 입력 사용)"""
+    import image_loader
+    if stage == "remove_bg":
+        return [u2net_input(image_loader.load_for_stage("remove_bg", path)) for path in image_paths]
+    if stage == "emotion":
+        import emotion_analysis
+        cascade = emotion_analysis.load_face_cascade()
+        return [emotion_analysis.preprocess_face(path, cascade) for path in image_paths]
+    raise ValueError(f"지원하지 않는 단계입니다: {stage} (가능: remove_bg, emotion)")
+
+def _eval_worker(model_path, inputs, out):
+    from onnx_sessions import process_memory
+    before = (process_memory() or {}).get("rss_mb", 0.0)
+    t0 = time.perf_counter()
+    # 정밀도 자체를 비교하므로 공유 가중치 변환은 끔
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    load_ms = (time.perf_counter() - t0) * 1000
+    input_name = session.get_inputs()[0].name
+    outputs, times = [], []
+    for tensor in inputs:
+        t0 = time.perf_counter()
+        outputs.append(session.run(None, {input_name: tensor})[0])
+        times.append((time.perf_counter() - t0) * 1000)
+    after = (process_memory() or {}).get("rss_mb", 0.0)
+    out.put({
+        "load_ms": round(load_ms, 1),
+        "rss_mb": round(after - before, 1),
+        "first_run_ms": round(times[0], 2) if times else None,
+        "run_ms": round(float(np.mean(times[1:] or times)), 2) if times else None,
+        "outputs": outputs,
+    })
+
+def evaluate(stage, model_path, image_paths, precisions=PRECISIONS):
+    """정밀도별로 새 프로세스에서 세션을 만들어 같은 입력을 추론하고 fp32 결과와 비교"""
+    inputs = prepare_inputs(stage, image_paths)
+    context = multiprocessing.get_context("spawn")
+    report = {"stage": stage, "model": model_path, "images": len(image_paths), "precisions": {}}
+    reference = None
+    for precision in ("fp32",) + tuple(p for p in precisions if p != "fp32"):
+        t0 = time.perf_counter()
+        try:
+            path = build_variant(model_path, precision)
+        except Exception as e:
+            report["precisions"][precision] = {"error": str(e)}
+            continue
+        build_ms = (time.perf_counter() - t0) * 1000
+        queue = context.Queue()
+        proc = context.Process(target=_eval_worker, args=(path, inputs, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        outputs = result.pop("outputs")
+        row = dict(result, file_mb=round(os.path.getsize(path) / 2**20, 2), build_ms=round(build_ms, 1))
+        if reference is None:
+            reference = outputs
+        elif stage == "remove_bg":
+            ious = [mask_iou(u2net_mask(ref), u2net_mask(out)) for ref, out in zip(reference, outputs)]
+            row["mask_iou_mean"] = round(float(np.mean(ious)), 4) if ious else None
+            row["mask_iou_min"] = round(float(np.min(ious)), 4) if ious else None
+        else:
+            ref = np.concatenate(reference)
+            got = np.concatenate(outputs)
+            row["top1_agreement"] = round(float(np.mean(ref.argmax(axis=1) == got.argmax(axis=1))), 4)
+            probs = lambda x: np.exp(x - x.max(axis=1, keepdims=True)) / np.exp(x - x.max(axis=1, keepdims=True)).sum(axis=1, keepdims=True)
+            row["max_prob_diff"] = round(float(np.abs(probs(ref) - probs(got)).max()), 4)
+        report["precisions"][precision] = row
+    return report
+
+def _image_paths(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(sorted(os.path.join(arg, name) for name in os.listdir(arg)
+                                if name.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            paths.append(arg)
+    return paths
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "build":
+        targets = sys.argv[3].split(",") if len(sys.argv) > 3 else ["opt", "int8"]
+        rows = {"fp32": {"path": sys.argv[2], "file_mb": round(os.path.getsize(sys.argv[2]) / 2**20, 2)}}
+        for precision in targets:
+            t0 = time.perf_counter()
+            path = build_variant(sys.argv[2], precision)
+            rows[precision] = {"path": path, "file_mb": round(os.path.getsize(path) / 2**20, 2),
+                               "build_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        print(json.dumps(rows, ensure_ascii=False))
+    elif len(sys.argv) >= 5 and sys.argv[1] == "eval":
+        print(json.dumps(evaluate(sys.argv[2], sys.argv[3], _image_paths(sys.argv[4:])), ensure_ascii=False))
+    else:
+        print("사용법: python model_precision.py build <model_path> [opt,int8]")
+        print("       python model_precision.py eval <remove_bg|emotion> <model_path> <이미지 또는 디렉터리>...")
+        sys.exit(1)
@@ -0,0 +1,249 @@
+# model_store.py
+"""
+모델 파일 저장소: 이어받기/검증/동시 실행 안전 다운로드
+여러 워커가 동시에 콜드 스타트해도 한 프로세스만 받고 나머지는 잠금을 기다렸다가 완성된 파일을 씁니다.
+
+- <path>.part 임시 파일로 받고 HTTP Range로 이어받기 (서버가 206을 주지 않으면 처음부터)
+- 크기 + SHA-256 검증 후 os.replace로 원자적 교체 (읽는 쪽은 반쯤 쓰인 파일을 보지 않음)
+- <path>.lock 파일 잠금 (fcntl / Windows는 msvcrt)
+- 기대 SHA-256을 모르면 첫 검증 때 계산해 <path>.sha256에 기록하고 이후에는 그 값으로 검증
+- MODEL_SEED_DIR (또는 seed_path): 같은 파일명이 있으면 네트워크 대신 로컬 파일에서 복사
+- TLS 인증서/호스트 이름 검증은 항상 켜 둠 (기대 SHA-256이 없으면 첫 다운로드를 그대로 신뢰하므로)
+  사내 CA 등 별도 인증서가 필요한 환경은 SSL_CERT_FILE / SSL_CERT_DIR로 지정
+- MODEL_VERIFY=fast(기본): 크기가 맞고 기록된 해시가 파일보다 새로우면 재해시 생략 / full: 매번 SHA-256 계산
+
+사용법: python model_store.py <url> <dest_path> [sha256] [size]   # 결과 JSON 출력
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+CHUNK_SIZE = 1 << 20
+TIMEOUT = float(os.environ.get("MODEL_DOWNLOAD_TIMEOUT", "60"))
+SEED_DIR = os.environ.get("MODEL_SEED_DIR", "")
+VERIFY_MODE = os.environ.get("MODEL_VERIFY", "fast").lower()
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(path):
+    """프로세스 간 배타 잠금 (잠금을 얻을 때까지 대기), 대기 시간(ms)을 담은 dict를 넘겨줌"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    info = {}
+    t0 = time.perf_counter()
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        info["waited_ms"] = (time.perf_counter() - t0) * 1000
+        try:
+            yield info
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _sha256_file(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
+
+def _sidecar(path):
+    return path + ".sha256"
+
+def expected_digest(path, sha256=None):
+    """지정한 SHA-256, 없으면 이전 검증 때 기록한 값 (둘 다 없으면 None)"""
+    if sha256:
+        return sha256.lower()
+    try:
+        with open(_sidecar(path), encoding="utf-8") as f:
+            return f.read().split()[0].lower()
+    except (OSError, IndexError):
+        return None
+
+def verify_file(path, sha256=None, size=None):
+    """크기와 SHA-256 검증 (기대값을 모르면 계산해서 기록 = 최초 신뢰)"""
+    if not os.path.isfile(path):
+        return False
+    if size is not None and os.path.getsize(path) != size:
+        print(f"❌ 모델 파일 크기 불일치: {os.path.getsize(path):,} != {size:,}", file=sys.stderr)
+        return False
+    expected = expected_digest(path, sha256)
+    if VERIFY_MODE == "fast" and expected is not None and _sidecar_current(path, expected):
+        return True
+    actual = _sha256_file(path).hexdigest()
+    if expected is not None and actual != expected:
+        print(f"❌ 모델 파일 SHA-256 불일치: {actual} != {expected}", file=sys.stderr)
+        return False
+    if expected is None or not os.path.exists(_sidecar(path)):
+        _write_sidecar(path, actual)
+    return True
+
+def _sidecar_current(path, expected):
+    """기록된 해시가 기대값과 같고 파일 이후에 기록됐으면 (검증 후 파일이 바뀌지 않았으면) True"""
+    try:
+        return (expected_digest(path) == expected
+                and os.path.getmtime(_sidecar(path)) >= os.path.getmtime(path))
+    except OSError:
+        return False
+
+def _write_sidecar(path, digest):
+    # 잠금 없는 빠른 확인 경로에서 여러 워커가 동시에 기록할 수 있으므로 임시 파일은 프로세스별 이름
+    # (모두 같은 해시를 쓰므로 마지막 교체가 이겨도 결과는 같음)
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(_sidecar(path)) + ".",
+                               suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"{digest}  {os.path.basename(path)}\n")
+        os.replace(tmp, _sidecar(path))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _verify_part(part_path, sha256, size):
+    """임시 파일 검증 (이전 실행이 남긴 임시 해시 기록은 무시)"""
+    if os.path.exists(_sidecar(part_path)):
+        os.remove(_sidecar(part_path))
+    return verify_file(part_path, sha256, size)
+
+def _download(url, part_path, stats):
+    """part_path에 이어받기 다운로드, 새로 받은 바이트 수를 stats에 누적"""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    request = urllib.request.Request(url, headers={"User-Agent": "meart-model-store"})
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # 임시 파일이 이미 전체 크기 이상 - 처음부터 다시 받음
+        os.remove(part_path)
+        return _download(url, part_path, stats)
+    with response:
+        if offset and response.status == 206:
+            mode = "ab"
+            stats["resumed_from"] = offset
+            print(f"🔄 이어받기: {offset:,} bytes부터", file=sys.stderr)
+        else:
+            mode = "wb"
+            offset = 0
+        length = response.headers.get("Content-Length")
+        total = offset + int(length) if length else None
+        last_percent = -1
+        with open(part_path, mode) as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                f.write(chunk)
+                stats["bytes_fetched"] += len(chunk)
+                if total:
+                    percent = (offset + stats["bytes_fetched"]) * 100 // total
+                    if percent != last_percent:
+                        print(f"\r📥 다운로드 진행률: {percent}%", end="", flush=True, file=sys.stderr)
+                        last_percent = percent
+        if total:
+            print(file=sys.stderr)
+
+def _seed_candidates(path, seed_path):
+    if seed_path:
+        yield seed_path
+    if SEED_DIR:
+        yield os.path.join(SEED_DIR, os.path.basename(path))
+
+def ensure_model(path, urls, sha256=None, size=None, seed_path=None):
+    """
+    path에 검증된 모델 파일을 준비하고 상태 dict를 반환
+    (source: existing|seed|download|waited, bytes_fetched, resumed_from, lock_wait_ms, ready_ms)
+    urls: 순서대로 시도할 URL 목록, 모두 실패하면 RuntimeError
+    """
+    t0 = time.perf_counter()
+    urls = [urls] if isinstance(urls, str) else list(urls)
+    stats = {"path": path, "source": "existing", "bytes_fetched": 0, "resumed_from": 0}
+
+    def done():
+        stats["ready_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        print(f"✅ 모델 준비 완료 ({stats['source']}): {path} - 받은 바이트 {stats['bytes_fetched']:,}, "
+              f"준비 시간 {stats['ready_ms']:.0f}ms", file=sys.stderr)
+        return stats
+
+    # 잠금 없이 빠른 확인 (이미 기록된 해시가 있으면 해시 계산만)
+    if os.path.isfile(path) and verify_file(path, sha256, size):
+        return done()
+
+    with file_lock(path + ".lock") as lock:
+        stats["lock_wait_ms"] = round(lock["waited_ms"], 2)
+        # 잠금을 기다리는 동안 다른 프로세스가 완성했을 수 있음
+        if os.path.isfile(path) and verify_file(path, sha256, size):
+            stats["source"] = "waited"
+            return done()
+
+        part_path = path + ".part"
+        for candidate in _seed_candidates(path, seed_path):
+            if os.path.isfile(candidate):
+                print(f"📦 로컬 모델 복사: {candidate}", file=sys.stderr)
+                shutil.copyfile(candidate, part_path)
+                if _verify_part(part_path, sha256, size):
+                    os.replace(part_path, path)
+                    os.replace(_sidecar(part_path), _sidecar(path))
+                    stats["source"] = "seed"
+                    return done()
+                os.remove(part_path)
+
+        errors = []
+        for url in urls:
+            print(f"📥 모델 다운로드 시작: {url}", file=sys.stderr)
+            try:
+                _download(url, part_path, stats)
+            except Exception as e:
+                # .part는 남겨 두어 다음 URL/다음 실행에서 이어받기
+                print(f"\n❌ 모델 다운로드 실패: {e}", file=sys.stderr)
+                errors.append(f"{url}: {e}")
+                continue
+            if _verify_part(part_path, sha256, size):
+                os.replace(part_path, path)
+                os.replace(_sidecar(part_path), _sidecar(path))
+                stats["source"] = "download"
+                return done()
+            # 손상된 임시 파일은 이어받지 않고 삭제
+            os.remove(part_path)
+            if os.path.exists(_sidecar(part_path)):
+                os.remove(_sidecar(part_path))
+            errors.append(f"{url}: 검증 실패")
+        raise RuntimeError(f"모델을 준비할 수 없습니다: {path} ({'; '.join(errors)})")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("사용법: python model_store.py <url> <dest_path> [sha256] [size]")
+        sys.exit(1)
+    try:
+        result = ensure_model(
+            sys.argv[2], [sys.argv[1]],
+            sha256=sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] else None,
+            size=int(sys.argv[4]) if len(sys.argv) > 4 else None,
+        )
+        print(json.dumps(result, ensure_ascii=False))
+    except Exception as e:
+        print(f"모델 준비 중 오류: {e}", file=sys.stderr)
+        sys.exit(1)
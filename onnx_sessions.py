@@ -0,0 +1,186 @@
+# onnx_sessions.py
+"""
+ONNX Runtime 세션 생성 공용 모듈 (워커 간 가중치 공유 + 스레드 수 설정)
+워커 프로세스마다 가중치를 따로 읽으면 N개 워커가 N × 모델 크기의 메모리를 씁니다.
+ORT_SHARED_WEIGHTS=mmap(기본)이면 모델을 외부 데이터 형식(그래프 .onnx + 정렬된 .weights)으로 한 번 변환해 두고,
+ONNX Runtime이 .weights를 읽기 전용 메모리 매핑으로 올리게 합니다(가중치 선패킹 비활성화).
+같은 파일을 매핑한 워커들은 페이지 캐시를 공유하므로 PSS가 워커 수로 나뉩니다.
+
+- ORT_SHARED_WEIGHTS: mmap | off (off이거나 onnx 패키지가 없으면 기존처럼 경로에서 직접 로드)
+- ORT_SHARED_DIR: 변환한 모델 저장 위치 (기본 <임시 디렉터리>/ort_shared)
+- ORT_INTRA_OP_THREADS / ORT_INTER_OP_THREADS: 세션별 스레드 수 (0 또는 미지정 = ONNX Runtime 기본값)
+  job_server는 워커마다 CPU 수 / 워커 수로 기본값을 정해 코어 과다 구독을 막습니다.
+
+사용법: python onnx_sessions.py <model_path> [workers=1,8]   # 모드별/워커 수별 RSS·PSS JSON 출력 (Linux)
+"""
+import sys
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+
+import numpy as np
+import onnxruntime as ort
+
+try:
+    import onnx
+except ImportError:
+    onnx = None
+
+SHARED_WEIGHTS = os.environ.get("ORT_SHARED_WEIGHTS", "mmap").lower()
+SHARED_DIR = os.environ.get("ORT_SHARED_DIR", os.path.join(tempfile.gettempdir(), "ort_shared"))
+EXTERNAL_THRESHOLD = 1024  # 이보다 큰 텐서만 .weights로 분리
+
+def _env_threads(name):
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else 0
+
+def session_options(intra_op_threads=None, inter_op_threads=None, shared=False):
+    """스레드 수(인자 → 환경 변수 → ORT 기본값)와 공유 가중치용 설정을 적용한 SessionOptions"""
+    options = ort.SessionOptions()
+    intra = _env_threads("ORT_INTRA_OP_THREADS") if intra_op_threads is None else intra_op_threads
+    inter = _env_threads("ORT_INTER_OP_THREADS") if inter_op_threads is None else inter_op_threads
+    if intra:
+        options.intra_op_num_threads = intra
+    if inter:
+        options.inter_op_num_threads = inter
+    if shared:
+        # 선패킹하면 가중치가 워커별 힙으로 복사되므로 매핑된 원본을 그대로 사용
+        options.add_session_config_entry("session.disable_prepacking", "1")
+    return options
+
+def shared_model_path(model_path):
+    """
+    외부 데이터 형식으로 변환한 모델 경로 (원본 크기/수정 시각별로 한 번만 변환, 프로세스 간 잠금)
+    변환할 수 없으면 None
+    """
+    if onnx is None:
+        return None
+    stat = os.stat(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    name = f"{stem}-{stat.st_size}-{int(stat.st_mtime)}"
+    graph_path = os.path.join(SHARED_DIR, f"{name}.onnx")
+    if os.path.exists(graph_path):
+        return graph_path
+
+    from model_store import file_lock
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    with file_lock(graph_path + ".lock"):
+        if os.path.exists(graph_path):
+            return graph_path
+        t0 = time.perf_counter()
+        work_dir = tempfile.mkdtemp(prefix=f"{name}.", dir=SHARED_DIR)
+        try:
+            model = onnx.load(model_path)
+            onnx.save_model(model, os.path.join(work_dir, f"{name}.onnx"), save_as_external_data=True,
+                            all_tensors_to_one_file=True, location=f"{name}.weights",
+                            size_threshold=EXTERNAL_THRESHOLD)
+            del model
+            # 가중치를 먼저 옮겨야 그래프가 보이는 순간 참조 파일도 완성돼 있음
+            if os.path.exists(os.path.join(work_dir, f"{name}.weights")):
+                os.replace(os.path.join(work_dir, f"{name}.weights"), os.path.join(SHARED_DIR, f"{name}.weights"))
+            os.replace(os.path.join(work_dir, f"{name}.onnx"), graph_path)
+        finally:
+            for leftover in os.listdir(work_dir):
+                os.remove(os.path.join(work_dir, leftover))
+            os.rmdir(work_dir)
+        print(f"공유 가중치 모델 변환 완료: {graph_path} ({(time.perf_counter() - t0) * 1000:.0f}ms)", file=sys.stderr)
+    return graph_path
+
+def prepare_session(model_path, intra_op_threads=None, inter_op_threads=None, shared=None):
+    """
+    세션을 만들 (모델 경로, SessionOptions) - 공유 가중치 변환과 스레드 설정 적용
+    InferenceSession을 직접 만들지 않는 라이브러리(rembg 세션 등)에 넘길 때 사용
+    """
+    shared = SHARED_WEIGHTS == "mmap" if shared is None else shared
+    load_path = model_path
+    if shared:
+        try:
+            load_path = shared_model_path(model_path) or model_path
+        except Exception as e:
+            # 변환 실패는 치명적이지 않음 (원본에서 직접 로드)
+            print(f"공유 가중치 변환 실패, 원본 모델 사용: {e}", file=sys.stderr)
+        if load_path == model_path:
+            shared = False
+    return load_path, session_options(intra_op_threads, inter_op_threads, shared)
+
+def create_session(model_path, providers=None, intra_op_threads=None, inter_op_threads=None, shared=None):
+    """InferenceSession 생성 (shared=None이면 ORT_SHARED_WEIGHTS를 따름)"""
+    load_path, options = prepare_session(model_path, intra_op_threads, inter_op_threads, shared)
+    return ort.InferenceSession(load_path, options, providers=providers or ["CPUExecutionProvider"])
+
+# ---- 메모리 측정 ----
+def process_memory(pid=None):
+    """/proc/<pid>/smaps_rollup 기준 RSS/PSS/비공유 더티 (MB), Linux 외에는 None"""
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    if not os.path.exists(path):
+        return None
+    fields = {"Rss:": "rss_mb", "Pss:": "pss_mb", "Private_Dirty:": "private_dirty_mb"}
+    result = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[0] in fields:
+                result[fields[parts[0]]] = round(int(parts[1]) / 1024, 1)
+    return result
+
+def _dummy_feed(session):
+    feed = {}
+    for model_input in session.get_inputs():
+        shape = [dim if isinstance(dim, int) and dim > 0 else 1 for dim in model_input.shape]
+        dtype = np.float32 if "float" in model_input.type else np.int64
+        feed[model_input.name] = np.zeros(shape, dtype=dtype)
+    return feed
+
+def _report_worker(model_path, shared, ready, release):
+    t0 = time.perf_counter()
+    session = create_session(model_path, intra_op_threads=1, inter_op_threads=1, shared=shared)
+    load_ms = (time.perf_counter() - t0) * 1000
+    feed = _dummy_feed(session)
+    t0 = time.perf_counter()
+    session.run(None, feed)
+    run_ms = (time.perf_counter() - t0) * 1000
+    ready.put({"pid": os.getpid(), "load_ms": round(load_ms, 1), "run_ms": round(run_ms, 1)})
+    release.wait()
+
+def memory_report(model_path, workers_list=(1, 8)):
+    """모드(off/mmap)와 워커 수별로 세션을 띄워 추론 1회 후 워커별 RSS/PSS와 합계 측정"""
+    context = multiprocessing.get_context("spawn")
+    if shared_model_path(model_path) is None:
+        print("onnx 패키지가 없어 mmap 모드는 측정하지 않습니다", file=sys.stderr)
+    report = {"model": model_path, "model_mb": round(os.path.getsize(model_path) / 2**20, 1), "modes": {}}
+    for mode in ("off", "mmap"):
+        if mode == "mmap" and onnx is None:
+            continue
+        rows = []
+        for workers in workers_list:
+            ready, release = context.Queue(), context.Event()
+            procs = [context.Process(target=_report_worker, args=(model_path, mode == "mmap", ready, release))
+                     for _ in range(workers)]
+            for proc in procs:
+                proc.start()
+            infos = [ready.get() for _ in procs]
+            memory = [process_memory(info["pid"]) or {} for info in infos]
+            release.set()
+            for proc in procs:
+                proc.join()
+            rows.append({
+                "workers": workers,
+                "per_worker": {
+                    key: round(float(np.mean([m.get(key, 0) for m in memory])), 1)
+                    for key in ("rss_mb", "pss_mb", "private_dirty_mb")
+                },
+                "total_pss_mb": round(sum(m.get("pss_mb", 0) for m in memory), 1),
+                "load_ms": round(float(np.mean([i["load_ms"] for i in infos])), 1),
+                "run_ms": round(float(np.mean([i["run_ms"] for i in infos])), 1),
+            })
+        report["modes"][mode] = rows
+    return report
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("사용법: python onnx_sessions.py <model_path> [workers=1,8]")
+        sys.exit(1)
+    workers_list = tuple(int(w) for w in (sys.argv[2] if len(sys.argv) > 2 else "1,8").split(","))
+    print(json.dumps(memory_report(sys.argv[1], workers_list), ensure_ascii=False))
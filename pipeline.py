@@ -0,0 +1,139 @@
+# pipeline.py
+"""
+업로드 한 장을 한 번만 디코딩해 감정 분석 → 배경 제거 → 브러시 효과를 메모리에서 처리하는 통합 진입점
+단계마다 PNG로 저장/재로드하지 않고 최종 결과만 인코딩합니다.
+
+사용법: python pipeline.py <input_path> <output_dir> [brush|light|none] [<style_path>]
+- output_dir에 emotion.json, cutout.png, effect.png 저장
+- 마지막 줄에 디코드/인코드 vs 연산 시간 요약 JSON 출력
+"""
+import sys
+import os
+import json
+import time
+
+import numpy as np
+import cv2
+from PIL import Image
+
+import image_io
+import image_loader
+
+EFFECTS = ("brush", "light", "none")
+
+def _elapsed_ms(t0):
+    return (time.perf_counter() - t0) * 1000
+
+def analyze_emotion_array(rgb):
+    """디코딩된 RGB 배열로 감정 분석 (얼굴 검출용 흑백 변환만 수행)"""
+    import emotion_analysis
+    try:
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        return emotion_analysis.get_engine().analyze(gray)
+    except Exception as e:
+        print(f"감정 분석 중 오류 발생: {e}", file=sys.stderr)
+        return {"emotion": "neutral", "confidence": 0.0, "error": str(e)}
+
+def remove_background_image(image, alpha_matting=False, fg_threshold=120, bg_threshold=60, erode_size=1, max_side=0):
+    """메모리상의 PIL 이미지 배경 제거 (U2Net 세션은 프로세스 내에서 재사용)"""
+    import u2net_remove_bg
+    session = u2net_remove_bg.get_session()
+    if max_side > 0:
+        return u2net_remove_bg.remove_background_bounded(
+            image, max_side, alpha_matting, fg_threshold, bg_threshold, erode_size, session=session
+        )
+    return u2net_remove_bg.remove_background(
+        image.convert("RGBA"), alpha_matting, fg_threshold, bg_threshold, erode_size, session
+    )
+
+def apply_effect_image(cutout, effect, style_path=None, timings=None, seed=None):
+    """RGBA 이미지에 선택한 브러시 효과 적용"""
+    if effect == "brush":
+        import brush_effect
+        return brush_effect.brush_image(cutout, style_path, timings, seed)
+    if effect == "light":
+        import brush_effect_light
+        bgra = cv2.cvtColor(np.asarray(cutout.convert("RGBA")), cv2.COLOR_RGBA2BGRA)
+        result = brush_effect_light.artistic_effect_array(bgra, seed, stats=timings)
+        return Image.fromarray(cv2.cvtColor(result, cv2.COLOR_BGRA2RGBA), "RGBA")
+    return cutout
+
+def encode_png(image):
+    return image_io.encode_image(image, "png")
+
+def run_pipeline(data, effect="brush", style_path=None, remove_bg=True, analyze=True,
+                 alpha_matting=False, fg_threshold=120, bg_threshold=60, erode_size=1, max_side=0, seed=None):
+    """업로드 바이트를 한 번 디코딩해 전체 단계를 실행하고 인코딩된 결과와 단계별 시간을 반환 (seed: 효과 노이즈 시드)"""
+    if effect not in EFFECTS:
+        raise ValueError(f"지원하지 않는 효과입니다: {effect} (가능: {', '.join(EFFECTS)})")
+    timings = {}
+
+    t0 = time.perf_counter()
+    # 모든 단계가 이 한 장을 쓰므로 배경 제거 단계 해상도로 디코딩 (EXIF 방향 적용)
+    image = image_loader.open_image(data, image_loader.stage_max_side("remove_bg"))
+    rgb = np.asarray(image.convert("RGB"))
+    timings["decode_ms"] = _elapsed_ms(t0)
+
+    result = {"size": list(image.size)}
+    if analyze:
+        t0 = time.perf_counter()
+        result["emotion"] = analyze_emotion_array(rgb)
+        timings["emotion_ms"] = _elapsed_ms(t0)
+
+    cutout = image.convert("RGBA")
+    if remove_bg:
+        t0 = time.perf_counter()
+        cutout = remove_background_image(image, alpha_matting, fg_threshold, bg_threshold, erode_size, max_side)
+        timings["remove_bg_ms"] = _elapsed_ms(t0)
+
+    effect_image = None
+    if effect != "none":
+        t0 = time.perf_counter()
+        effect_timings = {}
+        effect_image = apply_effect_image(cutout, effect, style_path, effect_timings, seed)
+        timings["effect_ms"] = _elapsed_ms(t0)
+        result["effect_engine"] = effect_timings.get("engine", effect)
+        if "processed_ratio" in effect_timings:
+            result["processed_ratio"] = effect_timings["processed_ratio"]
+
+    t0 = time.perf_counter()
+    outputs = {"cutout": encode_png(cutout)}
+    if effect_image is not None:
+        outputs["effect"] = encode_png(effect_image)
+    timings["encode_ms"] = _elapsed_ms(t0)
+
+    io_ms = timings["decode_ms"] + timings["encode_ms"]
+    compute_ms = sum(v for k, v in timings.items() if k not in ("decode_ms", "encode_ms"))
+    timings["io_ms"] = io_ms
+    timings["compute_ms"] = compute_ms
+    result["outputs"] = outputs
+    result["timings"] = {k: round(v, 2) for k, v in timings.items()}
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("사용법: python pipeline.py <input_path> <output_dir> [brush|light|none] [<style_path>]")
+        sys.exit(1)
+    input_path, output_dir = sys.argv[1], sys.argv[2]
+    effect = sys.argv[3] if len(sys.argv) > 3 else "brush"
+    style_path = sys.argv[4] if len(sys.argv) > 4 else None
+
+    try:
+        with open(input_path, "rb") as f:
+            data = f.read()
+        result = run_pipeline(data, effect, style_path)
+        os.makedirs(output_dir, exist_ok=True)
+        written = {}
+        for name, payload in result.pop("outputs").items():
+            path = os.path.join(output_dir, f"{name}.png")
+            with open(path, "wb") as f:
+                f.write(payload)
+            written[name] = {"path": path, "bytes": len(payload)}
+        if "emotion" in result:
+            with open(os.path.join(output_dir, "emotion.json"), "w", encoding="utf-8") as f:
+                json.dump(result["emotion"], f, ensure_ascii=False)
+        result["outputs"] = written
+        print(json.dumps(result, ensure_ascii=False))
+    except Exception as e:
+        print(f"파이프라인 처리 중 오류: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,215 @@
+# result_cache.py
+"""
+이미지 파이프라인 공용 결과 캐시 (내용 주소 기반, 디스크 LRU)
+같은 사진을 다시 올렸을 때 배경 제거/감정 분석/브러시 효과 결과를 재계산하지 않고 반환합니다.
+
+- 키: sha256(단계 이름 + 매개변수(JSON) + 입력 바이트의 sha256)
+- 저장 위치: <RESULT_CACHE_DIR>/<stage>/<key 앞 2자리>/<key>.bin|.json
+- 용량 제한: RESULT_CACHE_MAX_MB를 넘으면 가장 오래 사용하지 않은 항목부터 90%까지 삭제 (mtime = 마지막 사용 시각)
+  디렉터리 전체 스캔은 처음 한 번과 제한을 넘었을 때만 하고, 그 사이에는 이 프로세스가 쓴 크기를 누적해 판단
+  (다른 프로세스가 쓴 크기는 다음 스캔 때 반영)
+- RESULT_CACHE=0이면 비활성화
+
+사용법: python result_cache.py [stats|clear]   # stats: 항목 수/디스크 사용량
+  (적중/누락 횟수는 프로세스별 - 작업 서버 {"cmd": "stats"}의 result_cache, 워커 {"cmd": "ping"} 응답의 cache 참고)
+"""
+import sys
+import os
+import json
+import shutil
+import hashlib
+
+CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join("/tmp", "meart-cache"))
+CACHE_MAX_BYTES = int(float(os.environ.get("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+CACHE_ENABLED = os.environ.get("RESULT_CACHE", "1") != "0"
+EVICT_LOW_WATER = 0.9  # 제한을 넘으면 이 비율까지 비워 다음 스캔까지 여유를 둠
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """단계별 결과 파일/JSON을 입력 해시 + 매개변수 키로 저장하는 디스크 캐시"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._total = None  # 디스크 사용량 추정치 (None이면 다음 쓰기 때 스캔)
+
+    def make_key(self, stage, source, params=None):
+        """source: 입력 파일 경로 또는 bytes"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            input_hash = sha256_bytes(bytes(source))
+        else:
+            input_hash = sha256_file(source)
+        material = json.dumps({"stage": stage, "params": params or {}, "input": input_hash}, sort_keys=True, default=str)
+        return sha256_bytes(material.encode("utf-8"))
+
+    def _path(self, stage, key, ext):
+        return os.path.join(self.root, stage, key[:2], f"{key}{ext}")
+
+    def _open(self, path, mode="rb"):
+        """
+        캐시 항목을 열어 반환 (없으면 None = 누락)
+        다른 프로세스가 확인과 읽기 사이에 삭제할 수 있으므로 존재 확인 대신 먼저 열고,
+        연 뒤에는 삭제돼도 끝까지 읽을 수 있음
+        """
+        try:
+            f = open(path, mode) if "b" in mode else open(path, mode, encoding="utf-8")
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # LRU: 마지막 사용 시각 갱신
+        except OSError:
+            pass
+        return f
+
+    def _write_atomic(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+            written = f.tell()
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._entries())
+        else:
+            self._total += written - replaced
+        if self._total > self.max_bytes:
+            self.evict()
+
+    # ---- 파일 결과 (배경 제거 PNG, 브러시 효과 이미지) ----
+    def get_file(self, stage, key, output_path):
+        """캐시 적중 시 output_path로 복사하고 True 반환"""
+        src = self._open(self._path(stage, key, ".bin"))
+        if src is None:
+            self.misses += 1
+            return False
+        with src, open(output_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        self.hits += 1
+        return True
+
+    def put_file(self, stage, key, result_path):
+        with open(result_path, "rb") as src:
+            self._write_atomic(self._path(stage, key, ".bin"), lambda f: shutil.copyfileobj(src, f))
+
+    # ---- JSON 결과 (감정 분석) ----
+    def get_json(self, stage, key):
+        f = self._open(self._path(stage, key, ".json"), "r")
+        if f is None:
+            self.misses += 1
+            return None
+        try:
+            with f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            # 손상된 항목은 누락으로 취급 (다음 저장 때 덮어씀)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put_json(self, stage, key, value):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self._write_atomic(self._path(stage, key, ".json"), lambda f: f.write(data))
+
+    # ---- 관리 ----
+    def _entries(self):
+        entries = []
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """디렉터리를 다시 스캔해 용량 제한을 넘었으면 가장 오래 사용하지 않은 항목부터 EVICT_LOW_WATER까지 삭제"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        self._total = total
+        if total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * EVICT_LOW_WATER
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total = total
+        self.evictions += removed
+        return removed
+
+    def stats(self, counters=True):
+        """
+        디스크 사용량 + (counters면) 이 프로세스의 적중/누락/삭제 횟수
+        횟수는 프로세스별로만 세므로 상주 프로세스(작업 서버 stats, 워커 ping 응답)에서만 의미가 있음
+        """
+        entries = self._entries()
+        result = {
+            "dir": self.root,
+            "entries": len(entries),
+            "bytes_on_disk": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+        if counters:
+            lookups = self.hits + self.misses
+            result.update({
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            })
+        return result
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._total = 0
+
+_cache = None
+
+def get_cache():
+    """프로세스 공용 캐시 (RESULT_CACHE=0이면 None)"""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = ResultCache()
+    if command == "clear":
+        cache.clear()
+        print(json.dumps({"cleared": cache.root}, ensure_ascii=False))
+    elif command == "stats":
+        # 새 프로세스의 적중/누락 횟수는 항상 0이므로 디스크 사용량만 출력
+        print(json.dumps(cache.stats(counters=False), ensure_ascii=False))
+    else:
+        print("사용법: python result_cache.py [stats|clear]")
+        sys.exit(1)
@@ -0,0 +1,186 @@
+# scripts/pipeline-selftest.py - 이미지 파이프라인 셀프테스트 (모델/서버 없이 실행)
+"""
+최적화 경로가 약속한 불변식을 하나씩 확인합니다.
+
+- 브러시/라이트 효과: 알파 자르기, 타일 생략, 타일 병렬 스레드 수와 관계없이 보이는 픽셀이 같음
+- seed: 같은 seed면 같은 결과, 음수 seed는 거절
+- 결과 캐시: 키가 단계/매개변수/입력에 따라 달라짐, 제한을 넘으면 오래된 항목부터 EVICT_LOW_WATER까지 삭제,
+  적중/누락/삭제 횟수
+- 작업 서버: 대기열이 가득 차면 기다리지 않고 busy + retry_after_ms로 거절
+
+사용법: python scripts/pipeline-selftest.py   (실패가 있으면 종료 코드 1)
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import contextlib
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alpha_region  # noqa: E402
+import brush_effect  # noqa: E402
+import brush_effect_light  # noqa: E402
+import texture_noise  # noqa: E402
+from result_cache import ResultCache, EVICT_LOW_WATER  # noqa: E402
+from job_server import JobServer  # noqa: E402
+
+failures = []
+
+def check(name, ok, detail=""):
+    print(f"{'✅' if ok else '❌'} {name}" + (f" ({detail})" if detail and not ok else ""))
+    if not ok:
+        failures.append(name)
+
+def quiet():
+    """효과 함수들의 진행 로그는 stderr로"""
+    return contextlib.redirect_stdout(sys.stderr)
+
+def sample_cutout(size=480):
+    """가운데 타원만 불투명한 배경 제거 결과 모양의 RGBA 이미지 (주변은 완전 투명)"""
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    yy, xx = np.mgrid[:size, :size]
+    inside = ((yy - size * 0.55) / (size * 0.3)) ** 2 + ((xx - size * 0.45) / (size * 0.2)) ** 2 <= 1
+    rgba[:, :, 3] = np.where(inside, 255, 0)
+    return rgba
+
+@contextlib.contextmanager
+def region_settings(crop=True, tile_skip=False, tile_size=alpha_region.ALPHA_TILE_SIZE):
+    saved = alpha_region.ALPHA_CROP, alpha_region.ALPHA_TILE_SKIP, alpha_region.ALPHA_TILE_SIZE, brush_effect.ALPHA_CROP
+    alpha_region.ALPHA_CROP = brush_effect.ALPHA_CROP = crop
+    alpha_region.ALPHA_TILE_SKIP = tile_skip
+    alpha_region.ALPHA_TILE_SIZE = tile_size
+    try:
+        yield
+    finally:
+        alpha_region.ALPHA_CROP, alpha_region.ALPHA_TILE_SKIP, alpha_region.ALPHA_TILE_SIZE, brush_effect.ALPHA_CROP = saved
+
+def visible_equal(a, b):
+    """알파가 같고, 알파 > 0인 픽셀의 색이 같은지 (완전히 투명한 픽셀의 RGB는 보이지 않으므로 제외)"""
+    a, b = np.asarray(a), np.asarray(b)
+    if a.shape != b.shape or not np.array_equal(a[..., 3], b[..., 3]):
+        return False, "알파 채널 다름"
+    visible = a[..., 3] > 0
+    diff = int(np.abs(a[visible][:, :3].astype(np.int16) - b[visible][:, :3]).max(initial=0))
+    return diff == 0, f"최대 오차 {diff}"
+
+# ---- 알파 자르기 / 타일 생략 / 스레드 수 ----
+def check_region_invariance(rgba):
+    image = Image.fromarray(rgba, "RGBA")
+    variants = {
+        "전체 프레임": dict(crop=False),
+        "타일 생략": dict(tile_skip=True, tile_size=64),
+        "스레드 4개": dict(tile_size=64, workers=4),
+    }
+
+    def brush(crop=True, tile_skip=False, tile_size=alpha_region.ALPHA_TILE_SIZE, workers=1):
+        with region_settings(crop, tile_skip, tile_size), quiet():
+            return brush_effect.apply_advanced_brush_effect_fused(image, seed=7, workers=workers)
+
+    def light(crop=True, tile_skip=False, tile_size=alpha_region.ALPHA_TILE_SIZE, workers=1):
+        with region_settings(crop, tile_skip, tile_size), quiet():
+            return brush_effect_light.artistic_effect_array_fused(rgba, seed=7, workers=workers)
+
+    def finish(crop=True):
+        # brush_image의 마무리 보정 (알파 자르기 시 대비는 전경 상자만 계산)
+        with region_settings(crop), quiet():
+            return brush_effect.brush_image(image, seed=7)
+
+    base = brush()
+    for name, settings in variants.items():
+        check(f"브러시 효과: 알파 자르기 결과 = {name}", *visible_equal(base, brush(**settings)))
+    base = light()
+    for name, settings in variants.items():
+        check(f"라이트 효과: 알파 자르기 결과 = {name}", *visible_equal(base, light(**settings)))
+    check("brush_image 마무리 보정: 전경 상자 대비 = 전체 프레임 대비", *visible_equal(finish(True), finish(False)))
+
+# ---- seed ----
+def check_seed(rgba):
+    image = Image.fromarray(rgba, "RGBA")
+    with quiet():
+        first = brush_effect.apply_advanced_brush_effect_fused(image, seed=123)
+        second = brush_effect.apply_advanced_brush_effect_fused(image, seed=123)
+        light_first = brush_effect_light.artistic_effect_array_fused(rgba, seed=123)
+        light_second = brush_effect_light.artistic_effect_array_fused(rgba, seed=123)
+    check("브러시 효과: 같은 seed → 같은 결과", np.array_equal(np.asarray(first), np.asarray(second)))
+    check("라이트 효과: 같은 seed → 같은 결과", np.array_equal(light_first, light_second))
+    check("같은 seed → 같은 노이즈 구간",
+          np.array_equal(texture_noise.tile_noise(5, 0, 32, 0, 32), texture_noise.tile_noise(5, 0, 32, 0, 32)))
+    try:
+        texture_noise.requested_seed(-1)
+        rejected = False
+    except ValueError:
+        rejected = True
+    check("음수 seed는 ValueError로 거절", rejected)
+
+# ---- 결과 캐시 ----
+def check_cache(root):
+    cache = ResultCache(root=os.path.join(root, "keys"))
+    key = cache.make_key("brush", b"input", {"seed": 1})
+    check("캐시 키: 같은 단계/입력/매개변수 → 같은 키", key == cache.make_key("brush", b"input", {"seed": 1}))
+    check("캐시 키: 매개변수가 다르면 다른 키", key != cache.make_key("brush", b"input", {"seed": 2}))
+    check("캐시 키: 입력이 다르면 다른 키", key != cache.make_key("brush", b"input2", {"seed": 1}))
+    check("캐시 키: 단계가 다르면 다른 키", key != cache.make_key("light", b"input", {"seed": 1}))
+
+    cache.get_json("emotion", key)
+    cache.put_json("emotion", key, {"emotion": "happy"})
+    value = cache.get_json("emotion", key)
+    check("적중/누락 횟수: 첫 조회는 누락, 저장 후 조회는 적중",
+          (cache.misses, cache.hits, value) == (1, 1, {"emotion": "happy"}), f"misses={cache.misses} hits={cache.hits}")
+
+    entry, max_bytes = 300, 1000
+    cache = ResultCache(root=os.path.join(root, "evict"), max_bytes=max_bytes)
+    base = time.time() - 100
+    keys = []
+    for i in range(4):
+        keys.append(cache.make_key("brush", bytes([i])))
+        cache.put_json("brush", keys[-1], "x" * (entry - 2))  # JSON 문자열 따옴표 포함 entry 바이트
+        path = cache._path("brush", keys[-1], ".json")
+        if os.path.exists(path):
+            os.utime(path, (base + i, base + i))  # 마지막 사용 시각을 순서대로
+    stats = cache.stats()
+    check("삭제: 제한을 넘으면 EVICT_LOW_WATER 이하로 줄임",
+          stats["bytes_on_disk"] <= max_bytes * EVICT_LOW_WATER, f"{stats['bytes_on_disk']}바이트")
+    check("삭제: 가장 오래 사용하지 않은 항목부터",
+          not os.path.exists(cache._path("brush", keys[0], ".json"))
+          and os.path.exists(cache._path("brush", keys[-1], ".json")))
+    check("삭제 횟수 기록", stats["evictions"] == 1, f"evictions={stats['evictions']}")
+
+# ---- 작업 서버 백프레셔 ----
+def check_backpressure():
+    async def run():
+        server = JobServer(workers=1, max_queue=2, preload=[])
+        server.start_pool()
+        try:
+            return await asyncio.gather(*(server.submit({"id": i, "stage": "sleep", "ms": 300}) for i in range(3)))
+        finally:
+            server.executor.shutdown(wait=True)
+
+    responses = asyncio.run(run())
+    rejected = [r for r in responses if r.get("error") == "busy"]
+    check("백프레셔: 대기열 상한을 넘는 요청만 즉시 거절",
+          len(rejected) == 1 and all(r.get("success") for r in responses if r not in rejected),
+          f"{responses}")
+    check("백프레셔: 거절 응답에 retry_after_ms",
+          bool(rejected) and isinstance(rejected[0].get("retry_after_ms"), int) and rejected[0]["retry_after_ms"] > 0)
+
+def main():
+    print("🚀 이미지 파이프라인 셀프테스트 시작")
+    rgba = sample_cutout()
+    check_region_invariance(rgba)
+    check_seed(rgba)
+    with tempfile.TemporaryDirectory(prefix="pipeline-selftest-") as root:
+        check_cache(root)
+    check_backpressure()
+    if failures:
+        print(f"❌ 셀프테스트 실패: {len(failures)}건")
+        sys.exit(1)
+    print("🎉 이미지 파이프라인 셀프테스트 완료!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# texture_noise.py
+"""
+브러시 효과용 노이즈 / 캔버스 텍스처 (np.random.Generator 기반, float32)
+전역 레거시 RNG(np.random.normal)와 전체 크기 float64 임시 배열 없이 노이즈를 만듭니다.
+
+- 노이즈는 절대 좌표 [y0:y1, x0:x1] 구간 단위로 요청하므로 타일/창마다 따로 만들어도 이어집니다.
+- NOISE_MODE=generator(기본): 128px 블록마다 (seed, 블록 행, 블록 열)로 시드한 Generator의 float32 정규 난수
+- NOISE_MODE=texture: 미리 만든 512px 주기(타일링 가능) 캔버스 텍스처를 seed로 정한 위치에서 잘라 씀 (난수 생성 없음)
+- NOISE_SEED: 정수를 지정하면 요청 seed가 없을 때 이 값 사용 (재현 가능한 출력 / 결과 캐시 적중)
+
+사용법: python texture_noise.py [<width> <height>]  # 레거시 대비 할당량/시간 비교 JSON 출력
+"""
+import sys
+import os
+import json
+import time
+import tracemalloc
+from functools import lru_cache
+
+import numpy as np
+
+NOISE_MODE = os.environ.get("NOISE_MODE", "generator").lower()
+NOISE_BLOCK = 128
+TEXTURE_SIZE = 512
+TEXTURE_SEED = 20240715  # 캔버스 텍스처는 고정 (seed는 자르는 위치만 결정)
+
+def new_seed():
+    """요청마다 새 노이즈 시드"""
+    return int(np.random.SeedSequence().entropy % (1 << 63))
+
+def _check_seed(value, source):
+    try:
+        seed = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{source}는 0 이상의 정수여야 합니다: {value!r}") from None
+    if seed < 0:
+        # np.random.default_rng는 음수 시드를 거부하므로 효과 계산 도중이 아니라 입력 단계에서 거절
+        raise ValueError(f"{source}는 0 이상의 정수여야 합니다: {value!r}")
+    return seed
+
+def requested_seed(seed=None):
+    """
+    호출자가 지정한 seed, 없으면 NOISE_SEED 환경 변수 (둘 다 없으면 None = 매번 새 노이즈)
+    음수/정수가 아닌 값은 ValueError
+    """
+    if seed is not None:
+        return _check_seed(seed, "seed")
+    env_seed = os.environ.get("NOISE_SEED")
+    return _check_seed(env_seed, "NOISE_SEED") if env_seed not in (None, "") else None
+
+def resolve_seed(seed=None):
+    """실제로 사용할 seed (지정값 → NOISE_SEED → 새 시드)"""
+    seed = requested_seed(seed)
+    return new_seed() if seed is None else seed
+
+def block_noise(seed, y0, y1, x0, x1, channels=None, scale=1.0, dtype=np.float32, block=NOISE_BLOCK):
+    """
+    절대 좌표 구간의 정규 노이즈 (표준편차 scale, dtype으로 바로 기록 - 정수형이면 0 방향 절사)
+    block×block 블록마다 (seed, by, bx)로 시드한 Generator를 쓰므로 어느 창에서 계산해도 같은 값
+    """
+    tail = () if channels is None else (channels,)
+    out = np.empty((y1 - y0, x1 - x0) + tail, dtype=dtype)
+    for by in range(y0 // block, (y1 - 1) // block + 1):
+        for bx in range(x0 // block, (x1 - 1) // block + 1):
+            blk = np.random.default_rng((seed, by, bx)).standard_normal((block, block) + tail, dtype=np.float32)
+            if scale != 1.0:
+                blk *= scale
+            sy0, sy1 = max(y0, by * block), min(y1, (by + 1) * block)
+            sx0, sx1 = max(x0, bx * block), min(x1, (bx + 1) * block)
+            out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = blk[sy0 - by * block:sy1 - by * block,
+                                                            sx0 - bx * block:sx1 - bx * block]
+    return out
+
+@lru_cache(maxsize=8)
+def canvas_texture(channels=None, scale=1.0, dtype=np.float32):
+    """TEXTURE_SIZE 주기로 타일링되는 정규 텍스처 (형식별로 프로세스당 한 번 생성, 읽기 전용)"""
+    tail = () if channels is None else (channels,)
+    texture = np.random.default_rng(TEXTURE_SEED).standard_normal((TEXTURE_SIZE, TEXTURE_SIZE) + tail, dtype=np.float32)
+    texture *= scale
+    texture = texture.astype(dtype, copy=False)
+    texture.flags.writeable = False
+    return texture
+
+def texture_noise(seed, y0, y1, x0, x1, channels=None, scale=1.0, dtype=np.float32):
+    """캔버스 텍스처를 seed로 정한 오프셋에서 주기적으로 잘라낸 노이즈 (임시 배열 없이 dtype으로 바로 생성)"""
+    texture = canvas_texture(channels, float(scale), np.dtype(dtype))
+    oy, ox = divmod(seed % (TEXTURE_SIZE * TEXTURE_SIZE), TEXTURE_SIZE)
+    rows = (np.arange(y0, y1) + oy) % TEXTURE_SIZE
+    cols = (np.arange(x0, x1) + ox) % TEXTURE_SIZE
+    return texture[rows[:, None], cols[None, :]]
+
+def tile_noise(seed, y0, y1, x0, x1, channels=None, scale=1.0, dtype=np.float32):
+    """NOISE_MODE에 따른 절대 좌표 구간 노이즈 (호출자가 수정해도 되는 새 배열)"""
+    if NOISE_MODE == "texture":
+        return texture_noise(seed, y0, y1, x0, x1, channels, scale, dtype)
+    return block_noise(seed, y0, y1, x0, x1, channels, scale, dtype)
+
+def _measure(fn, repeat):
+    """최선 실행 시간(ms)과 한 번 실행 시 할당 총량/최대치(MB) (NumPy 할당은 tracemalloc에 잡힘)"""
+    fn()  # 텍스처 생성 등 1회성 비용 제외
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": round(best * 1000, 2), "peak_alloc_mb": round(peak / 2**20, 2)}
+
+def benchmark_noise(width=1438, height=1000, repeat=5):
+    """레거시(np.random.normal float64) 방식과 Generator/텍스처 방식의 노이즈 생성 비용 비교"""
+    shape = (height, width)
+
+    # brush_effect (PIL 엔진) 기존 방식: 전역 RNG float64 노이즈 + 클리핑 임시 배열
+    def legacy_brush():
+        noise_pattern = np.random.normal(0, 0.4, shape)
+        return np.clip(noise_pattern, -1, 1)
+
+    # brush_effect_light 기존 방식: 전역 RNG float64 3채널 노이즈 → int16 변환
+    def legacy_light():
+        return np.random.normal(0, 3, shape + (3,)).astype(np.int16)
+
+    def modern_brush(mode):
+        def run():
+            noise = (texture_noise if mode == "texture" else block_noise)(1, 0, height, 0, width, scale=0.4)
+            return np.clip(noise, -1, 1, out=noise)
+        return run
+
+    def modern_light(mode):
+        def run():
+            return (texture_noise if mode == "texture" else block_noise)(
+                1, 0, height, 0, width, channels=3, scale=3, dtype=np.int16
+            )
+        return run
+
+    return {
+        "size": [width, height],
+        "brush": {
+            "legacy": _measure(legacy_brush, repeat),
+            "generator": _measure(modern_brush("generator"), repeat),
+            "texture": _measure(modern_brush("texture"), repeat),
+        },
+        "light": {
+            "legacy": _measure(legacy_light, repeat),
+            "generator": _measure(modern_light("generator"), repeat),
+            "texture": _measure(modern_light("texture"), repeat),
+        },
+    }
+
+if __name__ == "__main__":
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 1438
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    print(json.dumps(benchmark_noise(width, height), ensure_ascii=False))
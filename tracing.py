@@ -0,0 +1,244 @@
+# tracing.py
+"""
+단계별 구조화 타이밍(span) + 요청 단위 프로파일링
+print 진행 로그 대신 모델 로드/디코드/검출/추론/필터/인코드 구간을 이름 붙은 span으로 재고
+JSON Lines로 내보냅니다. 꺼져 있으면 span()은 공유 no-op 객체를 돌려주므로 비용이 거의 없습니다.
+
+- TRACE_SPANS: 비어 있으면 끔(기본) / stderr / 파일 경로(JSON Lines로 추가 기록, 여러 프로세스가 같이 써도 됨)
+- TRACE_PROFILE: 요청마다 켤 프로파일러 (cprofile, tracemalloc 쉼표 구분) - request(profile=True)로 요청별 opt-in도 가능
+- TRACE_PROFILE_DIR: 프로파일 저장 위치 (기본 /tmp/meart-profiles, <요청 id>-<이름>.prof / .alloc.json)
+
+기록 형식 (한 줄에 하나):
+  {"type": "span", "name": "decode", "ms": 12.3, "request": "...", "parent": "remove_bg", "pid": 1, ...속성}
+  {"type": "request", "name": "remove_bg", "ms": 812.0, "spans": {"decode": 12.3, "infer": 790.1, ...}, ...}
+
+span(name, timings)처럼 timings dict를 넘기면 추적이 꺼져 있어도 timings["<name>_ms"]에 시간을 기록합니다
+(기존 단계별 timings 출력과 같은 키, key=로 키 이름 지정 가능).
+
+사용법: python tracing.py   # 꺼짐/켜짐 상태의 span 1회당 오버헤드(µs) 측정
+"""
+import sys
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+
+TRACE_TARGET = os.environ.get("TRACE_SPANS", "").strip()
+PROFILE = frozenset(filter(None, os.environ.get("TRACE_PROFILE", "").lower().replace(" ", "").split(",")))
+PROFILE_DIR = os.environ.get("TRACE_PROFILE_DIR", os.path.join("/tmp", "meart-profiles"))
+PROFILERS = ("cprofile", "tracemalloc")
+
+ENABLED = bool(TRACE_TARGET)
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_write_lock = threading.Lock()
+_stream = None
+
+def configure(target):
+    """실행 중 추적 대상 변경 (None/빈 문자열이면 끔)"""
+    global TRACE_TARGET, ENABLED, _stream
+    with _write_lock:
+        if _stream is not None and _stream is not sys.stderr:
+            _stream.close()
+        _stream = None
+        TRACE_TARGET = (target or "").strip()
+        ENABLED = bool(TRACE_TARGET)
+
+def emit(record):
+    """JSON 한 줄 기록 (stderr 또는 추가 모드 파일 - 한 줄 단위 쓰기라 프로세스 간에도 섞이지 않음)"""
+    global _stream
+    if not ENABLED:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _write_lock:
+        if _stream is None:
+            if TRACE_TARGET == "stderr":
+                _stream = sys.stderr
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(TRACE_TARGET)), exist_ok=True)
+                _stream = open(TRACE_TARGET, "a", encoding="utf-8", buffering=1)
+        _stream.write(line)
+        _stream.flush()
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NOOP = _NoopSpan()
+
+class Span:
+    """이름 붙은 구간 (with 문으로 사용, set()으로 속성 추가)"""
+    __slots__ = ("name", "timings", "key", "attrs", "parent", "root", "request_id", "totals",
+                 "t0", "c0", "token", "profilers", "profile_state")
+
+    def __init__(self, name, timings=None, key=None, attrs=None, request=False, profile=None):
+        self.name = name
+        self.timings = timings
+        self.key = key
+        self.attrs = attrs or {}
+        self.parent = None
+        self.root = None
+        self.request_id = uuid.uuid4().hex[:12] if request else None
+        self.totals = {} if request else None
+        self.token = None
+        self.profilers = profile or ()
+        self.profile_state = {}
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if ENABLED:
+            self.parent = _current.get()
+            if self.request_id is None:
+                self.root = self.parent.root if self.parent is not None else None
+                self.request_id = self.root.request_id if self.root is not None else uuid.uuid4().hex[:12]
+            else:
+                self.root = self
+            self.token = _current.set(self)
+        if self.profilers:
+            self._start_profilers()
+        self.c0 = time.process_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self.t0) * 1000
+        cpu_ms = (time.process_time() - self.c0) * 1000
+        if self.timings is not None:
+            self.timings[self.key or f"{self.name}_ms"] = ms
+        profile_files = self._stop_profilers() if self.profilers else None
+        if self.token is not None:
+            _current.reset(self.token)
+            record = {
+                "type": "request" if self.totals is not None else "span",
+                "name": self.name,
+                "ms": round(ms, 3),
+                "cpu_ms": round(cpu_ms, 3),
+                "request": self.request_id,
+                "parent": self.parent.name if self.parent is not None else None,
+                "pid": os.getpid(),
+                "ts": round(time.time(), 3),
+            }
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            if self.totals is not None:
+                record["spans"] = {k: round(v, 3) for k, v in self.totals.items()}
+            elif self.root is not None:
+                self.root.totals[self.name] = self.root.totals.get(self.name, 0.0) + ms
+            if profile_files:
+                record["profile"] = profile_files
+            record.update(self.attrs)
+            emit(record)
+        elif profile_files:
+            print(f"프로파일 저장: {profile_files}", file=sys.stderr)
+        return False
+
+    # ---- 요청 단위 프로파일링 ----
+    def _start_profilers(self):
+        state = self.profile_state
+        if "tracemalloc" in self.profilers:
+            import tracemalloc
+            state["tracemalloc_owner"] = not tracemalloc.is_tracing()
+            if state["tracemalloc_owner"]:
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+        if "cprofile" in self.profilers:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                state["cprofile"] = profiler
+            except ValueError:
+                # 다른 프로파일러가 이미 동작 중 (중첩 요청)
+                pass
+
+    def _stop_profilers(self):
+        state = self.profile_state
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        request_id = self.request_id or uuid.uuid4().hex[:12]
+        base = os.path.join(PROFILE_DIR, f"{request_id}-{self.name}")
+        files = {}
+        profiler = state.get("cprofile")
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+            files["cprofile"] = base + ".prof"
+        if "tracemalloc" in self.profilers:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                _current_bytes, peak = tracemalloc.get_traced_memory()
+                top = tracemalloc.take_snapshot().statistics("lineno")[:20]
+                if state.get("tracemalloc_owner"):
+                    tracemalloc.stop()
+                with open(base + ".alloc.json", "w", encoding="utf-8") as f:
+                    json.dump({
+                        "peak_mb": round(peak / 2**20, 3),
+                        "top": [{"where": str(stat.traceback), "size_kb": round(stat.size / 1024, 1),
+                                 "count": stat.count} for stat in top],
+                    }, f, ensure_ascii=False, indent=1)
+                files["tracemalloc"] = base + ".alloc.json"
+        return files
+
+def span(name, timings=None, key=None, **attrs):
+    """구간 측정 - 추적이 꺼져 있고 timings도 없으면 no-op"""
+    if not ENABLED and timings is None:
+        return NOOP
+    return Span(name, timings, key, attrs)
+
+def _profilers(profile):
+    if profile is None:
+        return PROFILE
+    if profile is True:
+        return frozenset(PROFILERS)
+    if not profile:
+        return frozenset()
+    if isinstance(profile, str):
+        profile = profile.split(",")
+    return frozenset(p for p in profile if p in PROFILERS)
+
+def request(name, timings=None, profile=None, **attrs):
+    """
+    요청 하나의 최상위 span (하위 span 합계를 함께 기록)
+    profile: None이면 TRACE_PROFILE, True면 cprofile+tracemalloc, 문자열/목록이면 지정한 것만
+    """
+    profilers = _profilers(profile)
+    if not ENABLED and timings is None and not profilers:
+        return NOOP
+    return Span(name, timings, None, attrs, request=True, profile=profilers)
+
+def benchmark_overhead(n=200000):
+    """span 1회당 오버헤드(µs): 꺼짐 / timings만 / 켜짐(/dev/null로 기록)"""
+    previous = TRACE_TARGET
+
+    def loop(make):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            with make():
+                pass
+        return round((time.perf_counter() - t0) / n * 1e6, 3)
+
+    configure(None)
+    disabled = loop(lambda: span("x"))
+    timings = {}
+    timings_only = loop(lambda: span("x", timings))
+    configure(os.devnull)
+    try:
+        with request("bench"):
+            enabled = loop(lambda: span("x"))
+    finally:
+        configure(previous)
+    return {"spans": n, "disabled_us": disabled, "timings_only_us": timings_only, "enabled_us": enabled}
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_overhead(), ensure_ascii=False))
@@ -3,9 +3,6 @@ import sys
 import os
 import traceback
 import time
-import urllib.request
-import hashlib
-import ssl
 
 # 필요한 패키지 임포트
 from rembg import remove
@@ -13,85 +10,46 @@ from PIL import Image
 import numpy as np
 import cv2
 
+from result_cache import get_cache
+import model_store
+import image_io
+import image_loader
+import onnx_sessions
+import model_precision
+from tracing import span, request
+
 # U2Net 모델 경로 및 크기 설정
 MODEL_DIR = os.environ.get("MODEL_DIR", "/tmp/u2net")
 MODEL_PATH = os.path.join(MODEL_DIR, "u2net.onnx")
 EXPECTED_SIZE = 176671241  # 바이트 단위, u2net.onnx의 정확한 크기
+MODEL_VERSION = f"u2net-{EXPECTED_SIZE}"  # 결과 캐시 키에 포함 (모델이 바뀌면 캐시 무효화)
+
+MODEL_URLS = (
+    "https://github.com/danielgatis/rembg/releases/download/v0.0.0/u2net.onnx",
+    "https://huggingface.co/danielgatis/rembg/resolve/main/u2net.onnx",  # 대체 URL
+)
+# 기대 SHA-256 (지정하지 않으면 첫 다운로드 때 계산한 값을 u2net.onnx.sha256에 기록해 이후 검증에 사용)
+MODEL_SHA256 = os.environ.get("U2NET_SHA256") or None
 
 def download_model():
-    """U2Net 모델을 자동으로 다운로드합니다."""
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    url = "https://github.com/danielgatis/rembg/releases/download/v0.0.0/u2net.onnx"
-    print(f"📥 U2Net 모델 다운로드 시작: {url}")
-    
-    # SSL 컨텍스트 설정 (Render 환경에서 필요할 수 있음)
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    
-    try:
-        # 다운로드 진행률 표시를 위한 콜백
-        def show_progress(block_num, block_size, total_size):
-            if total_size > 0:
-                percent = min(100, (block_num * block_size * 100) // total_size)
-                print(f"\r📥 다운로드 진행률: {percent}%", end='', flush=True)
-        
-        print("🔄 모델 다운로드 중...")
-        urllib.request.urlretrieve(url, MODEL_PATH, show_progress)
-        print("\n✅ 모델 다운로드 완료")
-        
-    except Exception as e:
-        print(f"\n❌ 모델 다운로드 실패: {e}")
-        # 대체 URL 시도
-        try:
-            print("🔄 대체 URL로 재시도 중...")
-            alt_url = "https://huggingface.co/danielgatis/rembg/resolve/main/u2net.onnx"
-            urllib.request.urlretrieve(alt_url, MODEL_PATH, show_progress)
-            print("\n✅ 대체 URL로 모델 다운로드 완료")
-        except Exception as e2:
-            print(f"\n❌ 대체 URL 다운로드도 실패: {e2}")
-            raise RuntimeError("U2Net 모델을 다운로드할 수 없습니다.")
+    """U2Net 모델을 임시 파일로 받아(이어받기) 검증 후 원자적으로 교체합니다 (동시 실행 시 한 프로세스만 다운로드)."""
+    return model_store.ensure_model(MODEL_PATH, MODEL_URLS, MODEL_SHA256, EXPECTED_SIZE)
 
 def verify_model():
-    """모델 파일의 존재 여부와 크기를 검증합니다."""
+    """모델 파일의 존재 여부, 정확한 크기, SHA-256을 검증합니다."""
     if not os.path.exists(MODEL_PATH):
         print(f"⚠️ 모델 파일이 존재하지 않습니다: {MODEL_PATH}")
         return False
-    
-    actual_size = os.path.getsize(MODEL_PATH)
-    print(f"📊 모델 파일 크기: {actual_size:,} bytes (예상: {EXPECTED_SIZE:,} bytes)")
-    
-    # 크기 검증 (더 관대한 여유 허용)
-    size_tolerance = 1000000  # 1MB 여유
-    if abs(actual_size - EXPECTED_SIZE) <= size_tolerance:
-        print("✅ 모델 파일 크기 검증 통과")
-        return True
-    else:
-        print(f"❌ 모델 파일 크기 불일치: {actual_size:,} != {EXPECTED_SIZE:,}")
-        return False
+    return model_store.verify_file(MODEL_PATH, MODEL_SHA256, EXPECTED_SIZE)
 
 def setup_u2net_model():
     """U2Net 모델을 설정하고 필요시 다운로드합니다."""
     try:
         print(f"🔍 U2Net 모델 확인 중: {MODEL_PATH}")
-        
-        # 모델 검증
-        if verify_model():
-            print(f"✅ U2Net 모델 준비 완료: {MODEL_PATH}")
-            return MODEL_PATH
-        
-        # 모델이 없거나 크기가 다르면 다운로드
-        print("🔄 모델 다운로드 필요")
-        download_model()
-        
-        # 다운로드 후 재검증
-        if verify_model():
-            print(f"✅ U2Net 모델 설정 완료: {MODEL_PATH}")
-            return MODEL_PATH
-        else:
-            print("❌ 모델 다운로드 후 검증 실패")
-            return None
-            
+        status = download_model()
+        print(f"📊 모델 준비: {status['source']}, 받은 바이트 {status['bytes_fetched']:,}, "
+              f"준비 시간 {status['ready_ms']:.0f}ms")
+        return MODEL_PATH
     except Exception as e:
         print(f"❌ U2Net 모델 설정 오류: {e}")
         traceback.print_exc()
@@ -107,7 +65,112 @@ else:
 
 print("=== PYTHON SCRIPT START ===", sys.argv)
 
-def process_image(input_path, output_path, alpha_matting=False, fg_threshold=160, bg_threshold=40, erode_size=1):
+def normalize_params(alpha_matting=False, fg_threshold=120, bg_threshold=60, erode_size=1):
+    """CLI/워커 공통 매개변수 정규화 (옷 부분 투명화 방지를 위한 보수적 범위 제한)"""
+    if isinstance(alpha_matting, str):
+        alpha_matting = alpha_matting.lower() == 'true'
+    fg_threshold = max(80, min(200, int(fg_threshold)))  # 80-200 범위로 제한
+    bg_threshold = max(20, min(100, int(bg_threshold)))  # 20-100 범위로 제한
+    erode_size = max(1, min(5, int(erode_size)))         # 1-5 범위로 제한
+    return bool(alpha_matting), fg_threshold, bg_threshold, erode_size
+
+def cache_lookup(input_path, output_path, params, timings):
+    """결과 캐시 조회: 적중하면 output_path에 결과를 복사하고 (None, True), 아니면 (key, False)"""
+    cache = get_cache()
+    if cache is None:
+        return None, False
+    key = cache.make_key("remove_bg", input_path,
+                         dict(params, model=MODEL_VERSION, decode=image_loader.cache_tag("remove_bg"),
+                              precision=model_precision.stage_precision("remove_bg")))
+    if cache.get_file("remove_bg", key, output_path):
+        timings["cache"] = "hit"
+        print(f"결과 캐시 적중: {output_path}")
+        return None, True
+    timings["cache"] = "miss"
+    return key, False
+
+def cache_store(key, output_path):
+    if key is not None:
+        get_cache().put_file("remove_bg", key, output_path)
+
+_session = None
+
+def get_session():
+    """U2Net rembg 세션을 한 번만 생성해 재사용합니다 (워커/파이프라인용)."""
+    global _session
+    if _session is None:
+        from rembg import new_session
+        with span("model_load", model="u2net"):
+            if MODEL_PATH and os.path.exists(MODEL_PATH):
+                # rembg는 U2NET_HOME 디렉터리에서 u2net.onnx를 찾음
+                os.environ.setdefault("U2NET_HOME", os.path.dirname(MODEL_PATH))
+                _session = shared_rembg_session()
+            if _session is None:
+                _session = new_session("u2net")
+    return _session
+
+def shared_rembg_session():
+    """
+    공유 가중치(onnx_sessions) 모델과 스레드 설정으로 만든 rembg U2Net 세션
+    rembg 세션 생성자(BaseSession.__init__)를 그대로 거치고, 모델 위치만 download_models에서 바꿔
+    다운로드 없이 준비된 경로를 로드하게 함
+    MODEL_PRECISION의 remove_bg 정밀도(fp32/opt/int8) 모델을 사용 (model_precision.py 참고)
+    """
+    try:
+        from rembg.sessions.u2net import U2netSession
+
+        class SharedU2netSession(U2netSession):
+            @classmethod
+            def download_models(cls, *args, **kwargs):
+                return kwargs["model_path"]
+
+        load_path, options = onnx_sessions.prepare_session(model_precision.resolve_model(MODEL_PATH, "remove_bg"))
+        return SharedU2netSession("u2net", options, providers=["CPUExecutionProvider"], model_path=load_path)
+    except Exception as e:
+        print(f"공유 가중치 세션 생성 실패, rembg 기본 세션 사용: {e}")
+        return None
+
+def remove_background(input_image, alpha_matting=False, fg_threshold=120, bg_threshold=60, erode_size=1, session=None):
+    """메모리상의 PIL 이미지에서 배경을 제거해 RGBA 이미지를 반환합니다."""
+    if session is not None:
+        # 워커 모드: 이미 로드된 세션 재사용 (모델 초기화 비용 없음)
+        return remove(
+            input_image,
+            session=session,
+            alpha_matting=alpha_matting,
+            fg_threshold=fg_threshold,
+            bg_threshold=bg_threshold,
+            erode_structure_size=erode_size
+        )
+    # 모델 경로가 설정된 경우 사용
+    if MODEL_PATH and os.path.exists(MODEL_PATH):
+        print(f"🎯 사용자 정의 모델 사용: {MODEL_PATH}")
+        return remove(
+            input_image,
+            model_path=MODEL_PATH,
+            alpha_matting=alpha_matting,
+            fg_threshold=fg_threshold,
+            bg_threshold=bg_threshold,
+            erode_structure_size=erode_size
+        )
+    print("🔧 기본 rembg 모델 사용")
+    return remove(
+        input_image,
+        alpha_matting=alpha_matting,
+        fg_threshold=fg_threshold,
+        bg_threshold=bg_threshold,
+        erode_structure_size=erode_size
+    )
+
+def process_image(input_path, output_path, alpha_matting=False, fg_threshold=160, bg_threshold=40, erode_size=1,
+                  session=None, timings=None):
+    """배경을 제거해 PNG로 저장합니다.
+
+    session: 미리 생성한 rembg 세션 (워커 모드에서 재사용, 없으면 매 호출마다 생성)
+    timings: dict를 넘기면 단계별 소요 시간(ms)을 기록
+    """
+    if timings is None:
+        timings = {}
     try:
         print(f"입력 파일 경로: {input_path}")
         print(f"출력 파일 경로: {output_path}")
@@ -117,15 +180,23 @@ def process_image(input_path, output_path, alpha_matting=False, fg_threshold=160
         if not os.path.exists(input_path):
             print(f"입력 파일이 존재하지 않습니다: {input_path}")
             return False
+
+        cache_key, cached = cache_lookup(input_path, output_path, {
+            "alpha_matting": alpha_matting, "fg_threshold": fg_threshold,
+            "bg_threshold": bg_threshold, "erode_size": erode_size,
+        }, timings)
+        if cached:
+            return True
             
         # 입력 이미지 로드 (단순화)
         print("이미지 로드 중...")
-        try:
-            input_image = Image.open(input_path)
-            input_image = input_image.convert("RGBA")
-        except Exception as e:
-            print(f"이미지 로드 실패: {e}", file=sys.stderr)
-            sys.exit(1)
+        with span("decode", timings, key="load_ms"):
+            try:
+                # EXIF 방향 적용 (DECODE_MAX_SIDE의 remove_bg 설정이 있으면 그 크기로 축소 디코딩)
+                input_image = image_loader.load_for_stage("remove_bg", input_path, "RGBA")
+            except Exception as e:
+                print(f"이미지 로드 실패: {e}", file=sys.stderr)
+                sys.exit(1)
         print(f"이미지 크기: {input_image.size}, 모드: {input_image.mode}")
         
         # rembg 모듈 확인
@@ -136,49 +207,25 @@ def process_image(input_path, output_path, alpha_matting=False, fg_threshold=160
             return False
         
         # 배경 제거 (옷 부분 보존을 위한 보수적 설정)
-        # 모델 경로가 설정된 경우 사용
-        if MODEL_PATH and os.path.exists(MODEL_PATH):
-            print(f"🎯 사용자 정의 모델 사용: {MODEL_PATH}")
-            output_image = remove(
-                input_image,
-                model_path=MODEL_PATH,
-                alpha_matting=alpha_matting,
-                fg_threshold=fg_threshold,
-                bg_threshold=bg_threshold,
-                erode_structure_size=erode_size
-            )
-        else:
-            print("🔧 기본 rembg 모델 사용")
-            output_image = remove(
-                input_image,
-                alpha_matting=alpha_matting,
-                fg_threshold=fg_threshold,
-                bg_threshold=bg_threshold,
-                erode_structure_size=erode_size
-            )
+        with span("infer", timings, key="remove_ms", size=list(input_image.size)):
+            output_image = remove_background(input_image, alpha_matting, fg_threshold, bg_threshold, erode_size, session)
         print(f"배경 제거 완료. 결과 이미지 크기: {output_image.size}")
         
         # rembg 결과 사용 (회전 보정 제거 - rembg가 자동 처리)
         result_image = output_image
         print("엣지 회색라인 제거 및 부드러운 경계 처리 완료.")
         print("결과 저장 중...")
-        result_image.save(output_path, 'PNG')
-        abs_path = os.path.abspath(output_path)
-        exists = os.path.exists(output_path)
-        size = os.path.getsize(output_path) if exists else 0
-        print(f"[DEBUG] output_path 절대경로: {abs_path}")
-        print(f"[DEBUG] 파일 존재 여부: {exists}")
-        print(f"[DEBUG] 파일 크기: {size} bytes")
-        if not exists or size == 0:
-            print(f"파일 저장 실패: {abs_path}", file=sys.stderr)
-            sys.exit(1)
-        # 실제로 이미지로 열리는지 체크
-        try:
-            with Image.open(output_path) as im:
-                im.verify()
-        except Exception as e:
-            print(f"저장된 파일이 이미지가 아님: {e}", file=sys.stderr)
-            sys.exit(1)
+        with span("encode", timings, key="save_ms") as encode_span:
+            # 메모리에서 한 번 인코딩 → 헤더/청크 구조 확인 → 원자적 저장 (다시 열어 verify()하지 않음)
+            abs_path = os.path.abspath(output_path)
+            try:
+                info = image_io.write_image(result_image, output_path)
+            except (OSError, ValueError) as e:
+                print(f"파일 저장 실패: {abs_path} ({e})", file=sys.stderr)
+                sys.exit(1)
+            encode_span.set(output=abs_path, **info)
+        timings["output_bytes"] = info["bytes"]
+        cache_store(cache_key, output_path)
         print(f"결과 저장 완료: {output_path}")
         
         return True
@@ -188,9 +235,156 @@ def process_image(input_path, output_path, alpha_matting=False, fg_threshold=160
         traceback.print_exc(file=sys.stderr)
         return False
 
+# ---- 제한 해상도 배경 제거 (대형 업로드용) ----
+# U2Net 마스크는 축소본에서 계산하고, 알파는 원본을 가이드로 업샘플링하며,
+# 알파 매팅은 경계 주변 trimap 띠가 걸친 타일에서만 실행합니다.
+DEFAULT_MAX_SIDE = int(os.environ.get("U2NET_MAX_SIDE", "0"))  # 0이면 기존 전체 해상도 경로
+MATTING_TILE = 256
+MATTING_MARGIN = 16
+
+def guided_filter(guide, src, radius, eps=1e-3):
+    """박스 필터 기반 guided filter (He et al.) - 원본 밝기를 가이드로 알파 경계를 정렬"""
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean = lambda x: cv2.boxFilter(x, cv2.CV_32F, ksize)
+    mean_i = mean(guide)
+    mean_p = mean(src)
+    cov_ip = mean(guide * src) - mean_i * mean_p
+    var_i = mean(guide * guide) - mean_i * mean_i
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    return mean(a) * guide + mean(b)
+
+def build_trimap(alpha, fg_threshold, bg_threshold, erode_size):
+    """rembg alpha_matting_cutout과 같은 규칙의 trimap (1=전경, 0=배경, 0.5=경계)"""
+    kernel = np.ones((erode_size, erode_size), np.uint8)
+    is_fg = cv2.erode((alpha > fg_threshold).astype(np.uint8), kernel) > 0
+    is_bg = cv2.erode((alpha < bg_threshold).astype(np.uint8), kernel) > 0
+    trimap = np.full(alpha.shape, 0.5, dtype=np.float64)
+    trimap[is_fg] = 1.0
+    trimap[is_bg] = 0.0
+    return trimap
+
+def matte_band(rgb, alpha, trimap, timings):
+    """경계 띠가 포함된 타일에서만 closed-form 매팅 실행 (비용 ∝ 윤곽 길이)"""
+    from pymatting import estimate_alpha_cf, estimate_foreground_ml
+
+    h, w = trimap.shape
+    unknown = trimap == 0.5
+    alpha = alpha.astype(np.float32) / 255.0
+    out_rgb = rgb.copy()
+    tiles = matted_pixels = 0
+    for ty in range(0, h, MATTING_TILE):
+        for tx in range(0, w, MATTING_TILE):
+            core = unknown[ty:ty + MATTING_TILE, tx:tx + MATTING_TILE]
+            if not core.any():
+                continue
+            y0, x0 = max(0, ty - MATTING_MARGIN), max(0, tx - MATTING_MARGIN)
+            y1, x1 = min(h, ty + MATTING_TILE + MATTING_MARGIN), min(w, tx + MATTING_TILE + MATTING_MARGIN)
+            tri = trimap[y0:y1, x0:x1]
+            if not (tri == 1.0).any() or not (tri == 0.0).any():
+                # 전경/배경 단서가 없는 타일은 업샘플링된 알파를 그대로 사용
+                continue
+            img = rgb[y0:y1, x0:x1].astype(np.float64) / 255.0
+            tile_alpha = estimate_alpha_cf(img, tri)
+            tile_fg = estimate_foreground_ml(img, tile_alpha)
+            cy, cx = ty - y0, tx - x0
+            ch, cw = core.shape
+            sel = core
+            alpha[ty:ty + ch, tx:tx + cw][sel] = tile_alpha[cy:cy + ch, cx:cx + cw][sel]
+            fg = np.clip(tile_fg[cy:cy + ch, cx:cx + cw] * 255, 0, 255).astype(np.uint8)
+            out_rgb[ty:ty + ch, tx:tx + cw][sel] = fg[sel]
+            tiles += 1
+            matted_pixels += int(sel.sum())
+    timings["matting_tiles"] = tiles
+    timings["matting_pixels"] = matted_pixels
+    return out_rgb, np.clip(alpha * 255, 0, 255).astype(np.uint8)
+
+def peak_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB 단위
+    except ImportError:
+        return None
+
+def remove_background_bounded(input_image, max_side, alpha_matting=False, fg_threshold=120, bg_threshold=60,
+                              erode_size=1, session=None, timings=None):
+    """축소본에서 U2Net 마스크 계산 → 가이드 업샘플링 → 경계 띠만 매팅한 RGBA 이미지 반환"""
+    if timings is None:
+        timings = {}
+    rgb = np.array(input_image.convert("RGB"))
+    h, w = rgb.shape[:2]
+    scale = min(1.0, max_side / max(h, w)) if max_side else 1.0
+
+    # CLI 경로에서도 호출마다 새 세션을 만들지 않도록 모듈 공용 세션 사용 (로드 시간은 model_load span)
+    session = session or get_session()
+    with span("infer", timings, key="mask_ms") as infer_span:
+        work = input_image.convert("RGB")
+        if scale < 1.0:
+            work = work.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR)
+        mask = remove(work, session=session, only_mask=True)
+        infer_span.set(work_size=list(work.size))
+    timings["work_size"] = list(work.size)
+
+    with span("upsample", timings):
+        alpha = np.asarray(mask.convert("L"), dtype=np.float32) / 255.0
+        if scale < 1.0:
+            alpha = cv2.resize(alpha, (w, h), interpolation=cv2.INTER_LINEAR)
+            guide = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY).astype(np.float32) / 255.0
+            alpha = guided_filter(guide, alpha, radius=max(2, round(1 / scale)))
+        alpha = np.clip(alpha * 255, 0, 255).astype(np.uint8)
+
+    if alpha_matting:
+        with span("matting", timings):
+            trimap = build_trimap(alpha, fg_threshold, bg_threshold, erode_size)
+            rgb, alpha = matte_band(rgb, alpha, trimap, timings)
+
+    return Image.fromarray(np.dstack([rgb, alpha]), "RGBA")
+
+def process_image_bounded(input_path, output_path, alpha_matting=False, fg_threshold=120, bg_threshold=60,
+                          erode_size=1, max_side=1024, session=None, timings=None):
+    """대형 업로드용 process_image: 작업 해상도를 max_side로 제한하고 처리량/메모리 지표를 기록"""
+    if timings is None:
+        timings = {}
+    try:
+        t_start = time.perf_counter()
+        if not os.path.exists(input_path):
+            print(f"입력 파일이 존재하지 않습니다: {input_path}")
+            return False
+        cache_key, cached = cache_lookup(input_path, output_path, {
+            "alpha_matting": alpha_matting, "fg_threshold": fg_threshold,
+            "bg_threshold": bg_threshold, "erode_size": erode_size, "max_side": max_side,
+        }, timings)
+        if cached:
+            return True
+        with span("decode", timings, key="load_ms"):
+            input_image = image_loader.load_for_stage("remove_bg", input_path)
+        print(f"이미지 크기: {input_image.size}, 작업 최대 변: {max_side}px")
+
+        result_image = remove_background_bounded(
+            input_image, max_side, alpha_matting, fg_threshold, bg_threshold, erode_size,
+            session=session, timings=timings
+        )
+
+        with span("encode", timings, key="save_ms"):
+            info = image_io.write_image(result_image, output_path)
+        timings["output_bytes"] = info["bytes"]
+        cache_store(cache_key, output_path)
+
+        megapixels = input_image.size[0] * input_image.size[1] / 1e6
+        wall_ms = (time.perf_counter() - t_start) * 1000
+        timings["megapixels"] = megapixels
+        timings["ms_per_mp"] = wall_ms / megapixels if megapixels else 0.0
+        timings["peak_rss_mb"] = peak_rss_mb()
+        print(f"결과 저장 완료: {output_path} ({timings['ms_per_mp']:.0f}ms/MP, peak RSS {timings['peak_rss_mb'] or 0:.0f}MB)")
+        return True
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        traceback.print_exc(file=sys.stderr)
+        return False
+
 if __name__ == "__main__":
     try:
-        # 인자: <input> <output> [alpha_matting] [fg_threshold] [bg_threshold] [erode_size]
+        # 인자: <input> <output> [alpha_matting] [fg_threshold] [bg_threshold] [erode_size] [max_side]
         argc = len(sys.argv)
         if argc < 3:
             print("Usage: python u2net_remove_bg.py <input_image_path> <output_image_path>", file=sys.stderr)
@@ -200,21 +394,16 @@ if __name__ == "__main__":
         output_path = sys.argv[2]
         
         # 매개변수 파싱 (옷 부분 투명화 방지를 위한 보수적 설정)
-        alpha_matting = False
-        fg_threshold = 120  # 더 낮은 값으로 foreground 범위 확대
-        bg_threshold = 60   # 더 높은 값으로 background 범위 축소
-        erode_size = 1
-        
-        if argc > 3:
-            alpha_matting = sys.argv[3].lower() == 'true'
-        if argc > 4:
-            fg_threshold = max(80, min(200, int(sys.argv[4])))  # 80-200 범위로 제한
-        if argc > 5:
-            bg_threshold = max(20, min(100, int(sys.argv[5])))  # 20-100 범위로 제한
-        if argc > 6:
-            erode_size = max(1, min(5, int(sys.argv[6])))       # 1-5 범위로 제한
-            
-        process_image(input_path, output_path, alpha_matting, fg_threshold, bg_threshold, erode_size)
+        # fg_threshold 120: 더 낮은 값으로 foreground 범위 확대
+        # bg_threshold 60: 더 높은 값으로 background 범위 축소
+        alpha_matting, fg_threshold, bg_threshold, erode_size = normalize_params(*sys.argv[3:7])
+        max_side = int(sys.argv[7]) if argc > 7 else DEFAULT_MAX_SIDE
+
+        with request("remove_bg", input=input_path, max_side=max_side):
+            if max_side > 0:
+                process_image_bounded(input_path, output_path, alpha_matting, fg_threshold, bg_threshold, erode_size, max_side)
+            else:
+                process_image(input_path, output_path, alpha_matting, fg_threshold, bg_threshold, erode_size)
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,88 @@
+# u2net_worker.py
+"""
+상주형 배경 제거 워커 (JSON Lines 프로토콜)
+U2Net 세션을 한 번만 생성해 두고 여러 process_image 요청을 처리합니다.
+
+사용법: python u2net_worker.py
+- stdin 한 줄당 하나의 JSON 요청:
+  {"id": 1, "input": "in.jpg", "output": "out.png",
+   "alpha_matting": false, "fg_threshold": 120, "bg_threshold": 60, "erode_size": 1,
+   "max_side": 1024}  (max_side > 0이면 제한 해상도 경로 사용)
+  "profile": true (또는 "cprofile"/"tracemalloc")면 이 요청만 프로파일링 (tracing.py 참고)
+  {"cmd": "ping"} / {"cmd": "shutdown"}
+- stdout 한 줄당 하나의 JSON 응답 (시작 시 {"type": "ready", ...} 한 번 출력)
+- 진행 로그는 모두 stderr로 출력되어 프로토콜을 오염시키지 않습니다.
+"""
+import sys
+import os
+import time
+import traceback
+
+from tracing import request
+from worker_protocol import claim_stdout, send, serve
+
+claim_stdout()
+
+_t_start = time.perf_counter()
+import u2net_remove_bg  # noqa: E402  (모델 확인/다운로드는 import 시 한 번만 실행)
+
+def handle_job(session, job):
+    """단일 배경 제거 요청을 처리하고 응답 dict를 반환합니다."""
+    job_id = job.get("id")
+    input_path = job.get("input")
+    output_path = job.get("output")
+    if not input_path or not output_path:
+        return {"id": job_id, "success": False, "error": "input/output 경로가 필요합니다."}
+
+    alpha_matting, fg_threshold, bg_threshold, erode_size = u2net_remove_bg.normalize_params(
+        job.get("alpha_matting", False),
+        job.get("fg_threshold", 120),
+        job.get("bg_threshold", 60),
+        job.get("erode_size", 1),
+    )
+    max_side = int(job.get("max_side", u2net_remove_bg.DEFAULT_MAX_SIDE))
+    timings = {}
+    t0 = time.perf_counter()
+    with request("remove_bg", profile=job.get("profile"), job=job_id, max_side=max_side):
+        try:
+            if max_side > 0:
+                success = u2net_remove_bg.process_image_bounded(
+                    input_path, output_path, alpha_matting, fg_threshold, bg_threshold, erode_size, max_side,
+                    session=session, timings=timings
+                )
+            else:
+                success = u2net_remove_bg.process_image(
+                    input_path, output_path, alpha_matting, fg_threshold, bg_threshold, erode_size,
+                    session=session, timings=timings
+                )
+            error = None if success else "배경 제거 실패"
+        except SystemExit:
+            # process_image는 로드/저장 실패 시 sys.exit를 호출하므로 워커는 계속 유지
+            success, error = False, "배경 제거 실패"
+    timings["total_ms"] = (time.perf_counter() - t0) * 1000
+    response = {
+        "id": job_id,
+        "success": bool(success),
+        "output": output_path,
+        "timings": {k: round(v, 2) if isinstance(v, float) else v for k, v in timings.items()},
+    }
+    if error:
+        response["error"] = error
+    return response
+
+def main():
+    try:
+        session = u2net_remove_bg.get_session()
+    except Exception as e:
+        print(f"U2Net 세션 생성 실패: {e}")
+        traceback.print_exc()
+        send({"type": "error", "error": str(e)})
+        sys.exit(1)
+    init_ms = (time.perf_counter() - _t_start) * 1000
+    print(f"🎯 U2Net 워커 준비 완료 ({init_ms:.0f}ms)")
+    send({"type": "ready", "model_path": u2net_remove_bg.MODEL_PATH, "init_ms": round(init_ms, 2), "pid": os.getpid()})
+
+    serve(lambda job: handle_job(session, job), "U2Net")
+
+if __name__ == "__main__":
+    main()
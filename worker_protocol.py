@@ -0,0 +1,65 @@
+# worker_protocol.py
+"""
+상주형 워커 공통 JSON Lines 프로토콜 (u2net_worker.py, brush_worker.py에서 사용)
+
+- claim_stdout(): 응답 전용 stdout 확보 후 나머지 print 출력은 stderr로 돌림
+  (모델을 불러오는 무거운 모듈을 import하기 전에 호출)
+- send(message): 응답 한 줄 출력
+- serve(handle_job, name): stdin 요청 루프
+  {"cmd": "ping"} → {"type": "pong", "served": ..., "cache": 결과 캐시 통계}
+  {"cmd": "shutdown"} → 루프 종료
+  JSON 객체가 아닌 줄 → {"success": false, "error": ...} 응답 후 계속
+  handle_job(job) 예외 → {"id": ..., "success": false, "error": ...} 응답 후 계속
+"""
+import sys
+import json
+import traceback
+
+from result_cache import get_cache
+
+_protocol_out = sys.stdout
+
+def claim_stdout():
+    global _protocol_out
+    _protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+def send(message):
+    _protocol_out.write(json.dumps(message, ensure_ascii=False) + "\n")
+    _protocol_out.flush()
+
+def serve(handle_job, name):
+    """요청 루프를 실행하고 처리한 요청 수를 반환합니다."""
+    served = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("요청은 JSON 객체여야 합니다")
+        except ValueError as e:  # json.JSONDecodeError 포함
+            send({"success": False, "error": f"잘못된 JSON 요청: {e}"})
+            continue
+
+        cmd = job.get("cmd")
+        if cmd == "shutdown":
+            break
+        if cmd == "ping":
+            cache = get_cache()
+            send({"id": job.get("id"), "type": "pong", "served": served,
+                  "cache": cache.stats() if cache is not None else None})
+            continue
+
+        try:
+            response = handle_job(job)
+        except Exception as e:
+            traceback.print_exc()
+            response = {"id": job.get("id"), "success": False, "error": str(e)}
+        served += 1
+        response["served"] = served
+        send(response)
+
+    print(f"{name} 워커 종료 (처리한 요청: {served}건)")
+    return served